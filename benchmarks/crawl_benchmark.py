@@ -0,0 +1,309 @@
+"""
+Benchmark de ponta a ponta do crawler contra um site gerado e servido localmente.
+
+Um servidor HTTP local (processo separado) serve um grafo de páginas com
+tamanhos realistas, trechos de gateways montados a partir das assinaturas de
+GatewayCrawlerV2.gateways, endpoints lentos e endpoints com erro (500/404).
+O crawler roda em modo crawl (crawl_and_detect) ou lote (analyze_multiple_urls)
+e o benchmark mede páginas/s, latência p50/p95/p99 por página, CPU por página,
+pico de RSS e a acurácia da detecção em relação aos gateways inseridos.
+
+O resultado é salvo em JSON; --compare mostra a diferença para um resultado
+anterior (ex.: de outra versão).
+
+Uso: python benchmarks/crawl_benchmark.py [--mode crawl|batch] [--pages 300] [--workers 10]
+         [--backend requests|async] [--parser html.parser] [--output crawl_benchmark.json]
+         [--compare anterior.json]
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gateway_crawler_v2_1 import GatewayCrawlerV2, PARSER_BACKENDS
+
+LOREM = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et "
+         "dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris nisi aliquip ex ea "
+         "commodo consequat duis aute irure in reprehenderit voluptate velit esse cillum fugiat nulla pariatur "
+         "excepteur sint occaecat cupidatat non proident sunt culpa qui officia deserunt mollit anim id est laborum").split()
+
+
+def filler_words(gateways):
+    # Palavras de preenchimento que não contêm nenhuma palavra-chave de gateway
+    keywords = [keyword.lower() for signatures in gateways.values() for keyword in signatures['keywords']]
+    return [word for word in LOREM if not any(keyword in word for keyword in keywords)]
+
+
+def gateway_snippet(signatures):
+    snippet = f'<script src="https://{signatures["scripts"][0]}"></script>'
+    if signatures['forms']:
+        snippet += f'<form class="{signatures["forms"][0]}"><input name="amount"></form>'
+    return snippet
+
+
+def generate_site(gateways, pages, links_per_page, gateway_ratio, slow_ratio, error_ratio, seed):
+    """
+    Gera {caminho: html}, o gabarito {caminho: gateways inseridos} e a lista
+    dos endpoints lentos/com erro referenciados pelas páginas.
+
+    A página i liga para 2i+1 e 2i+2 (todas alcançáveis a partir de /p/0) e
+    para links_per_page páginas aleatórias; algumas ligam também para /slow/,
+    /error/ e /missing/.
+    """
+    rng = random.Random(seed)
+    words = filler_words(gateways)
+    candidates = [name for name, signatures in gateways.items() if signatures['scripts']]
+
+    site = {}
+    expected = {}
+    extra_paths = []
+    for i in range(pages):
+        path = f"/p/{i}"
+        targets = {child for child in (2 * i + 1, 2 * i + 2) if child < pages}
+        targets.update(rng.randrange(pages) for _ in range(links_per_page))
+        anchors = [f'<a href="/p/{target}">Página {target}</a>' for target in sorted(targets)]
+        if rng.random() < slow_ratio:
+            anchors.append(f'<a href="/slow/{i}">Lenta</a>')
+            extra_paths.append(f"/slow/{i}")
+        if rng.random() < error_ratio:
+            anchors.append(f'<a href="/error/{i}">Erro</a>')
+            anchors.append(f'<a href="/missing/{i}">Inexistente</a>')
+            extra_paths.extend((f"/error/{i}", f"/missing/{i}"))
+
+        inserted = []
+        if rng.random() < gateway_ratio:
+            inserted = rng.sample(candidates, rng.choice((1, 1, 1, 2)))
+        expected[path] = sorted(inserted)
+
+        # Tamanho log-normal em torno de ~40 KB, entre 5 KB e 400 KB
+        size = int(min(400 * 1024, max(5 * 1024, rng.lognormvariate(10.6, 0.8))))
+        paragraphs = []
+        length = 0
+        while length < size:
+            paragraph = '<p>' + ' '.join(rng.choice(words) for _ in range(80)) + '</p>'
+            paragraphs.append(paragraph)
+            length += len(paragraph)
+
+        snippets = ''.join(gateway_snippet(gateways[name]) for name in inserted)
+        site[path] = (f"<html><head><title>Página {i}</title>{snippets}</head><body>"
+                      f"<nav>{''.join(anchors)}</nav>{''.join(paragraphs)}</body></html>")
+    return site, expected, extra_paths
+
+
+def serve_site(site, slow_delay, port_queue):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path
+            if path.startswith('/slow/'):
+                time.sleep(slow_delay)
+                body = site.get(f"/p/{path.rsplit('/', 1)[1]}")
+            elif path.startswith('/error/'):
+                self.send_error(500)
+                return
+            else:
+                body = site.get(path)
+            if body is None:
+                self.send_error(404)
+                return
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def instrument_latency(crawler):
+    """
+    Mede o tempo entre o despacho de cada página e a conclusão do seu Future
+    """
+    latencies = []
+    lock = threading.Lock()
+    submit_page = crawler._submit_page
+
+    def timed_submit(*args, **kwargs):
+        start = time.perf_counter()
+        future = submit_page(*args, **kwargs)
+
+        def done(_):
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+        future.add_done_callback(done)
+        return future
+
+    crawler._submit_page = timed_submit
+    return latencies
+
+
+def detection_accuracy(results, expected):
+    true_positives = false_positives = false_negatives = exact_pages = 0
+    for result in results:
+        path = '/p/' + result['url'].rstrip('/').rsplit('/', 1)[1]
+        if '/p/' not in result['url'] or 'error' in result:
+            continue
+        found = set(result['gateways_found'])
+        truth = set(expected[path])
+        true_positives += len(found & truth)
+        false_positives += len(found - truth)
+        false_negatives += len(truth - found)
+        exact_pages += found == truth
+    precision = true_positives / (true_positives + false_positives) if true_positives + false_positives else 1.0
+    recall = true_positives / (true_positives + false_negatives) if true_positives + false_negatives else 1.0
+    return {
+        'precision': round(precision, 4),
+        'recall': round(recall, 4),
+        'f1': round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+        'pages_exact': exact_pages,
+        'false_positives': false_positives,
+        'false_negatives': false_negatives
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, previous_file):
+    with open(previous_file, encoding='utf-8') as f:
+        previous = json.load(f)
+    print(f"\nComparação com {previous_file} ({previous['metadata'].get('revision')}):")
+    for key in ('pages_per_second', 'latency_p50_ms', 'latency_p95_ms', 'latency_p99_ms', 'cpu_ms_per_page', 'peak_rss_mb'):
+        old, new = previous['metrics'].get(key), report['metrics'].get(key)
+        if old and new is not None:
+            print(f"   {key:<20} {old:>10.2f} -> {new:>10.2f} ({(new - old) / old * 100:+.1f}%)")
+    old_f1, new_f1 = previous['accuracy']['f1'], report['accuracy']['f1']
+    print(f"   {'f1':<20} {old_f1:>10.4f} -> {new_f1:>10.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do crawler contra um site local gerado')
+    parser.add_argument('--mode', choices=['crawl', 'batch'], default='crawl', help='crawl_and_detect ou analyze_multiple_urls')
+    parser.add_argument('--pages', type=int, default=300, help='Páginas do site gerado')
+    parser.add_argument('--links', type=int, default=8, help='Links aleatórios por página')
+    parser.add_argument('--gateway_ratio', type=float, default=0.3, help='Fração de páginas com gateway')
+    parser.add_argument('--slow_ratio', type=float, default=0.02, help='Fração de páginas com link para endpoint lento')
+    parser.add_argument('--error_ratio', type=float, default=0.03, help='Fração de páginas com links para 500/404')
+    parser.add_argument('--slow_delay', type=float, default=0.5, help='Atraso dos endpoints lentos em segundos')
+    parser.add_argument('--seed', type=int, default=42, help='Semente do gerador do site')
+    parser.add_argument('--workers', type=int, default=10, help='Workers do crawler')
+    parser.add_argument('--backend', choices=['requests', 'async'], default='requests', help='Backend de fetch')
+    parser.add_argument('--concurrency', type=int, default=100, help='Conexões do backend async')
+    parser.add_argument('--parser', choices=sorted(PARSER_BACKENDS), default='html.parser', help='Backend de parsing')
+    parser.add_argument('--processes', type=int, default=0, help='Processos de detecção')
+    parser.add_argument('--deep', action='store_true', help='Incluir a análise profunda')
+    parser.add_argument('--output', default='crawl_benchmark.json', help='Arquivo JSON com o resultado')
+    parser.add_argument('--compare', help='Resultado JSON anterior para comparação')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    # Cache de resultados desativado: cada página precisa ser analisada de fato
+    crawler = GatewayCrawlerV2(backend=args.backend, concurrency=args.concurrency, host_rate=0,
+                               host_connections=max(args.workers, args.concurrency if args.backend == 'async' else 0),
+                               memo_size=0, parser=args.parser, processes=args.processes)
+    site, expected, extra_paths = generate_site(crawler.gateways, args.pages, args.links, args.gateway_ratio,
+                                   args.slow_ratio, args.error_ratio, args.seed)
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve_site, args=(site, args.slow_delay, port_queue), daemon=True)
+    server.start()
+    base_url = f"http://127.0.0.1:{port_queue.get(timeout=30)}"
+
+    latencies = instrument_latency(crawler)
+    cpu_start = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    try:
+        if args.mode == 'crawl':
+            results = crawler.crawl_and_detect([f"{base_url}/p/0"], max_depth=50, max_urls=args.pages * 2,
+                                               max_workers=args.workers, deep_analysis=args.deep)
+        else:
+            urls = [f"{base_url}{path}" for path in list(site) + extra_paths]
+            results = list(crawler.analyze_multiple_urls(urls, max_workers=args.workers, deep_analysis=args.deep))
+    finally:
+        elapsed = time.perf_counter() - start
+        cpu_end = resource.getrusage(resource.RUSAGE_SELF)
+        server.terminate()
+        # Encerra também os processos de detecção (contados em RUSAGE_CHILDREN)
+        crawler.close()
+
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_seconds = (cpu_end.ru_utime - cpu_start.ru_utime) + (cpu_end.ru_stime - cpu_start.ru_stime)
+    pages = len(results)
+    report = {
+        'metadata': {
+            'timestamp': datetime.now().isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'config': vars(args)
+        },
+        'metrics': {
+            'pages': pages,
+            'pages_with_errors': sum(1 for result in results if 'error' in result),
+            'elapsed_seconds': round(elapsed, 3),
+            'pages_per_second': round(pages / elapsed, 2) if elapsed else None,
+            'latency_p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+            'latency_p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+            'latency_p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+            'cpu_ms_per_page': round(cpu_seconds / pages * 1000, 2) if pages else None,
+            # ru_maxrss é em KB no Linux e em bytes no macOS
+            'peak_rss_mb': round(cpu_end.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1),
+            'detection_processes_cpu_seconds': round(children.ru_utime + children.ru_stime, 3) if args.processes else None
+        },
+        'accuracy': detection_accuracy(results, expected)
+    }
+
+    metrics = report['metrics']
+    print(f"Modo {args.mode}, backend {args.backend}, parser {args.parser}, {args.workers} workers")
+    print(f"   Páginas: {pages} ({metrics['pages_with_errors']} com erro) em {metrics['elapsed_seconds']:.2f}s "
+          f"-> {metrics['pages_per_second']} páginas/s")
+    if latencies:
+        print(f"   Latência p50/p95/p99: {metrics['latency_p50_ms']} / {metrics['latency_p95_ms']} / {metrics['latency_p99_ms']} ms")
+    print(f"   CPU por página: {metrics['cpu_ms_per_page']} ms, pico de RSS: {metrics['peak_rss_mb']} MB")
+    accuracy = report['accuracy']
+    print(f"   Detecção: precisão {accuracy['precision']}, recall {accuracy['recall']}, F1 {accuracy['f1']} "
+          f"({accuracy['false_positives']} falsos positivos, {accuracy['false_negatives']} falsos negativos)")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nResultado salvo em {args.output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark dos backends de parsing HTML (--parser).
+
+Mede o tempo de parse + detecção por página nas páginas salvas em
+benchmarks/fixtures e confere se a saída de cada backend é idêntica à do
+html.parser (a referência da detecção).
+
+Uso: python benchmarks/parser_benchmark.py [--repeat 20] [--fixtures DIR] [--deep]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gateway_crawler_v2_1 import GatewayCrawlerV2, FetchedPage, PARSER_BACKENDS
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixtures(directory):
+    fixtures = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.html'):
+            with open(os.path.join(directory, filename), 'rb') as f:
+                fixtures.append((filename, f.read()))
+    return fixtures
+
+
+def analyze(crawler, filename, content, deep_analysis):
+    page = FetchedPage(f"https://fixture.local/{filename}", 200, {}, content, 'utf-8')
+    result = crawler._analyze_fetched(page.url, page, deep_analysis)
+    result.pop('analysis_time')
+    result.pop('timings')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dos backends de parsing HTML')
+    parser.add_argument('--repeat', type=int, default=20, help='Repetições por página')
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help='Diretório com as páginas .html salvas')
+    parser.add_argument('--deep', action='store_true', help='Incluir a análise profunda')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    fixtures = load_fixtures(args.fixtures)
+
+    crawlers = {}
+    for name in PARSER_BACKENDS:
+        try:
+            # memo_size=0: cada repetição precisa parsear de novo
+            crawlers[name] = GatewayCrawlerV2(parser=name, memo_size=0)
+        except RuntimeError as e:
+            print(f"{name}: indisponível ({e})")
+
+    reference = {filename: analyze(crawlers['html.parser'], filename, content, args.deep)
+                 for filename, content in fixtures}
+
+    print(f"{'página':<40} {'KB':>7} " + ' '.join(f"{name:>14}" for name in crawlers))
+    totals = dict.fromkeys(crawlers, 0.0)
+    mismatches = []
+    for filename, content in fixtures:
+        row = []
+        for name, crawler in crawlers.items():
+            if analyze(crawler, filename, content, args.deep) != reference[filename]:
+                mismatches.append((filename, name))
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                analyze(crawler, filename, content, args.deep)
+            per_page = (time.perf_counter() - start) / args.repeat * 1000
+            totals[name] += per_page
+            row.append(f"{per_page:>11.2f} ms")
+        print(f"{filename:<40} {len(content) / 1024:>7.1f} " + ' '.join(row))
+
+    baseline = totals['html.parser']
+    print(f"{'total (ms/página somados)':<48} " + ' '.join(f"{total:>11.2f} ms" for total in totals.values()))
+    print(f"{'speedup vs html.parser':<48} " + ' '.join(f"{baseline / total:>13.1f}x" for total in totals.values()))
+
+    if mismatches:
+        print("\nSaída diferente do html.parser:")
+        for filename, name in mismatches:
+            print(f"   {name}: {filename}")
+        sys.exit(1)
+    print("\nSaída idêntica ao html.parser em todas as páginas.")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,484 +1,4100 @@
-import requests
-from bs4 import BeautifulSoup
 import re
 import json
 import time
 import csv
-from urllib.parse import urlparse, urljoin
-from collections import deque
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse, urljoin, parse_qsl, urlencode
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+import threading
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 import argparse
+import bisect
+from array import array
+import copy
+import email.utils
+import hashlib
+import heapq
+import importlib.util
+import os
+import pickle
+import queue
+import socket
+import sqlite3
 import sys
+import tempfile
+import zlib
+
+try:
+    import ahocorasick  # pyahocorasick (opcional): busca multi-padrão em C
+except ImportError:
+    ahocorasick = None
+
+# Dependências pesadas importadas sob demanda por _lazy_import, para que --help
+# e execuções curtas não paguem o custo de import: requests e urllib3 (fetch),
+# httpx e asyncio (--backend async) e redis (--store redis://...). bs4, lxml e
+# selectolax são importados pelos próprios backends de parsing.
+requests = None
+urllib3 = None
+httpx = None
+asyncio = None
+redis = None
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-class GatewayCrawlerV2:
+
+def _lazy_import(name):
+    """
+    Importa o módulo na primeira chamada e o publica como global deste módulo
+    """
+    module = globals().get(name)
+    if module is None:
+        module = importlib.import_module(name)
+        globals()[name] = module
+    return module
+
+REGEX_METACHARS = set('.^$*+?{}[]\\|()')
+
+
+class SignatureMatcher:
+    """
+    Motor de assinaturas compilado uma única vez a partir da tabela de gateways.
+    
+    O texto da página é varrido uma só vez em busca de todas as palavras-chave e
+    endpoints (autômato Aho-Corasick quando pyahocorasick está instalado), e as
+    assinaturas de script/formulário/meta/CSS são avaliadas sobre os atributos
+    coletados numa única passada pela árvore (ver os backends de parsing).
+    As evidências e pontuações são idênticas às da verificação gateway a gateway.
+    """
+    def __init__(self, gateways):
+        self.gateways = gateways
+        
+        literals = set()
+        attribute_patterns = set()
+        for signatures in gateways.values():
+            literals.update(keyword.lower() for keyword in signatures['keywords'])
+            literals.update(endpoint.lower() for endpoint in signatures.get('api_endpoints', []))
+            attribute_patterns.update(signatures['forms'])
+            attribute_patterns.update(signatures['meta'])
+            attribute_patterns.update(signatures.get('css_classes', []))
+        
+        # Do maior para o menor: se um literal aparece no texto, todos os literais
+        # contidos nele também aparecem e não precisam ser buscados de novo
+        self._literals = sorted(literals, key=len, reverse=True)
+        self._implied = {
+            literal: [other for other in self._literals if other != literal and other in literal]
+            for literal in self._literals
+        }
+        
+        self._automaton = None
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for literal in self._literals:
+                if literal:
+                    self._automaton.add_word(literal, literal)
+            if len(self._automaton):
+                self._automaton.make_automaton()
+            else:
+                self._automaton = None
+        
+        # Padrões de atributo: literais viram busca de substring, o resto vira regex
+        self._attribute_regexes = {}
+        for pattern in attribute_patterns:
+            if set(pattern) & REGEX_METACHARS:
+                self._attribute_regexes[pattern] = re.compile(pattern, re.I)
+    
+    def find_literals(self, page_content):
+        """
+        Retorna o conjunto de palavras-chave/endpoints presentes no texto (já em minúsculas)
+        """
+        found = set()
+        if '' in self._implied:
+            found.add('')
+        
+        if self._automaton is not None:
+            for _, literal in self._automaton.iter(page_content):
+                found.add(literal)
+            return found
+        
+        for literal in self._literals:
+            if literal in found:
+                continue
+            if literal in page_content:
+                found.add(literal)
+                found.update(self._implied[literal])
+        return found
+    
+    def _attribute_matches(self, pattern, values, joined_values):
+        regex = self._attribute_regexes.get(pattern)
+        if regex is None:
+            return pattern.lower() in joined_values
+        return any(regex.search(value) for value in values)
+    
+    def match(self, page_content, features):
+        """
+        Retorna {gateway: (evidências, confiança)} para os gateways com evidência
+        """
+        found = self.find_literals(page_content)
+        
+        script_srcs = features['script_srcs']
+        lowered_srcs = [src.lower() for src in script_srcs]
+        # Valores separados por \n: um padrão literal não consegue cruzar dois valores
+        attribute_sets = {}
+        for key in ('form_classes', 'meta_names', 'classes'):
+            values = features[key]
+            attribute_sets[key] = (values, '\n'.join(values).lower())
+        
+        matches = {}
+        for gateway_name, signatures in self.gateways.items():
+            evidence = []
+            confidence_score = 0
+            
+            # Palavras-chave no conteúdo (peso: 1 ponto cada)
+            for keyword in signatures['keywords']:
+                if keyword.lower() in found:
+                    evidence.append(f"Palavra-chave encontrada: {keyword}")
+                    confidence_score += 1
+            
+            # Scripts (peso: 3 pontos cada)
+            for script_src in signatures['scripts']:
+                lowered = script_src.lower()
+                for src, lowered_src in zip(script_srcs, lowered_srcs):
+                    if lowered in lowered_src:
+                        evidence.append(f"Script encontrado: {src}")
+                        confidence_score += 3
+            
+            # Formulários (peso: 2 pontos cada)
+            for form_class in signatures['forms']:
+                if self._attribute_matches(form_class, *attribute_sets['form_classes']):
+                    evidence.append(f"Formulário encontrado: {form_class}")
+                    confidence_score += 2
+            
+            # Meta tags (peso: 2 pontos cada)
+            for meta_name in signatures['meta']:
+                if self._attribute_matches(meta_name, *attribute_sets['meta_names']):
+                    evidence.append(f"Meta tag encontrada: {meta_name}")
+                    confidence_score += 2
+            
+            # Classes CSS (peso: 1 ponto cada)
+            for css_class in signatures.get('css_classes', []):
+                if self._attribute_matches(css_class, *attribute_sets['classes']):
+                    evidence.append(f"Classe CSS encontrada: {css_class}")
+                    confidence_score += 1
+            
+            # Endpoints de API (peso: 2 pontos cada)
+            for endpoint in signatures.get('api_endpoints', []):
+                if endpoint.lower() in found:
+                    evidence.append(f"Endpoint de API encontrado: {endpoint}")
+                    confidence_score += 2
+            
+            if evidence and confidence_score > 0:
+                matches[gateway_name] = (evidence, confidence_score)
+        
+        return matches
+    
+    def match_script_literals(self, found, page_evidence):
+        """
+        Retorna {gateway: (evidências, confiança)} para as palavras-chave/endpoints
+        encontrados no código dos scripts externos (found, de find_literals) que
+        ainda não pontuaram no HTML da página (page_evidence, de match)
+        """
+        matches = {}
+        for gateway_name, signatures in self.gateways.items():
+            already_found = page_evidence.get(gateway_name, ())
+            evidence = []
+            confidence_score = 0
+            
+            # Mesmos pesos do HTML: palavra-chave 1 ponto, endpoint 2 pontos
+            for keyword in signatures['keywords']:
+                if keyword.lower() in found and f"Palavra-chave encontrada: {keyword}" not in already_found:
+                    evidence.append(f"Palavra-chave em script externo: {keyword}")
+                    confidence_score += 1
+            for endpoint in signatures.get('api_endpoints', []):
+                if endpoint.lower() in found and f"Endpoint de API encontrado: {endpoint}" not in already_found:
+                    evidence.append(f"Endpoint de API em script externo: {endpoint}")
+                    confidence_score += 2
+            
+            if evidence:
+                matches[gateway_name] = (evidence, confidence_score)
+        
+        return matches
+
+
+# Pack de assinaturas padrão, ao lado deste módulo
+DEFAULT_SIGNATURE_PACK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gateway_signatures.json')
+
+# Versão do formato do índice compilado em cache; mudar ao alterar SignatureMatcher
+SIGNATURE_INDEX_FORMAT = 1
+
+SIGNATURE_FIELDS = ('keywords', 'scripts', 'forms', 'meta')
+OPTIONAL_SIGNATURE_FIELDS = ('css_classes', 'api_endpoints')
+
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'gateway_crawler')
+
+
+class SignaturePack:
+    """
+    Pack versionado de assinaturas de gateways (JSON: format, version, gateways).
+    
+    matcher() compila o SignatureMatcher uma vez e o guarda em cache no disco
+    (pickle em cache_dir), com chave pelo hash do conteúdo do pack: editar o
+    pack invalida o índice automaticamente. O pack com o matcher compilado é
+    o que vai para os processos do DetectionPool, que não recompilam nada.
+    """
+    def __init__(self, gateways, version=None, digest=None, path=None):
+        self.gateways = gateways
+        self.version = version
+        self.digest = digest or hashlib.sha256(json.dumps(gateways, sort_keys=True).encode('utf-8')).hexdigest()
+        self.path = path
+        self._matcher = None
+    
+    @classmethod
+    def load(cls, path=None):
+        path = path or DEFAULT_SIGNATURE_PACK
+        with open(path, 'rb') as f:
+            raw = f.read()
+        try:
+            data = json.loads(raw)
+        except ValueError as e:
+            raise ValueError(f"Pack de assinaturas inválido ({path}): {e}")
+        if data.get('format') != 1 or not isinstance(data.get('gateways'), dict):
+            raise ValueError(f"Pack de assinaturas inválido ({path}): esperado format 1 com o objeto 'gateways'")
+        for name, signatures in data['gateways'].items():
+            missing = [field for field in SIGNATURE_FIELDS if not isinstance(signatures.get(field), list)]
+            if missing:
+                raise ValueError(f"Pack de assinaturas inválido ({path}): {name} sem {', '.join(missing)}")
+            for field in OPTIONAL_SIGNATURE_FIELDS:
+                signatures.setdefault(field, [])
+        return cls(data['gateways'], data.get('version'), hashlib.sha256(raw).hexdigest(), path)
+    
+    def _index_key(self):
+        key = f"{self.digest}|{SIGNATURE_INDEX_FORMAT}|{ahocorasick is not None}|{sys.version_info[0]}.{sys.version_info[1]}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+    
+    def matcher(self, cache_dir=None):
+        """
+        SignatureMatcher do pack; cache_dir=False desativa o cache em disco
+        """
+        if self._matcher is not None:
+            return self._matcher
+        if cache_dir is False:
+            self._matcher = SignatureMatcher(self.gateways)
+            return self._matcher
+        
+        cache_file = os.path.join(cache_dir or default_cache_dir(), f"signatures-{self._index_key()}.pickle")
+        try:
+            with open(cache_file, 'rb') as f:
+                self._matcher = pickle.load(f)
+            return self._matcher
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Índice de assinaturas em cache ilegível ({cache_file}): {e}; recompilando")
+        
+        self._matcher = SignatureMatcher(self.gateways)
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            temporary = f"{cache_file}.{os.getpid()}.tmp"
+            with open(temporary, 'wb') as f:
+                pickle.dump(self._matcher, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, cache_file)
+        except OSError as e:
+            logger.debug(f"Não foi possível gravar o índice de assinaturas em {cache_file}: {e}")
+        return self._matcher
+    
+    def describe(self):
+        return {'version': self.version, 'sha256': self.digest, 'gateways': len(self.gateways), 'path': self.path}
+
+
+def _new_page_features():
+    return {
+        'title': "N/A",
+        'script_srcs': [],
+        'form_classes': set(),
+        'meta_names': set(),
+        'classes': set(),
+        'iframe_srcs': [],
+        'anchor_hrefs': [],
+        'anchor_texts': [],
+        'inputs': []
+    }
+
+
+def _class_values(class_value):
+    """
+    Mesma semântica do BeautifulSoup para class_: cada classe e, se houver
+    mais de uma (ou nenhuma), também a string completa
+    """
+    if isinstance(class_value, str):
+        class_value = class_value.split()
+    class_values = list(class_value)
+    if len(class_value) != 1:
+        class_values.append(' '.join(class_value))
+    return class_values
+
+
+def _anchor_text(text):
+    # Texto do link normalizado (espaços colapsados) para a prioridade do crawling
+    return ' '.join(text.split())[:200]
+
+
+def _page_anchors(features):
+    """
+    Links da página como pares (href, texto), na forma guardada pelo cache de resultados
+    """
+    return tuple(zip(features['anchor_hrefs'], features['anchor_texts']))
+
+
+def _add_tag_features(features, name, get, text=None):
+    """
+    Registra as características de uma tag; get(atributo, padrão) lê os atributos
+    e text() retorna o texto da tag (usado só nos links)
+    """
+    class_value = get('class', None)
+    class_values = ()
+    if class_value is not None:
+        class_values = _class_values(class_value)
+        features['classes'].update(class_values)
+    
+    if name == 'script':
+        src = get('src', None)
+        if src is not None:
+            features['script_srcs'].append(src)
+    elif name == 'form':
+        features['form_classes'].update(class_values)
+    elif name == 'meta':
+        meta_name = get('name', None)
+        if meta_name is not None:
+            features['meta_names'].add(meta_name)
+    elif name == 'iframe':
+        features['iframe_srcs'].append(get('src', ''))
+    elif name == 'a':
+        href = get('href', None)
+        if href is not None:
+            features['anchor_hrefs'].append(href)
+            features['anchor_texts'].append(_anchor_text(text()) if text else '')
+    elif name == 'input':
+        features['inputs'].append((get('type', ''), get('name', ''), get('id', '')))
+
+
+class BeautifulSoupParserBackend:
+    """
+    Parser padrão (BeautifulSoup + html.parser): é a referência da detecção
+    """
+    name = 'html.parser'
+    
     def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+        from bs4 import BeautifulSoup
+        self._beautiful_soup = BeautifulSoup
+    
+    def extract_features(self, html):
+        """
+        Coleta numa única passada pela árvore tudo o que a detecção usa:
+        título, scripts, classes, formulários, metas, iframes, links e inputs
+        """
+        soup = self._beautiful_soup(html, 'html.parser')
+        features = _new_page_features()
+        title_seen = False
         
-        # Definição expandida de gateways e suas assinaturas
-        # Adicionando mais gateways globais/internacionais e refinando assinaturas
-        self.gateways = {
-            "Stripe": {
-                "keywords": ["stripe.com", "js.stripe.com", "data-stripe", "pk_live", "pk_test", "stripe-js", "stripe-payment", "stripe-checkout"],
-                "scripts": ["js.stripe.com/v3/", "checkout.stripe.com", "js.stripe.com/v2/"],
-                "forms": ["stripe-payment-form", "stripe-form"],
-                "meta": ["stripe-publishable-key", "stripe-key"],
-                "css_classes": ["stripe-button", "stripe-checkout"],
-                "api_endpoints": ["/stripe/", "/api/stripe/"]
-            },
-            "PayPal": {
-                "keywords": ["paypal.com", "paypalobjects.com", "data-paypal", "paypal-button", "paypal-checkout", "paypal-express"],
-                "scripts": ["www.paypalobjects.com/api/checkout.js", "js.paypal.com", "paypal.com/sdk/js"],
-                "forms": ["paypal-payment-form", "paypal-form"],
-                "meta": ["paypal-client-id", "paypal-merchant-id"],
-                "css_classes": ["paypal-button", "paypal-checkout"],
-                "api_endpoints": ["/paypal/", "/api/paypal/"]
-            },
-            "PagSeguro": {
-                "keywords": ["pagseguro.uol.com.br", "ps.uol.com.br", "pagseguro", "uol.com.br/pagseguro"],
-                "scripts": ["stc.pagseguro.uol.com.br", "pagseguro.uol.com.br/resources"],
-                "forms": ["pagseguro-form"],
-                "meta": ["pagseguro-token"],
-                "css_classes": ["pagseguro-button"],
-                "api_endpoints": ["/pagseguro/", "/api/pagseguro/"]
-            },
-            "Mercado Pago": {
-                "keywords": ["mercadopago.com", "mp.com.br", "mercadopago", "mercadolibre"],
-                "scripts": ["secure.mlstatic.com/sdk/javascript/v1/mercadopago.js", "js.mercadopago.com"],
-                "forms": ["mercadopago-form"],
-                "meta": ["mercadopago-public-key"],
-                "css_classes": ["mercadopago-button", "mp-button"],
-                "api_endpoints": ["/mercadopago/", "/api/mercadopago/", "/mp/"]
-            },
-            "Wirecard/Moip": {
-                "keywords": ["wirecard.com.br", "moip.com.br", "wirecard", "moip"],
-                "scripts": ["assets.moip.com.br", "js.wirecard.com.br"],
-                "forms": ["wirecard-form", "moip-form"],
-                "meta": ["wirecard-key", "moip-key"],
-                "css_classes": ["wirecard-button", "moip-button"],
-                "api_endpoints": ["/wirecard/", "/moip/", "/api/wirecard/"]
-            },
-            "Pagar.me": {
-                "keywords": ["pagar.me", "pagarme", "stone.com.br"],
-                "scripts": ["assets.pagar.me", "js.pagar.me"],
-                "forms": ["pagarme-form"],
-                "meta": ["pagarme-key"],
-                "css_classes": ["pagarme-button"],
-                "api_endpoints": ["/pagarme/", "/api/pagarme/"]
-            },
-            "Ebanx": {
-                "keywords": ["ebanx.com", "ebanx"],
-                "scripts": ["js.ebanx.com", "checkout.ebanx.com"],
-                "forms": ["ebanx-form"],
-                "meta": ["ebanx-key"],
-                "css_classes": ["ebanx-button"],
-                "api_endpoints": ["/ebanx/", "/api/ebanx/"]
-            },
-            "Cielo": {
-                "keywords": ["cielo.com.br", "cielo", "cieloecommerce"],
-                "scripts": ["ecommerce.cielo.com.br"],
-                "forms": ["cielo-form"],
-                "meta": ["cielo-merchant-id"],
-                "css_classes": ["cielo-button"],
-                "api_endpoints": ["/cielo/", "/api/cielo/"]
-            },
-            "Rede": {
-                "keywords": ["userede.com.br", "rede", "redecard"],
-                "scripts": ["js.userede.com.br"],
-                "forms": ["rede-form"],
-                "meta": ["rede-key"],
-                "css_classes": ["rede-button"],
-                "api_endpoints": ["/rede/", "/api/rede/"]
-            },
-            "Getnet": {
-                "keywords": ["getnet.com.br", "getnet"],
-                "scripts": ["js.getnet.com.br"],
-                "forms": ["getnet-form"],
-                "meta": ["getnet-key"],
-                "css_classes": ["getnet-button"],
-                "api_endpoints": ["/getnet/", "/api/getnet/"]
-            },
-            "Adyen": {
-                "keywords": ["adyen.com", "adyen"],
-                "scripts": ["checkoutshopper-live.adyen.com", "checkoutshopper-test.adyen.com"],
-                "forms": ["adyen-form"],
-                "meta": ["adyen-key"],
-                "css_classes": ["adyen-button"],
-                "api_endpoints": ["/adyen/", "/api/adyen/"]
-            },
-            "Braintree": {
-                "keywords": ["braintreepayments.com", "braintree", "data-braintree"],
-                "scripts": ["js.braintreegateway.com", "assets.braintreegateway.com"],
-                "forms": ["braintree-form"],
-                "meta": ["braintree-key"],
-                "css_classes": ["braintree-button"],
-                "api_endpoints": ["/braintree/", "/api/braintree/"]
-            },
-            "Square": {
-                "keywords": ["squareup.com", "square", "data-square"],
-                "scripts": ["js.squareup.com", "web.squarecdn.com"],
-                "forms": ["square-form"],
-                "meta": ["square-application-id"],
-                "css_classes": ["square-button"],
-                "api_endpoints": ["/square/", "/api/square/"]
-            },
-            "Shopify Payments": {
-                "keywords": ["shopify.com/payments", "shopify-pay", "shopifycs.com"],
-                "scripts": ["cdn.shopify.com", "js.shopifycs.com"],
-                "forms": ["shopify-payment-form"],
-                "meta": ["shopify-checkout-api-token"],
-                "css_classes": ["shopify-payment-button"],
-                "api_endpoints": ["/shopify/", "/api/shopify/"]
-            },
-            "Authorize.Net": {
-                "keywords": ["authorize.net", "authorizenet"],
-                "scripts": ["js.authorize.net", "jstest.authorize.net"],
-                "forms": ["authnet-form"],
-                "meta": ["authnet-key"],
-                "css_classes": ["authnet-button"],
-                "api_endpoints": ["/authorize/", "/api/authorize/"]
-            },
-            "2Checkout": {
-                "keywords": ["2checkout.com", "2co.com"],
-                "scripts": ["www.2checkout.com/checkout/api"],
-                "forms": ["twocheckout-form"],
-                "meta": ["2checkout-key"],
-                "css_classes": ["twocheckout-button"],
-                "api_endpoints": ["/2checkout/", "/api/2checkout/"]
-            },
-            "Worldpay": {
-                "keywords": ["worldpay.com", "worldpay"],
-                "scripts": ["payments.worldpay.com"],
-                "forms": [],
-                "meta": [],
-                "css_classes": [],
-                "api_endpoints": []
-            },
-            "Global Payments": {
-                "keywords": ["globalpaymentsinc.com", "globalpayments"],
-                "scripts": [],
-                "forms": [],
-                "meta": [],
-                "css_classes": [],
-                "api_endpoints": []
-            },
-            "Ingenico": {
-                "keywords": ["ingenico.com", "ingenico"],
-                "scripts": [],
-                "forms": [],
-                "meta": [],
-                "css_classes": [],
-                "api_endpoints": []
-            },
-            "Checkout.com": {
-                "keywords": ["checkout.com", "checkout"],
-                "scripts": ["cdn.checkout.com"],
-                "forms": [],
-                "meta": [],
-                "css_classes": [],
-                "api_endpoints": []
-            },
-            "Klarna": {
-                "keywords": ["klarna.com", "klarna"],
-                "scripts": ["x.klarnacdn.net"],
-                "forms": [],
-                "meta": [],
-                "css_classes": [],
-                "api_endpoints": []
-            },
-            "Afterpay": {
-                "keywords": ["afterpay.com", "afterpay"],
-                "scripts": ["static.afterpay.com"],
-                "forms": [],
-                "meta": [],
-                "css_classes": [],
-                "api_endpoints": []
-            },
-            "Affirm": {
-                "keywords": ["affirm.com", "affirm"],
-                "scripts": ["cdn1.affirm.com"],
-                "forms": [],
-                "meta": [],
-                "css_classes": [],
-                "api_endpoints": []
+        for tag in soup.find_all(True):
+            _add_tag_features(features, tag.name, tag.get, lambda tag=tag: tag.get_text(' '))
+            if tag.name == 'title' and not title_seen:
+                title_seen = True
+                # str(): NavigableString guarda a árvore inteira e não atravessa o pool de processos
+                features['title'] = str(tag.string) if tag.string is not None else None
+        
+        return features
+
+
+class LxmlParserBackend:
+    """
+    Parser em C via lxml.html, sem construir a árvore do BeautifulSoup.
+    
+    Em HTML válido a saída é idêntica à do html.parser (ver
+    benchmarks/parser_benchmark.py). Em markup malformado a correção da árvore
+    pode divergir: atributos duplicados (vale o primeiro), entidades sem ';'
+    em atributos e tags dentro de <title>.
+    
+    O conteúdo de <iframe> é texto cru em HTML5: um <iframe> sem fechamento
+    engoliria o resto do documento. Esse texto é parseado de novo no lugar,
+    como o html.parser faz (ver _iter_elements).
+    """
+    name = 'lxml'
+    
+    def __init__(self):
+        import lxml.html
+        import lxml.etree
+        self._html = lxml.html
+        self._etree = lxml.etree
+    
+    def _string(self, element):
+        # Equivalente a Tag.string do BeautifulSoup: só há string se houver um único filho
+        nodes = []
+        if element.text:
+            nodes.append(element.text)
+        for child in element:
+            nodes.append(child)
+            if child.tail:
+                nodes.append(child.tail)
+        if len(nodes) != 1:
+            return None
+        node = nodes[0]
+        if isinstance(node, str):
+            return node
+        if not isinstance(node.tag, str):
+            return node.text
+        return self._string(node)
+    
+    def _parse(self, html):
+        try:
+            return self._html.document_fromstring(html)
+        except ValueError:
+            # Strings com declaração de encoding XML precisam ser passadas como bytes
+            return self._html.document_fromstring(html.encode('utf-8'), parser=self._html.HTMLParser(encoding='utf-8'))
+        except self._etree.ParserError:
+            return None
+    
+    def _iter_elements(self, root):
+        """
+        Elementos em ordem de documento; o texto de um <iframe> que contém
+        markup é parseado e percorrido logo após o próprio iframe
+        """
+        for element in root.iter():
+            if not isinstance(element.tag, str):
+                continue
+            yield element
+            if element.tag == 'iframe' and element.text and '<' in element.text:
+                inner = self._parse(element.text)
+                if inner is not None:
+                    yield from self._iter_elements(inner)
+    
+    def extract_features(self, html):
+        features = _new_page_features()
+        root = self._parse(html)
+        if root is None:
+            return features
+        title_seen = False
+        
+        for element in self._iter_elements(root):
+            name = element.tag
+            _add_tag_features(features, name, element.get, lambda element=element: ' '.join(element.itertext()))
+            if name == 'title' and not title_seen:
+                title_seen = True
+                features['title'] = self._string(element)
+        
+        return features
+
+
+class SelectolaxParserBackend:
+    """
+    Parser HTML5 em C via selectolax (Lexbor); mesmas ressalvas do LxmlParserBackend,
+    inclusive o tratamento do texto de <iframe>
+    """
+    name = 'selectolax'
+    
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self._parser_class = LexborHTMLParser
+    
+    def _string(self, node):
+        children = list(node.iter(include_text=True))
+        if len(children) != 1:
+            return None
+        child = children[0]
+        if child.tag == '-text':
+            return child.text(deep=False)
+        if child.tag == '-comment':
+            return None
+        return self._string(child)
+    
+    def _iter_nodes(self, root):
+        for node in root.traverse():
+            yield node
+            if node.tag == 'iframe':
+                text = node.text(deep=True)
+                if '<' in text:
+                    inner = self._parser_class(text)
+                    if inner.root is not None:
+                        yield from self._iter_nodes(inner.root)
+    
+    def extract_features(self, html):
+        features = _new_page_features()
+        tree = self._parser_class(html)
+        if tree.root is None:
+            return features
+        title_seen = False
+        
+        for node in self._iter_nodes(tree.root):
+            name = node.tag
+            attributes = node.attributes
+            # Atributos sem valor vêm como None no selectolax e como '' no BeautifulSoup
+            get = lambda key, default, attributes=attributes: (
+                (attributes[key] or '') if key in attributes else default
+            )
+            _add_tag_features(features, name, get, lambda node=node: node.text(deep=True, separator=' '))
+            if name == 'title' and not title_seen:
+                title_seen = True
+                features['title'] = self._string(node)
+        
+        return features
+
+
+PARSER_BACKENDS = {
+    'html.parser': BeautifulSoupParserBackend,
+    'lxml': LxmlParserBackend,
+    'selectolax': SelectolaxParserBackend
+}
+
+
+def get_parser_backend(name='html.parser'):
+    """
+    Instancia o backend de parsing pelo nome (html.parser, lxml ou selectolax)
+    """
+    try:
+        return PARSER_BACKENDS[name]()
+    except ImportError as e:
+        raise RuntimeError(f"O parser {name} não está disponível: {e}")
+
+
+class FetchedPage:
+    """
+    Resposta HTTP já baixada, independente do backend de fetch usado
+    """
+    def __init__(self, url, status_code, headers, content, encoding=None, truncated=None, timings=None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+        # Motivo da interrupção do download em streaming ('max_bytes' ou 'head')
+        self.truncated = truncated
+        # Tempos do fetch em segundos: 'connect' (DNS + conexão + TLS + espera
+        # pelos cabeçalhos) e 'download' (corpo)
+        self.timings = timings or {}
+        self._text = None
+    
+    @property
+    def text(self):
+        # Mesma decodificação de requests.Response.text
+        if self._text is None:
+            self._text = str(self.content, self.encoding or 'utf-8', errors='replace')
+        return self._text
+
+
+class BodyStreamPolicy:
+    """
+    Leitura do corpo em streaming (opt-in via --stream_body).
+    
+    O corpo é lido em blocos e o download para ao atingir max_bytes. Com
+    head_extra_bytes, para também quando já apareceu evidência forte (a URL de
+    um script de gateway) e o documento passou de </head> + head_extra_bytes:
+    páginas que carregam o SDK no <head> não precisam ser baixadas inteiras.
+    Páginas sem evidência forte continuam sendo lidas até o limite.
+    """
+    def __init__(self, script_literals, max_bytes=2 * 1024 * 1024, head_extra_bytes=None):
+        self.script_literals = [literal.lower().encode('utf-8') for literal in script_literals if literal]
+        self.max_bytes = max_bytes
+        self.head_extra_bytes = head_extra_bytes
+        self.overlap = max([len(literal) for literal in self.script_literals] + [len(b'</head')]) - 1
+    
+    def start(self):
+        return BodyStreamState(self)
+
+
+class BodyStreamState:
+    """
+    Estado da leitura de um corpo (um por resposta)
+    """
+    def __init__(self, policy):
+        self.policy = policy
+        self.received = 0
+        self.strong_evidence = False
+        self.head_end = None
+        self.stop_reason = None
+        self._tail = b''
+    
+    def feed(self, chunk):
+        """
+        Processa um bloco; retorna False quando o download deve parar
+        """
+        policy = self.policy
+        window = self._tail + chunk.lower()
+        window_start = self.received - len(self._tail)
+        self.received += len(chunk)
+        
+        if not self.strong_evidence:
+            self.strong_evidence = any(literal in window for literal in policy.script_literals)
+        if self.head_end is None:
+            index = window.find(b'</head')
+            if index >= 0:
+                self.head_end = window_start + index
+        self._tail = window[-policy.overlap:] if policy.overlap else b''
+        
+        if self.received >= policy.max_bytes:
+            self.stop_reason = 'max_bytes'
+        elif (policy.head_extra_bytes is not None and self.strong_evidence and self.head_end is not None
+              and self.received >= self.head_end + policy.head_extra_bytes):
+            self.stop_reason = 'head'
+        return self.stop_reason is None
+    
+    def body(self, chunks):
+        return b''.join(chunks)[:self.policy.max_bytes]
+
+
+class DNSCache:
+    """
+    Cache de resolução de nomes do processo, instalado com install() no lugar
+    de socket.getaddrinfo (vale para os dois backends de fetch).
+    
+    getaddrinfo não informa o TTL dos registros: respostas valem ttl segundos
+    e nomes inexistentes (EAI_NONAME/EAI_NODATA) ficam em cache negativo por
+    negative_ttl segundos, para que um domínio inexistente numa lista grande
+    não seja consultado de novo a cada URL. Falhas transitórias do resolvedor
+    (EAI_AGAIN, EAI_FAIL...) não ficam em cache. Consultas simultâneas do
+    mesmo nome esperam a primeira.
+    """
+    # Códigos de socket.gaierror que são resposta definitiva (o nome não existe)
+    NEGATIVE_ERRORS = frozenset(
+        code for code in (getattr(socket, 'EAI_NONAME', None), getattr(socket, 'EAI_NODATA', None)) if code is not None
+    )
+    
+    def __init__(self, ttl=300.0, negative_ttl=60.0, max_entries=100000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._resolve = None
+    
+    def install(self):
+        # Um cache por processo: o último instalado substitui o anterior
+        current = getattr(socket.getaddrinfo, '__self__', None)
+        if isinstance(current, DNSCache) and current is not self:
+            current.uninstall()
+        if self._resolve is None:
+            self._resolve = socket.getaddrinfo
+            socket.getaddrinfo = self.getaddrinfo
+    
+    def uninstall(self):
+        if self._resolve is not None and socket.getaddrinfo == self.getaddrinfo:
+            socket.getaddrinfo = self._resolve
+        self._resolve = None
+    
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        key = (host, port, family, type, proto, flags)
+        with self._lock:
+            entry = self._entries.get(key)
+            owner = entry is None or entry[0] <= time.monotonic()
+            if owner:
+                # Expiração infinita enquanto a consulta está em andamento
+                future = Future()
+                self._entries[key] = (float('inf'), future)
+                self.misses += 1
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                future = entry[1]
+                self._entries.move_to_end(key)
+        
+        if not owner:
+            try:
+                addresses = future.result()
+            except socket.gaierror:
+                with self._lock:
+                    self.negative_hits += 1
+                raise
+            with self._lock:
+                self.hits += 1
+            return list(addresses)
+        
+        resolve = self._resolve or socket.getaddrinfo
+        try:
+            addresses = resolve(host, port, family, type, proto, flags)
+        except socket.gaierror as e:
+            self._finish(key, future, self.negative_ttl if e.errno in self.NEGATIVE_ERRORS else None)
+            future.set_exception(e)
+            raise
+        except BaseException as e:
+            # Erros transitórios (timeout, interrupção) não ficam em cache
+            self._finish(key, future, None)
+            future.set_exception(e)
+            raise
+        self._finish(key, future, self.ttl)
+        future.set_result(addresses)
+        return list(addresses)
+    
+    def _finish(self, key, future, ttl):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] is not future:
+                return
+            if ttl is None:
+                del self._entries[key]
+            else:
+                self._entries[key] = (time.monotonic() + ttl, future)
+    
+    def stats(self):
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+            'entries': len(self._entries)
+        }
+
+
+# HTTPAdapter do ManagedTransport, definido na primeira chamada de _managed_adapter_class
+# (requests é importado sob demanda)
+_ManagedHTTPAdapter = None
+
+
+def _managed_adapter_class():
+    global _ManagedHTTPAdapter
+    if _ManagedHTTPAdapter is None:
+        adapters = importlib.import_module('requests.adapters')
+        
+        class ManagedHTTPAdapter(adapters.HTTPAdapter):
+            def __init__(self, transport):
+                self.transport = transport
+                super().__init__(pool_connections=transport.max_hosts, pool_maxsize=transport.pool_per_host)
+            
+            def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+                super().init_poolmanager(connections, maxsize, block, ssl_context=self.transport.ssl_context,
+                                         **pool_kwargs)
+                self.poolmanager.pools.dispose_func = self.transport._dispose_pool
+            
+            def cert_verify(self, conn, url, verify, cert):
+                # Com verify=True os certificados de CA já estão no SSLContext compartilhado:
+                # não recarregar o bundle a cada conexão nova
+                if verify is True and not cert and url.lower().startswith('https'):
+                    conn.cert_reqs = 'CERT_REQUIRED'
+                    conn.ca_certs = None
+                    conn.ca_cert_dir = None
+                    return
+                super().cert_verify(conn, url, verify, cert)
+            
+            def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+                pool = super().get_connection_with_tls_context(request, verify, proxies, cert)
+                self.transport._pool_used(pool)
+                return pool
+        
+        _ManagedHTTPAdapter = ManagedHTTPAdapter
+    return _ManagedHTTPAdapter
+
+
+class ManagedTransport:
+    """
+    Camada de conexões do backend requests, compartilhada por todas as threads.
+    
+    Um único HTTPAdapter (pools do urllib3) atende as sessões de todas as
+    threads, então o keep-alive vale entre threads: até pool_per_host conexões
+    guardadas por host e pools para até max_hosts hosts (LRU), o que limita os
+    sockets ociosos a pool_per_host * max_hosts. As conexões TLS usam o mesmo
+    SSLContext, com os certificados de CA carregados uma única vez (sem isso
+    o bundle é recarregado a cada conexão nova). Conexões guardadas de hosts
+    sem uso há idle_timeout segundos são fechadas. host_stats() mostra, por
+    host, requisições, conexões abertas e a taxa de reuso do keep-alive.
+    """
+    def __init__(self, pool_per_host=4, max_hosts=1000, idle_timeout=30.0):
+        _lazy_import('requests')
+        import ssl
+        from requests.certs import where
+        self.pool_per_host = max(1, pool_per_host)
+        self.max_hosts = max(1, max_hosts)
+        self.idle_timeout = idle_timeout
+        self.ssl_context = ssl.create_default_context(cafile=where())
+        self.idle_closed = 0
+        self._lock = threading.Lock()
+        self._last_use = {}
+        self._closed_stats = {}
+        self._next_eviction = time.monotonic() + idle_timeout
+        self.adapter = _managed_adapter_class()(self)
+    
+    def mount(self, session):
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+    
+    def _pool_used(self, pool):
+        now = time.monotonic()
+        with self._lock:
+            self._last_use[pool] = now
+            if now < self._next_eviction:
+                return
+            self._next_eviction = now + self.idle_timeout / 2
+            idle = [idle_pool for idle_pool, last_use in self._last_use.items() if now - last_use > self.idle_timeout]
+        for idle_pool in idle:
+            self._close_idle_connections(idle_pool)
+    
+    def _close_idle_connections(self, pool):
+        """
+        Fecha as conexões guardadas do pool sem descartá-lo (outra thread pode estar usando o pool)
+        """
+        idle_queue = pool.pool
+        if idle_queue is None:
+            return
+        closed = 0
+        for _ in range(idle_queue.qsize()):
+            try:
+                conn = idle_queue.get(block=False)
+            except queue.Empty:
+                break
+            if conn is not None:
+                conn.close()
+                closed += 1
+            try:
+                idle_queue.put(None, block=False)
+            except queue.Full:
+                # Outra thread devolveu uma conexão nesse meio-tempo: a vaga já está ocupada
+                pass
+        with self._lock:
+            self.idle_closed += closed
+    
+    @staticmethod
+    def _pool_name(pool):
+        default_port = 443 if pool.scheme == 'https' else 80
+        return pool.host if pool.port in (None, default_port) else f"{pool.host}:{pool.port}"
+    
+    def _dispose_pool(self, pool):
+        # Pool despejado pelo LRU do urllib3: guardar os contadores do host
+        with self._lock:
+            self._last_use.pop(pool, None)
+            totals = self._closed_stats.setdefault(self._pool_name(pool), [0, 0])
+            totals[0] += pool.num_requests
+            totals[1] += pool.num_connections
+        pool.close()
+    
+    def host_stats(self):
+        """
+        {host: {'requests', 'connections', 'reuse_rate'}}; reuse_rate é a fração
+        das requisições que reaproveitou uma conexão aberta
+        """
+        with self._lock:
+            totals = {host: list(counts) for host, counts in self._closed_stats.items()}
+            for pool in self._last_use:
+                counts = totals.setdefault(self._pool_name(pool), [0, 0])
+                counts[0] += pool.num_requests
+                counts[1] += pool.num_connections
+        return {
+            host: {
+                'requests': requests_count,
+                'connections': connections,
+                'reuse_rate': max(0.0, 1 - connections / requests_count) if requests_count else 0.0
             }
+            for host, (requests_count, connections) in sorted(totals.items())
+        }
+    
+    def stats(self):
+        hosts = self.host_stats()
+        requests_count = sum(host['requests'] for host in hosts.values())
+        connections = sum(host['connections'] for host in hosts.values())
+        return {
+            'hosts': len(hosts),
+            'requests': requests_count,
+            'connections': connections,
+            'reuse_rate': max(0.0, 1 - connections / requests_count) if requests_count else 0.0,
+            'idle_closed': self.idle_closed
+        }
+
+
+class RequestsFetchBackend:
+    """
+    Backend padrão: requests bloqueante, uma requests.Session por thread
+    (requests.Session não é thread-safe). As sessões das threads herdam os
+    adapters da sessão principal (ver ManagedTransport), então os pools de
+    conexões são compartilhados.
+    """
+    is_async = False
+    # Tamanho máximo de cada leitura do corpo
+    READ_SIZE = 16 * 1024
+    
+    def __init__(self, session):
+        _lazy_import('requests')
+        _lazy_import('urllib3')
+        self.session = session
+        self._local = threading.local()
+    
+    def _get_session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            if threading.current_thread() is threading.main_thread():
+                session = self.session
+            else:
+                session = requests.Session()
+                session.headers.update(self.session.headers)
+                for prefix, adapter in self.session.adapters.items():
+                    session.mount(prefix, adapter)
+            self._local.session = session
+        return session
+    
+    def _iter_body(self, response):
+        """
+        Pedaços do corpo conforme chegam do socket. read1 devolve o que uma
+        leitura trouxe, sem esperar juntar READ_SIZE bytes: com iter_content
+        (ou read) um servidor que manda poucos bytes por vez seguraria o fetch
+        muito além do prazo total. urllib3 < 2 não tem read1 e usa read.
+        Erros do urllib3 viram as exceções do requests, como em iter_content.
+        """
+        raw = response.raw
+        read = getattr(raw, 'read1', None) or raw.read
+        try:
+            while True:
+                chunk = read(self.READ_SIZE, decode_content=True)
+                if not chunk:
+                    return
+                yield chunk
+        except urllib3.exceptions.ReadTimeoutError as e:
+            raise requests.exceptions.ReadTimeout(e)
+        except urllib3.exceptions.ProtocolError as e:
+            raise requests.exceptions.ChunkedEncodingError(e)
+        except urllib3.exceptions.DecodeError as e:
+            raise requests.exceptions.ContentDecodingError(e)
+        except urllib3.exceptions.HTTPError as e:
+            raise requests.exceptions.ConnectionError(e)
+    
+    def fetch(self, url, timeout, headers=None, body_policy=None):
+        """
+        Baixa a página com um prazo total de timeout segundos por URL
+        (o timeout do requests vale apenas por operação de socket; o prazo
+        é checado a cada leitura do corpo, ver _iter_body)
+        """
+        deadline = time.monotonic() + timeout
+        body_state = body_policy.start() if body_policy else None
+        start = time.perf_counter()
+        response = self._get_session().get(url, timeout=timeout, headers=headers, stream=True)
+        headers_received = time.perf_counter()
+        try:
+            response.raise_for_status()
+            chunks = []
+            for chunk in self._iter_body(response):
+                chunks.append(chunk)
+                if time.monotonic() > deadline:
+                    raise requests.exceptions.Timeout(f"Tempo total de {timeout}s excedido ao baixar {url}")
+                if body_state is not None and not body_state.feed(chunk):
+                    break
+            content = body_state.body(chunks) if body_state else b''.join(chunks)
+            # Sem charset no cabeçalho, requests detecta a codificação pelo conteúdo
+            response._content = content
+            encoding = response.encoding or response.apparent_encoding
+        finally:
+            response.close()
+        truncated = body_state.stop_reason if body_state else None
+        timings = {'connect': headers_received - start, 'download': time.perf_counter() - headers_received}
+        return FetchedPage(response.url, response.status_code, response.headers, content, encoding, truncated, timings)
+    
+    def close(self):
+        self.session.close()
+
+
+class AsyncFetchBackend:
+    """
+    Backend assíncrono (httpx + asyncio): milhares de conexões simultâneas
+    com pool, keep-alive e HTTP/2 quando o pacote h2 está disponível.
+    
+    O event loop roda numa thread própria; as corrotinas são submetidas com
+    submit() e devolvem concurrent.futures.Future, então o restante do crawler
+    continua síncrono. Parsing e detecção devem ser enviados a um executor
+    (ver GatewayCrawlerV2._analyze_page_async) para nunca travar o loop.
+    """
+    is_async = True
+    
+    def __init__(self, headers, concurrency=500, http2=True, keepalive_expiry=30.0):
+        if importlib.util.find_spec('httpx') is None:
+            raise RuntimeError("O backend async requer o pacote httpx (pip install 'httpx[http2]')")
+        _lazy_import('httpx')
+        _lazy_import('asyncio')
+        self.headers = dict(headers)
+        self.concurrency = max(1, concurrency)
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2 and importlib.util.find_spec('h2') is not None
+        if http2 and not self.http2:
+            logger.warning("Pacote h2 não instalado: backend async usará apenas HTTP/1.1")
+        
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='async-fetch', daemon=True)
+        self._thread.start()
+        self._client = self._run(self._create_client())
+    
+    async def _create_client(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        limits = httpx.Limits(
+            max_connections=self.concurrency,
+            max_keepalive_connections=self.concurrency,
+            keepalive_expiry=self.keepalive_expiry
+        )
+        return httpx.AsyncClient(headers=self.headers, limits=limits, http2=self.http2, follow_redirects=True)
+    
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+    
+    def submit(self, coro):
+        """
+        Agenda uma corrotina no loop do backend e retorna um concurrent.futures.Future
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+    
+    async def _download(self, url, timeout, headers, body_state):
+        start = time.perf_counter()
+        async with self._client.stream('GET', url, timeout=timeout, headers=headers) as response:
+            headers_received = time.perf_counter()
+            if response.is_error or body_state is None:
+                await response.aread()
+                content = response.content
+            else:
+                chunks = []
+                async for chunk in response.aiter_bytes(64 * 1024):
+                    chunks.append(chunk)
+                    if not body_state.feed(chunk):
+                        break
+                content = body_state.body(chunks)
+            timings = {'connect': headers_received - start, 'download': time.perf_counter() - headers_received}
+            return response, content, timings
+    
+    async def fetch_async(self, url, timeout, headers=None, body_policy=None):
+        """
+        Baixa a página; erros são convertidos nas exceções de requests para que
+        o tratamento de erros seja o mesmo nos dois backends
+        """
+        body_state = body_policy.start() if body_policy else None
+        async with self._semaphore:
+            try:
+                response, content, timings = await asyncio.wait_for(self._download(url, timeout, headers, body_state), timeout)
+            except asyncio.TimeoutError:
+                raise requests.exceptions.Timeout(f"Tempo total de {timeout}s excedido ao baixar {url}")
+            except httpx.TimeoutException as e:
+                raise requests.exceptions.Timeout(str(e) or f"Timeout ao acessar {url}")
+            except httpx.InvalidURL as e:
+                raise requests.exceptions.InvalidURL(str(e))
+            except httpx.HTTPError as e:
+                raise requests.exceptions.ConnectionError(str(e) or repr(e))
+        
+        if response.is_error:
+            kind = 'Client' if response.status_code < 500 else 'Server'
+            page = FetchedPage(str(response.url), response.status_code, response.headers, b'')
+            raise requests.exceptions.HTTPError(
+                f"{response.status_code} {kind} Error: {response.reason_phrase} for url: {response.url}",
+                response=page
+            )
+        truncated = body_state.stop_reason if body_state else None
+        return FetchedPage(str(response.url), response.status_code, response.headers, content, response.encoding, truncated,
+                           timings)
+    
+    def fetch(self, url, timeout, headers=None, body_policy=None):
+        return self._run(self.fetch_async(url, timeout, headers, body_policy))
+    
+    def close(self):
+        self._run(self._client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+# Parâmetros de rastreamento/sessão removidos das URLs ('*' no fim = prefixo)
+TRACKING_QUERY_PARAMS = ('utm_*', 'gclid', 'fbclid', 'msclkid', 'dclid', 'yclid', 'mc_cid', 'mc_eid', '_ga', '_gl',
+                         'igshid', 'phpsessid', 'jsessionid', 'sessionid', 'sid')
+
+# Recursos que não contêm código de checkout
+SKIP_EXTENSIONS = frozenset((
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'svg', 'ico', 'bmp', 'tif', 'tiff', 'avif',
+    'pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'odt', 'csv', 'txt', 'rtf',
+    'zip', 'rar', '7z', 'gz', 'tgz', 'bz2', 'tar', 'exe', 'dmg', 'apk', 'msi', 'iso',
+    'mp3', 'mp4', 'm4a', 'wav', 'ogg', 'avi', 'mov', 'wmv', 'webm', 'flv',
+    'woff', 'woff2', 'ttf', 'otf', 'eot', 'css', 'js', 'json', 'xml', 'rss', 'atom',
+))
+
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
+
+class URLCanonicalizer:
+    """
+    Canonicalização e filtro dos links do crawling.
+    
+    canonicalize() devolve a forma canônica da URL (esquema/host em minúsculas,
+    sem porta padrão, sem credenciais, sem fragmento, com segmentos '.'/'..'
+    resolvidos e a query filtrada e ordenada) ou None quando o link deve ser
+    ignorado: esquema não HTTP, extensão de recurso não HTML ou armadilha
+    (segmento de caminho repetido mais de max_path_repeats vezes, caminho
+    fundo demais ou URL longa demais, típicos de calendários e navegação facetada).
+    
+    query_allow, quando dado, mantém apenas esses parâmetros; query_deny remove
+    parâmetros (rastreamento/sessão por padrão). admit() aplica o limite de
+    páginas por host (o crawl conta cada página uma vez, no despacho) e
+    accepts_content_type() o filtro de MIME após o fetch.
+    """
+    def __init__(self, query_allow=None, query_deny=TRACKING_QUERY_PARAMS, skip_extensions=SKIP_EXTENSIONS,
+                 content_types=HTML_CONTENT_TYPES, max_pages_per_host=None, max_path_repeats=2,
+                 max_path_depth=15, max_url_length=2048):
+        self.query_allow = {param.lower() for param in query_allow} if query_allow else None
+        deny = [param.lower() for param in query_deny or ()]
+        self.query_deny = {param for param in deny if not param.endswith('*')}
+        self.query_deny_prefixes = tuple(param[:-1] for param in deny if param.endswith('*'))
+        self.skip_extensions = frozenset(skip_extensions or ())
+        self.content_types = tuple(content_types) if content_types else None
+        self.max_pages_per_host = max_pages_per_host
+        self.max_path_repeats = max_path_repeats
+        self.max_path_depth = max_path_depth
+        self.max_url_length = max_url_length
+        self.pages_per_host = {}
+        self.rejected = 0
+    
+    def _keep_param(self, name):
+        name = name.lower()
+        if self.query_allow is not None:
+            return name in self.query_allow
+        return name not in self.query_deny and not name.startswith(self.query_deny_prefixes)
+    
+    @staticmethod
+    def _remove_dot_segments(path):
+        segments = []
+        for segment in path.split('/'):
+            if segment == '..':
+                if len(segments) > 1:
+                    segments.pop()
+            elif segment != '.':
+                segments.append(segment)
+        return '/'.join(segments)
+    
+    def _is_trap(self, segments):
+        if len(segments) > self.max_path_depth:
+            return True
+        counts = {}
+        for segment in segments:
+            counts[segment] = counts.get(segment, 0) + 1
+            if counts[segment] > self.max_path_repeats:
+                return True
+        return False
+    
+    def canonicalize(self, url):
+        try:
+            parsed = urlparse(url)
+            port = parsed.port
+        except ValueError:
+            return None
+        scheme = parsed.scheme.lower()
+        if scheme not in ('http', 'https') or not parsed.hostname:
+            return None
+        
+        host = parsed.hostname.rstrip('.')
+        if ':' in host:
+            host = f"[{host}]"
+        if port is not None and not ((scheme == 'http' and port == 80) or (scheme == 'https' and port == 443)):
+            host = f"{host}:{port}"
+        
+        path = self._remove_dot_segments(parsed.path)
+        segments = [segment for segment in path.split('/') if segment]
+        if segments and self._is_trap(segments):
+            return None
+        if segments and '.' in segments[-1]:
+            if segments[-1].rsplit('.', 1)[1].lower() in self.skip_extensions:
+                return None
+        
+        query = ''
+        if parsed.query:
+            params = [(name, value) for name, value in parse_qsl(parsed.query, keep_blank_values=True)
+                      if self._keep_param(name)]
+            query = urlencode(sorted(params))
+        
+        canonical = f"{scheme}://{host}{path}"
+        if canonical.endswith('/'):
+            canonical = canonical[:-1]
+        if query:
+            canonical += f"?{query}"
+        if len(canonical) > self.max_url_length:
+            return None
+        return canonical
+    
+    def has_room(self, url):
+        """
+        True se o host ainda não atingiu max_pages_per_host (não conta a página)
+        """
+        if self.max_pages_per_host is None:
+            return True
+        return self.pages_per_host.get(urlparse(url).netloc, 0) < self.max_pages_per_host
+    
+    def admit(self, url):
+        """
+        Conta a página para o host; False quando o host já atingiu max_pages_per_host
+        """
+        if self.max_pages_per_host is None:
+            return True
+        host = urlparse(url).netloc
+        count = self.pages_per_host.get(host, 0)
+        if count >= self.max_pages_per_host:
+            self.rejected += 1
+            return False
+        self.pages_per_host[host] = count + 1
+        return True
+    
+    def accepts_content_type(self, content_type):
+        if self.content_types is None or not content_type:
+            return True
+        return content_type.split(';', 1)[0].strip().lower() in self.content_types
+
+
+def normalize_cache_key(url):
+    """
+    Chave do cache HTTP: esquema/host em minúsculas, sem porta padrão e sem fragmento
+    """
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    netloc = parsed.netloc.lower()
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    path = parsed.path or '/'
+    return f"{scheme}://{netloc}{path}" + (f"?{parsed.query}" if parsed.query else '')
+
+
+class HTTPCache:
+    """
+    Cache HTTP persistente em SQLite para re-scans (opt-in via --http_cache).
+    
+    Guarda corpo, ETag e Last-Modified das respostas 200 que têm validadores;
+    no re-scan a requisição sai com If-None-Match/If-Modified-Since e um 304
+    reaproveita o corpo armazenado. Entradas expiram após ttl segundos e o
+    tamanho total é limitado por max_bytes com despejo LRU (último acesso).
+    """
+    def __init__(self, path, ttl=30 * 86400, max_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                status_code INTEGER,
+                headers TEXT,
+                content BLOB,
+                encoding TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL,
+                last_access REAL,
+                size INTEGER
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    
+    def get(self, url):
+        """
+        Retorna (FetchedPage, cabeçalhos condicionais) ou None se não houver entrada válida
+        """
+        key = normalize_cache_key(url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, status_code, headers, content, encoding, etag, last_modified, stored_at, size "
+                "FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            final_url, status_code, headers, content, encoding, etag, last_modified, stored_at, size = row
+            if time.time() - stored_at > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_size -= size
+                return None
+        
+        conditional_headers = {}
+        if etag:
+            conditional_headers['If-None-Match'] = etag
+        if last_modified:
+            conditional_headers['If-Modified-Since'] = last_modified
+        from requests.structures import CaseInsensitiveDict
+        page = FetchedPage(final_url, status_code, CaseInsensitiveDict(json.loads(headers)), content, encoding)
+        return page, conditional_headers
+    
+    def revalidated(self, url):
+        """
+        Registra um 304: a entrada continua válida e passa a ser a mais recente no LRU
+        """
+        now = time.time()
+        with self._lock:
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE responses SET stored_at = ?, last_access = ? WHERE key = ?",
+                (now, now, normalize_cache_key(url))
+            )
+    
+    def store(self, url, page):
+        """
+        Armazena uma resposta 200 completa que tenha ETag ou Last-Modified
+        """
+        with self._lock:
+            self.misses += 1
+        etag = page.headers.get('ETag')
+        last_modified = page.headers.get('Last-Modified')
+        if page.status_code != 200 or page.truncated or not (etag or last_modified):
+            return
+        size = len(page.content)
+        if size > self.max_bytes:
+            return
+        
+        key = normalize_cache_key(url)
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if previous:
+                self._total_size -= previous[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, page.url, page.status_code, json.dumps(dict(page.headers)), page.content,
+                 page.encoding, etag, last_modified, now, now, size)
+            )
+            self._total_size += size
+            self._evict()
+    
+    def _evict(self):
+        # Despejo LRU até caber em max_bytes
+        while self._total_size > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 100"
+            ).fetchall()
+            if not rows:
+                self._total_size = 0
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_size -= size
+                if self._total_size <= self.max_bytes:
+                    break
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class DetectionMemo:
+    """
+    LRU em memória de resultados de detecção indexado pelo hash do corpo.
+    
+    Páginas byte a byte idênticas (paginação, variações de parâmetros de
+    rastreamento, domínios espelho) custam só o download: o parse e a
+    passada de assinaturas são reaproveitados da primeira ocorrência.
+    """
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(page, deep_analysis):
+        digest = hashlib.blake2b(page.content, digest_size=16).digest()
+        return digest, page.encoding, deep_analysis
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        result, anchors = entry
+        return copy.deepcopy(result), anchors
+    
+    def put(self, key, result, anchors):
+        entry = (copy.deepcopy(result), tuple(anchors))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._entries)
+        }
+
+
+class ScriptAssetCache:
+    """
+    Cache dos scripts externos varridos (opt-in via --scan_scripts), compartilhado
+    por todo o crawling.
+    
+    Cada URL de script é baixada uma única vez: páginas que pedem a mesma URL
+    ao mesmo tempo esperam o primeiro download. O resultado da varredura fica
+    indexado pelo hash do conteúdo, então cópias idênticas servidas por URLs
+    diferentes (CDNs, parâmetros de versão) também são varridas uma vez só.
+    Os dois índices são LRU limitados a max_entries. Downloads que falham não
+    ficam em cache: a próxima página que pedir o script tenta de novo.
+    """
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.downloads = 0
+        self.scans = 0
+        self.failures = 0
+        self._by_url = OrderedDict()
+        self._by_digest = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def literals(self, url, fetch, scan):
+        """
+        Literais encontrados no script (frozenset), ou None se o download falhar.
+        fetch(url) retorna um FetchedPage e scan(texto em minúsculas) os literais.
+        """
+        key = normalize_cache_key(url)
+        with self._lock:
+            future = self._by_url.get(key)
+            owner = future is None
+            if owner:
+                future = self._by_url[key] = Future()
+                self.downloads += 1
+                while len(self._by_url) > self.max_entries:
+                    self._by_url.popitem(last=False)
+            else:
+                self._by_url.move_to_end(key)
+                self.hits += 1
+        if not owner:
+            return future.result()
+        
+        found = None
+        try:
+            try:
+                page = fetch(url)
+            except requests.exceptions.RequestException as e:
+                logger.debug(f"Script externo indisponível {url}: {e}")
+                with self._lock:
+                    self.failures += 1
+                return found
+            
+            digest = hashlib.blake2b(page.content, digest_size=16).digest()
+            with self._lock:
+                cached = self._by_digest.get(digest)
+                if cached is not None:
+                    self._by_digest.move_to_end(digest)
+            if cached is not None:
+                found = cached
+                return found
+            
+            found = frozenset(scan(page.text.lower()))
+            with self._lock:
+                self.scans += 1
+                self._by_digest[digest] = found
+                while len(self._by_digest) > self.max_entries:
+                    self._by_digest.popitem(last=False)
+            return found
+        finally:
+            if found is None:
+                # Quem já esperava recebe a falha; os próximos pedidos baixam de novo
+                with self._lock:
+                    if self._by_url.get(key) is future:
+                        del self._by_url[key]
+            future.set_result(found)
+    
+    def stats(self):
+        requests_total = self.hits + self.downloads
+        return {
+            'hits': self.hits,
+            'downloads': self.downloads,
+            'scans': self.scans,
+            'failures': self.failures,
+            'hit_rate': self.hits / requests_total if requests_total else 0.0
+        }
+
+
+class PageDetector:
+    """
+    Detecção de gateways sobre uma página já baixada: backend de parsing e
+    SignatureMatcher. É o único estado de que os processos do DetectionPool
+    precisam (sem sessão HTTP, pools de conexão, cache DNS nem fronteira).
+    """
+    def __init__(self, signature_matcher, parser):
+        self.signature_matcher = signature_matcher
+        self.parser = parser
+    
+    def analyze_document(self, url, page, features, deep_analysis=False):
+        """
+        Executa a detecção de gateways sobre uma resposta já baixada e parseada
+        """
+        page_content = page.text.lower()
+        
+        results = {
+            'url': url,
+            'status_code': page.status_code,
+            'gateways_found': [],
+            'evidence': {},
+            'confidence_scores': {},
+            'analysis_time': datetime.now().isoformat(),
+            'page_title': features['title'],
+            'page_size': len(page.text)
+        }
+        
+        # Análise de todos os gateways numa única passada
+        start = time.perf_counter()
+        for gateway_name, (evidence, confidence) in self.signature_matcher.match(page_content, features).items():
+            results['gateways_found'].append(gateway_name)
+            results['evidence'][gateway_name] = evidence
+            results['confidence_scores'][gateway_name] = confidence
+        timings = {'match': time.perf_counter() - start}
+        
+        # Análise adicional se solicitada
+        if deep_analysis:
+            start = time.perf_counter()
+            results['additional_analysis'] = self.deep_analysis(features, page_content)
+            timings['deep'] = time.perf_counter() - start
+        results['timings'] = timings
+        
+        # Download interrompido pela leitura em streaming (--stream_body)
+        if page.truncated:
+            results['body_truncated'] = page.truncated
+        
+        return results
+    
+    @staticmethod
+    def deep_analysis(features, page_content):
+        """
+        Análise adicional mais profunda
+        """
+        analysis = {}
+        
+        # Verificar iframes de pagamento
+        payment_iframes = []
+        for src in features['iframe_srcs']:
+            if any(keyword in src.lower() for keyword in ['payment', 'checkout', 'pay']):
+                payment_iframes.append(src)
+        
+        if payment_iframes:
+            analysis['payment_iframes'] = payment_iframes
+        
+        # Verificar links externos suspeitos
+        external_links = []
+        for href in features['anchor_hrefs']:
+            if any(gateway in href.lower() for gateway in ['stripe', 'paypal', 'mercadopago', 'adyen', 'braintree', 'shopify']):
+                external_links.append(href)
+        
+        if external_links:
+            analysis['external_payment_links'] = external_links
+        
+        # Verificar inputs de cartão de crédito
+        credit_card_inputs = []
+        for input_type, input_name, input_id in features['inputs']:
+            if any(keyword in f"{input_type} {input_name} {input_id}".lower() 
+                   for keyword in ['card', 'credit', 'cvv', 'expiry', 'cc-number', 'cc-exp', 'cc-csc']):
+                credit_card_inputs.append({
+                    'type': input_type,
+                    'name': input_name,
+                    'id': input_id
+                })
+        
+        if credit_card_inputs:
+            analysis['credit_card_inputs'] = credit_card_inputs
+        
+        return analysis
+
+
+# PageDetector de cada processo do DetectionPool (criado uma vez por processo)
+_detection_worker = None
+
+
+def _init_detection_worker(signature_pack, parser):
+    global _detection_worker
+    # O pack chega com o SignatureMatcher já compilado
+    _detection_worker = PageDetector(signature_pack.matcher(), get_parser_backend(parser))
+
+
+def _detect_batch(tasks):
+    """
+    Parsing + detecção de um lote de páginas dentro de um processo do pool;
+    retorna (resultado, links [(href, texto)], src dos scripts) ou a exceção de cada página
+    """
+    outputs = []
+    for url, status_code, content, encoding, truncated, deep_analysis in tasks:
+        try:
+            page = FetchedPage(url, status_code, {}, content, encoding, truncated)
+            start = time.perf_counter()
+            features = _detection_worker.parser.extract_features(page.text)
+            parse_time = time.perf_counter() - start
+            results = _detection_worker.analyze_document(url, page, features, deep_analysis)
+            results['timings'] = {'parse': parse_time, **results['timings']}
+            outputs.append(((results, _page_anchors(features), tuple(features['script_srcs'])), None))
+        except Exception as e:
+            outputs.append((None, e))
+    return outputs
+
+
+class DetectionPool:
+    """
+    Estágio de detecção em processos (opt-in via --processes).
+    
+    As threads de I/O continuam baixando as páginas; o parsing e a verificação
+    de assinaturas rodam num ProcessPoolExecutor, fora do GIL. Cada processo
+    monta as tabelas de assinaturas uma única vez no initializer, e as páginas
+    são enviadas em lotes de até batch_size (ou após max_delay segundos) para
+    diluir o custo de IPC por página.
+    """
+    def __init__(self, signature_pack, parser='html.parser', processes=None, batch_size=8, max_delay=0.005):
+        from concurrent.futures import ProcessPoolExecutor
+        self.executor = ProcessPoolExecutor(max_workers=processes, initializer=_init_detection_worker,
+                                            initargs=(signature_pack, parser))
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._pending = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._flusher = threading.Thread(target=self._run_flusher, daemon=True)
+        self._flusher.start()
+    
+    def submit(self, url, page, deep_analysis=False):
+        future = Future()
+        task = (url, page.status_code, page.content, page.encoding, page.truncated, deep_analysis)
+        batch = None
+        with self._cond:
+            self._pending.append((task, future))
+            if len(self._pending) >= self.batch_size:
+                batch, self._pending = self._pending, []
+            elif len(self._pending) == 1:
+                self._cond.notify()
+        if batch:
+            self._dispatch(batch)
+        return future
+    
+    def detect(self, url, page, deep_analysis=False):
+        """
+        Bloqueia a thread chamadora até o resultado do processo; retorna
+        (resultado, links [(href, texto)], src dos scripts)
+        """
+        return self.submit(url, page, deep_analysis).result()
+    
+    def _run_flusher(self):
+        # Lotes incompletos são enviados após max_delay para não segurar páginas
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._pending:
+                    return
+            time.sleep(self.max_delay)
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if batch:
+                self._dispatch(batch)
+    
+    def _dispatch(self, batch):
+        futures = [future for _, future in batch]
+        try:
+            process_future = self.executor.submit(_detect_batch, [task for task, _ in batch])
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        
+        def deliver(done):
+            try:
+                outputs = done.result()
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                return
+            for future, (output, error) in zip(futures, outputs):
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(output)
+        
+        process_future.add_done_callback(deliver)
+    
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._flusher.join()
+        self.executor.shutdown()
+
+
+class URLFingerprintSet:
+    """
+    Conjunto de URLs visitadas guardando só fingerprints de 64 bits (blake2b)
+    numa tabela hash de endereçamento aberto sobre array('Q'): ~16 bytes por
+    URL com carga de 50%, contra ~150 bytes de um set de strings. Uma colisão
+    de 64 bits só se torna provável perto de 2**32 URLs.
+    """
+    def __init__(self, urls=(), capacity=1024):
+        self._size = 0
+        self._mask = capacity - 1
+        self._table = array('Q', bytes(8 * capacity))
+        for url in urls:
+            self.add(url)
+    
+    @staticmethod
+    def fingerprint(url):
+        # 0 marca posição vazia na tabela
+        return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+    
+    def _slot(self, fingerprint):
+        table = self._table
+        mask = self._mask
+        index = fingerprint & mask
+        while table[index] and table[index] != fingerprint:
+            index = (index + 1) & mask
+        return index
+    
+    def add(self, url):
+        fingerprint = self.fingerprint(url)
+        index = self._slot(fingerprint)
+        if self._table[index]:
+            return
+        self._table[index] = fingerprint
+        self._size += 1
+        if self._size * 2 > len(self._table):
+            self._grow()
+    
+    def _grow(self):
+        old_table = self._table
+        self._table = array('Q', bytes(16 * len(old_table)))
+        self._mask = len(self._table) - 1
+        for fingerprint in old_table:
+            if fingerprint:
+                self._table[self._slot(fingerprint)] = fingerprint
+    
+    def __contains__(self, url):
+        return self._table[self._slot(self.fingerprint(url))] != 0
+    
+    def __len__(self):
+        return self._size
+
+
+class SpillableFrontier:
+    """
+    Fronteira FIFO de (url, profundidade) que mantém no máximo memory_limit
+    itens em memória; o excedente vai para um arquivo temporário e volta em
+    blocos conforme a cabeça da fila esvazia, preservando a ordem BFS.
+    """
+    def __init__(self, items=(), memory_limit=100000, spill_dir=None):
+        self.memory_limit = max(1, memory_limit)
+        self.spill_dir = spill_dir
+        self._head = deque()
+        self._spill = None
+        self._spill_buffer = []
+        self._spill_read = 0
+        self._spilled = 0
+        for url, depth in items:
+            self.append((url, depth))
+    
+    def append(self, item, score=0):
+        # score é ignorado: a ordem é sempre FIFO (ver PriorityFrontier)
+        if not self._spilled and len(self._head) < self.memory_limit:
+            self._head.append(item)
+            return
+        url, depth = item
+        self._spill_buffer.append(f"{depth}\t{url}\n")
+        self._spilled += 1
+        if len(self._spill_buffer) >= 1000:
+            self._flush_spill()
+    
+    def _flush_spill(self):
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(mode='w+', encoding='utf-8', dir=self.spill_dir)
+        self._spill.seek(0, 2)
+        self._spill.writelines(self._spill_buffer)
+        self._spill_buffer = []
+    
+    def _refill(self):
+        if self._spill_buffer:
+            self._flush_spill()
+        self._spill.seek(self._spill_read)
+        while len(self._head) < self.memory_limit:
+            line = self._spill.readline()
+            if not line:
+                break
+            depth, url = line.rstrip('\n').split('\t', 1)
+            self._head.append((url, int(depth)))
+            self._spilled -= 1
+        self._spill_read = self._spill.tell()
+        if not self._spilled:
+            # Arquivo consumido por completo: recomeçar do início
+            self._spill.seek(0)
+            self._spill.truncate()
+            self._spill_read = 0
+    
+    def popleft(self):
+        if not self._head and self._spilled:
+            self._refill()
+        return self._head.popleft()
+    
+    def pop_scored(self):
+        return self.popleft(), 0
+    
+    def __len__(self):
+        return len(self._head) + self._spilled
+    
+    def __bool__(self):
+        return len(self) > 0
+    
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+
+# Termos de URL/texto de link que levam a páginas com código de pagamento
+# (mesma ideia dos termos de PageDetector.deep_analysis); negativos para seções sem checkout
+CHECKOUT_LINK_KEYWORDS = {
+    'checkout': 5, 'payment': 5, 'payments': 5, 'pagamento': 5, 'pay': 4, 'pagar': 4, 'finalizar': 4,
+    'cart': 4, 'basket': 4, 'carrinho': 4, 'sacola': 3, 'donate': 4, 'donation': 4, 'doar': 4, 'doação': 4, 'doacao': 4,
+    'subscribe': 3, 'subscription': 3, 'assinar': 3, 'assinatura': 3, 'pricing': 3, 'plans': 3, 'planos': 3,
+    'preços': 3, 'precos': 3, 'billing': 3, 'buy': 3, 'comprar': 3, 'order': 2, 'pedido': 2, 'upgrade': 2,
+    'premium': 2, 'shop': 1, 'store': 1, 'loja': 1, 'product': 1, 'produto': 1,
+    'blog': -2, 'news': -2, 'noticias': -2, 'notícias': -2, 'press': -2, 'careers': -2, 'carreiras': -2,
+    'privacy': -2, 'privacidade': -2, 'terms': -2, 'termos': -2,
+}
+
+_WORD_RE = re.compile(r'[^\W\d_]+')
+
+
+def score_link(url, text=''):
+    """
+    Prioridade de um link no crawling pelos termos do caminho, da query e do texto do link
+    """
+    parsed = urlparse(url)
+    words = set(_WORD_RE.findall(f"{parsed.path} {parsed.query} {text}".lower()))
+    return sum(CHECKOUT_LINK_KEYWORDS.get(word, 0) for word in words)
+
+
+class PriorityFrontier:
+    """
+    Fronteira com prioridade (opt-in via --priority): links com pontuação
+    positiva (score_link) vão para um heap e saem primeiro, do maior para o
+    menor score e, no empate, do mais raso para o mais fundo; o restante segue
+    em ordem BFS numa SpillableFrontier, que limita o uso de memória.
+    """
+    def __init__(self, items=(), memory_limit=100000, spill_dir=None):
+        self._heap = []
+        self._seq = 0
+        self._fifo = SpillableFrontier(memory_limit=memory_limit, spill_dir=spill_dir)
+        for url, depth in items:
+            self.append((url, depth))
+    
+    def append(self, item, score=0):
+        if score > 0:
+            heapq.heappush(self._heap, (-score, item[1], self._seq, item))
+            self._seq += 1
+        else:
+            self._fifo.append(item)
+    
+    def popleft(self):
+        return self.pop_scored()[0]
+    
+    def pop_scored(self):
+        """
+        Próximo item e sua pontuação (0 para os itens em ordem BFS)
+        """
+        if self._heap:
+            negative_score, _, _, item = heapq.heappop(self._heap)
+            return item, -negative_score
+        return self._fifo.popleft(), 0
+    
+    def __len__(self):
+        return len(self._heap) + len(self._fifo)
+    
+    def __bool__(self):
+        return len(self) > 0
+    
+    def close(self):
+        self._fifo.close()
+
+
+class CrawlCheckpoint:
+    """
+    Estado do crawl persistido em SQLite como log append-only: URLs enfileiradas
+    na fronteira e resultados concluídos. As gravações ficam em buffer e vão ao
+    disco numa única transação a cada interval segundos, então o custo por
+    página é mínimo; um crash perde no máximo esse intervalo.
+    
+    Ao retomar (--resume), visitadas = URLs com resultado gravado e fronteira =
+    URLs enfileiradas ainda sem resultado, na ordem original.
+    """
+    def __init__(self, path, interval=5.0, resume=False):
+        self.path = path
+        self.interval = interval
+        self._enqueued = []
+        self._results = []
+        self._last_flush = time.monotonic()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS frontier (seq INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT, depth INTEGER)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS completed (seq INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT, result TEXT)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS completed_url ON completed (url)")
+        if not resume:
+            self._conn.execute("DELETE FROM frontier")
+            self._conn.execute("DELETE FROM completed")
+        self._conn.commit()
+    
+    def record_enqueued(self, url, depth):
+        self._enqueued.append((url, depth))
+        self.maybe_flush()
+    
+    def record_result(self, result):
+        self._results.append((result['url'], json.dumps(result, ensure_ascii=False)))
+        self.maybe_flush()
+    
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+    
+    def flush(self):
+        if self._enqueued or self._results:
+            with self._conn:
+                self._conn.executemany("INSERT INTO frontier (url, depth) VALUES (?, ?)", self._enqueued)
+                self._conn.executemany("INSERT INTO completed (url, result) VALUES (?, ?)", self._results)
+            self._enqueued = []
+            self._results = []
+        self._last_flush = time.monotonic()
+    
+    def load(self):
+        """
+        Retorna (fronteira pendente [(url, profundidade)], URLs concluídas)
+        e compacta a tabela da fronteira para conter só o que está pendente
+        """
+        self.flush()
+        completed = URLFingerprintSet(row[0] for row in self._conn.execute("SELECT url FROM completed"))
+        
+        pending = []
+        seen = URLFingerprintSet()
+        for url, depth in self._conn.execute("SELECT url, depth FROM frontier ORDER BY seq"):
+            if url in completed or url in seen:
+                continue
+            seen.add(url)
+            pending.append((url, depth))
+        
+        with self._conn:
+            self._conn.execute("DELETE FROM frontier")
+            self._conn.executemany("INSERT INTO frontier (url, depth) VALUES (?, ?)", pending)
+        return pending, completed
+    
+    def iter_results(self):
+        """
+        Gera os resultados concluídos gravados, lendo do disco sob demanda
+        """
+        self.flush()
+        cursor = self._conn.cursor()
+        cursor.execute("SELECT result FROM completed ORDER BY seq")
+        for row in cursor:
+            yield json.loads(row[0])
+    
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+
+class RescanStore:
+    """
+    Estado do modo incremental (--rescan) em SQLite: por URL, os gateways e as
+    confianças da última verificação e a data da próxima.
+    
+    O intervalo de revisita de cada URL segue a frequência de mudança
+    observada: é multiplicado por growth a cada verificação sem mudança e
+    dividido por growth quando algo muda, dentro de [min_interval,
+    max_interval]. Sites estáveis passam a ser visitados raramente e os
+    voláteis com frequência. Cada verificação gera um delta (gateway
+    adicionado/removido, confiança alterada em pelo menos confidence_delta)
+    e report() monta o relatório só com as diferenças da execução.
+    Falhas de fetch mantêm o estado anterior e a URL volta após min_interval.
+    """
+    def __init__(self, path, min_interval=86400.0, max_interval=30 * 86400.0, growth=2.0, confidence_delta=1,
+                 force=False, interval=5.0):
+        self.path = path
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.growth = growth
+        self.confidence_delta = confidence_delta
+        self.force = force
+        self.interval = interval
+        self.counts = dict.fromkeys(('listed', 'not_due', 'checked', 'new', 'changed', 'unchanged', 'errors'), 0)
+        self.changes = []
+        self.new_urls = []
+        self.errors = []
+        self.started = datetime.now().isoformat()
+        # Linhas ainda não gravadas (url -> valores da tabela), lidas antes do disco
+        self._updates = {}
+        self._last_flush = time.monotonic()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                gateways TEXT,
+                confidence TEXT,
+                checked_at REAL,
+                next_check REAL,
+                revisit_interval REAL,
+                checks INTEGER,
+                changes INTEGER
+            )
+        """)
+        self._conn.commit()
+    
+    def _row(self, url):
+        """
+        (gateways, confiança, próxima verificação, intervalo, verificações, mudanças) ou None
+        """
+        pending = self._updates.get(url)
+        if pending is not None:
+            return pending[1:3] + pending[4:]
+        return self._conn.execute(
+            "SELECT gateways, confidence, next_check, revisit_interval, checks, changes FROM urls WHERE url = ?", (url,)
+        ).fetchone()
+    
+    def _store(self, url, gateways, confidence, now, revisit_interval, next_interval, checks, changes):
+        self._updates[url] = (url, gateways, confidence, now, now + next_interval, revisit_interval, checks, changes)
+        self.maybe_flush()
+    
+    def due(self, url):
+        """
+        True se a URL nunca foi verificada ou se a revisita já venceu
+        """
+        self.counts['listed'] += 1
+        if not self.force:
+            row = self._row(url)
+            if row is not None and row[2] > time.time():
+                self.counts['not_due'] += 1
+                return False
+        return True
+    
+    def record(self, result):
+        """
+        Compara o resultado com a verificação anterior, reagenda a URL e
+        retorna o delta ({'url', 'added', 'removed', 'confidence'} para
+        mudanças, {'url', 'new': True, ...} para URL nova) ou None se nada mudou
+        """
+        url = result['url']
+        now = time.time()
+        self.counts['checked'] += 1
+        row = self._row(url)
+        
+        if 'error' in result:
+            self.counts['errors'] += 1
+            self.errors.append({'url': url, 'error': result['error']})
+            if row is None:
+                self._store(url, None, None, now, self.min_interval, self.min_interval, 0, 0)
+            else:
+                gateways, confidence, _, revisit_interval, checks, changes = row
+                self._store(url, gateways, confidence, now, revisit_interval, self.min_interval, checks, changes)
+            return None
+        
+        gateways = result['gateways_found']
+        confidence = result['confidence_scores']
+        if row is None or row[0] is None:
+            # Primeira verificação com sucesso
+            delta = {'url': url, 'new': True, 'gateways': gateways, 'confidence': confidence}
+            self.counts['new'] += 1
+            self.new_urls.append(delta)
+            revisit_interval = self.min_interval
+            checks, changes = (row[4], row[5]) if row else (0, 0)
+        else:
+            previous_gateways = json.loads(row[0])
+            previous_confidence = json.loads(row[1])
+            delta = {
+                'url': url,
+                'added': [gateway for gateway in gateways if gateway not in previous_gateways],
+                'removed': [gateway for gateway in previous_gateways if gateway not in gateways],
+                'confidence': {
+                    gateway: [previous_confidence[gateway], score]
+                    for gateway, score in confidence.items()
+                    if gateway in previous_confidence and abs(score - previous_confidence[gateway]) >= self.confidence_delta
+                }
+            }
+            revisit_interval, checks, changes = row[3], row[4], row[5]
+            if delta['added'] or delta['removed'] or delta['confidence']:
+                self.counts['changed'] += 1
+                self.changes.append(delta)
+                revisit_interval = max(self.min_interval, revisit_interval / self.growth)
+                changes += 1
+            else:
+                self.counts['unchanged'] += 1
+                revisit_interval = min(self.max_interval, revisit_interval * self.growth)
+                delta = None
+        
+        self._store(url, json.dumps(gateways), json.dumps(confidence), now, revisit_interval, revisit_interval,
+                    checks + 1, changes)
+        return delta
+    
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+    
+    def flush(self):
+        if self._updates:
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                       self._updates.values())
+            self._updates = {}
+        self._last_flush = time.monotonic()
+    
+    def report(self):
+        """
+        Relatório de deltas da execução: contagens, mudanças, URLs novas e falhas
+        """
+        return {
+            'metadata': {
+                'run_started': self.started,
+                'run_finished': datetime.now().isoformat(),
+                'rescan_state': self.path,
+                **self.counts
+            },
+            'changes': self.changes,
+            'new_urls': self.new_urls,
+            'errors': self.errors
+        }
+    
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+
+def shard_for_url(url, num_shards):
+    """
+    Shard da fronteira distribuída: hash estável do host, para que todas as URLs
+    de um host fiquem com o mesmo worker (e a cortesia por host continue valendo)
+    """
+    host = urlparse(url).netloc.lower()
+    return zlib.crc32(host.encode('utf-8')) % num_shards
+
+
+class SQLiteFrontierStore:
+    """
+    Fronteira distribuída compartilhada via SQLite: stand-in local do
+    RedisFrontierStore para coordenador e workers na mesma máquina (ou em
+    testes). Deduplicação, filas por shard, URLs em andamento e resultados
+    publicados ficam no mesmo arquivo; cada operação é uma transação, então
+    vários processos podem usar o store ao mesmo tempo.
+    
+    Cada URL retirada por claim() fica arrendada por lease_timeout segundos:
+    se o worker morrer antes de complete(), a URL volta à fila do shard no
+    próximo claim() de qualquer worker.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.num_shards = None
+        self.max_depth = None
+        self.max_urls = None
+        self.lease_timeout = None
+        self._results_seen = 0
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS seen (url TEXT PRIMARY KEY)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS queue (seq INTEGER PRIMARY KEY AUTOINCREMENT, shard INTEGER, url TEXT, depth INTEGER)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS queue_shard ON queue (shard, seq)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS claims (url TEXT PRIMARY KEY, shard INTEGER, depth INTEGER, expires REAL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS results (seq INTEGER PRIMARY KEY AUTOINCREMENT, result TEXT)")
+    
+    def _transaction(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+    
+    def reset(self):
+        with self._transaction() as conn:
+            for table in ('config', 'seen', 'queue', 'claims', 'results'):
+                conn.execute(f"DELETE FROM {table}")
+        self._results_seen = 0
+    
+    def configure(self, num_shards, max_depth, max_urls, lease_timeout=300):
+        # seen_count: contador de URLs vistas, para o limite de max_urls não custar um COUNT(*) por add()
+        config = {'num_shards': num_shards, 'max_depth': max_depth, 'max_urls': max_urls,
+                  'lease_timeout': lease_timeout, 'seen_count': 0, 'stopped': 0}
+        with self._transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)",
+                             [(key, str(value)) for key, value in config.items()])
+        self.load_config()
+    
+    def load_config(self):
+        """
+        Lê a configuração gravada pelo coordenador; None se ainda não existe
+        """
+        config = {key: int(value) for key, value in self._conn.execute("SELECT key, value FROM config")}
+        if 'num_shards' not in config:
+            return None
+        self.num_shards = config['num_shards']
+        self.max_depth = config['max_depth']
+        self.max_urls = config['max_urls']
+        self.lease_timeout = config['lease_timeout']
+        return config
+    
+    def add(self, url, depth):
+        """
+        Enfileira a URL no shard do seu host se ela nunca foi vista e o limite
+        de max_urls não foi atingido; retorna True se foi enfileirada
+        """
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM seen WHERE url = ?", (url,)).fetchone():
+                return False
+            if int(conn.execute("SELECT value FROM config WHERE key = 'seen_count'").fetchone()[0]) >= self.max_urls:
+                return False
+            conn.execute("INSERT INTO seen (url) VALUES (?)", (url,))
+            conn.execute("UPDATE config SET value = value + 1 WHERE key = 'seen_count'")
+            conn.execute("INSERT INTO queue (shard, url, depth) VALUES (?, ?, ?)",
+                         (shard_for_url(url, self.num_shards), url, depth))
+        return True
+    
+    def claim(self, shards):
+        """
+        Retira a próxima URL de um dos shards do worker e a arrenda até
+        complete(url, ...); arrendamentos vencidos voltam antes para as filas
+        """
+        placeholders = ','.join('?' * len(shards))
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO queue (shard, url, depth) SELECT shard, url, depth FROM claims "
+                         "WHERE expires < ? ORDER BY expires", (now,))
+            conn.execute("DELETE FROM claims WHERE expires < ?", (now,))
+            row = conn.execute(f"SELECT seq, url, depth, shard FROM queue WHERE shard IN ({placeholders}) ORDER BY seq LIMIT 1",
+                               list(shards)).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM queue WHERE seq = ?", (row[0],))
+            conn.execute("INSERT INTO claims (url, shard, depth, expires) VALUES (?, ?, ?, ?)",
+                         (row[1], row[3], row[2], now + self.lease_timeout))
+        return row[1], row[2]
+    
+    def complete(self, url, result):
+        """
+        Publica o resultado e libera a URL (os links já devem ter sido adicionados).
+        Se o arrendamento venceu e a URL já foi devolvida à fila (ou concluída por
+        outro worker), o resultado é descartado: cada URL é publicada uma única vez.
+        Retorna True se o resultado foi publicado.
+        """
+        with self._transaction() as conn:
+            if conn.execute("DELETE FROM claims WHERE url = ?", (url,)).rowcount == 0:
+                return False
+            conn.execute("INSERT INTO results (result) VALUES (?)", (json.dumps(result, ensure_ascii=False),))
+        return True
+    
+    def pop_results(self):
+        """
+        Resultados publicados desde a última chamada
+        """
+        rows = self._conn.execute("SELECT seq, result FROM results WHERE seq > ? ORDER BY seq",
+                                  (self._results_seen,)).fetchall()
+        if rows:
+            self._results_seen = rows[-1][0]
+        return [json.loads(row[1]) for row in rows]
+    
+    def is_finished(self):
+        with self._transaction() as conn:
+            claimed = conn.execute("SELECT 1 FROM claims LIMIT 1").fetchone()
+            queued = conn.execute("SELECT 1 FROM queue LIMIT 1").fetchone()
+        return queued is None and claimed is None
+    
+    def stop(self):
+        self._conn.execute("UPDATE config SET value = '1' WHERE key = 'stopped'")
+    
+    def stopped(self):
+        row = self._conn.execute("SELECT value FROM config WHERE key = 'stopped'").fetchone()
+        return row is not None and int(row[0]) == 1
+    
+    def close(self):
+        self._conn.close()
+
+
+class RedisFrontierStore:
+    """
+    Fronteira distribuída em Redis, para coordenador e workers em máquinas
+    diferentes. Mesma interface do SQLiteFrontierStore; as operações que
+    precisam ser atômicas (dedup + limite + enfileirar, retirar + arrendar,
+    concluir, checar término) rodam como scripts Lua. Os arrendamentos ficam
+    num sorted set (URL -> vencimento) e a fila de origem de cada URL arrendada
+    num hash, para devolvê-la quando o arrendamento vence.
+    """
+    _ADD = """
+    if redis.call('SISMEMBER', KEYS[1], ARGV[1]) == 1 then return 0 end
+    if redis.call('SCARD', KEYS[1]) >= tonumber(ARGV[3]) then return 0 end
+    redis.call('SADD', KEYS[1], ARGV[1])
+    redis.call('RPUSH', KEYS[2], ARGV[2])
+    return 1
+    """
+    _CLAIM = """
+    for _, url in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[1])) do
+        local claim = cjson.decode(redis.call('HGET', KEYS[2], url))
+        redis.call('RPUSH', claim[1], claim[2])
+        redis.call('ZREM', KEYS[1], url)
+        redis.call('HDEL', KEYS[2], url)
+    end
+    for i = 3, #KEYS do
+        local item = redis.call('LPOP', KEYS[i])
+        if item then
+            local url = cjson.decode(item)[1]
+            redis.call('ZADD', KEYS[1], tonumber(ARGV[1]) + tonumber(ARGV[2]), url)
+            redis.call('HSET', KEYS[2], url, cjson.encode({KEYS[i], item}))
+            return item
+        end
+    end
+    return false
+    """
+    _COMPLETE = """
+    if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then return 0 end
+    redis.call('HDEL', KEYS[2], ARGV[1])
+    redis.call('RPUSH', KEYS[3], ARGV[2])
+    return 1
+    """
+    _FINISHED = """
+    if redis.call('ZCARD', KEYS[1]) > 0 then return 0 end
+    for i = 2, #KEYS do
+        if redis.call('LLEN', KEYS[i]) > 0 then return 0 end
+    end
+    return 1
+    """
+    
+    def __init__(self, url, namespace='gateway_crawler'):
+        _lazy_import('redis')
+        self.namespace = namespace
+        self.num_shards = None
+        self.max_depth = None
+        self.max_urls = None
+        self.lease_timeout = None
+        self._results_seen = 0
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._add = self._redis.register_script(self._ADD)
+        self._claim = self._redis.register_script(self._CLAIM)
+        self._complete = self._redis.register_script(self._COMPLETE)
+        self._finished = self._redis.register_script(self._FINISHED)
+    
+    def _key(self, *parts):
+        return ':'.join((self.namespace,) + tuple(str(part) for part in parts))
+    
+    def _queue_keys(self, shards):
+        return [self._key('queue', shard) for shard in shards]
+    
+    def reset(self):
+        keys = list(self._redis.scan_iter(self._key('*')))
+        if keys:
+            self._redis.delete(*keys)
+        self._results_seen = 0
+    
+    def configure(self, num_shards, max_depth, max_urls, lease_timeout=300):
+        self._redis.hset(self._key('config'), mapping={'num_shards': num_shards, 'max_depth': max_depth,
+                                                       'max_urls': max_urls, 'lease_timeout': lease_timeout,
+                                                       'stopped': 0})
+        self.load_config()
+    
+    def load_config(self):
+        config = {key: int(value) for key, value in self._redis.hgetall(self._key('config')).items()}
+        if 'num_shards' not in config:
+            return None
+        self.num_shards = config['num_shards']
+        self.max_depth = config['max_depth']
+        self.max_urls = config['max_urls']
+        self.lease_timeout = config['lease_timeout']
+        return config
+    
+    def add(self, url, depth):
+        queue_key = self._key('queue', shard_for_url(url, self.num_shards))
+        payload = json.dumps([url, depth])
+        return bool(self._add(keys=[self._key('seen'), queue_key], args=[url, payload, self.max_urls]))
+    
+    def claim(self, shards):
+        item = self._claim(keys=[self._key('claims'), self._key('claimed_from')] + self._queue_keys(shards),
+                           args=[time.time(), self.lease_timeout])
+        if item is None:
+            return None
+        url, depth = json.loads(item)
+        return url, depth
+    
+    def complete(self, url, result):
+        return bool(self._complete(keys=[self._key('claims'), self._key('claimed_from'), self._key('results')],
+                                   args=[url, json.dumps(result, ensure_ascii=False)]))
+    
+    def pop_results(self):
+        items = self._redis.lrange(self._key('results'), self._results_seen, -1)
+        self._results_seen += len(items)
+        return [json.loads(item) for item in items]
+    
+    def is_finished(self):
+        keys = [self._key('claims')] + self._queue_keys(range(self.num_shards))
+        return bool(self._finished(keys=keys))
+    
+    def stop(self):
+        self._redis.hset(self._key('config'), 'stopped', 1)
+    
+    def stopped(self):
+        return self._redis.hget(self._key('config'), 'stopped') == '1'
+    
+    def close(self):
+        self._redis.close()
+
+
+def open_frontier_store(location):
+    """
+    redis://... usa o RedisFrontierStore; qualquer outro valor é o arquivo SQLite local
+    """
+    if location.startswith(('redis://', 'rediss://', 'unix://')):
+        if importlib.util.find_spec('redis') is None:
+            raise RuntimeError("Store redis:// requer o pacote redis (pip install redis)")
+        return RedisFrontierStore(location)
+    return SQLiteFrontierStore(location)
+
+
+class ReportAggregator:
+    """
+    Estatísticas do relatório calculadas de forma incremental, com memória
+    constante no número de URLs (usadas por generate_detailed_report e
+    print_detailed_summary)
+    """
+    def __init__(self):
+        self.total_urls = 0
+        self.urls_with_gateways = 0
+        self.urls_with_errors = 0
+        self.gateway_counts = {}
+        self._confidence = {}  # gateway -> [soma, máximo, mínimo, contagem]
+    
+    @classmethod
+    def from_results(cls, results):
+        aggregator = cls()
+        for result in results:
+            aggregator.add(result)
+        return aggregator
+    
+    def add(self, result):
+        self.total_urls += 1
+        if result['gateways_found']:
+            self.urls_with_gateways += 1
+        if 'error' in result:
+            self.urls_with_errors += 1
+        
+        for gateway in result['gateways_found']:
+            self.gateway_counts[gateway] = self.gateway_counts.get(gateway, 0) + 1
+            confidence = result.get('confidence_scores', {}).get(gateway, 0)
+            stats = self._confidence.get(gateway)
+            if stats is None:
+                self._confidence[gateway] = [confidence, confidence, confidence, 1]
+            else:
+                stats[0] += confidence
+                stats[1] = max(stats[1], confidence)
+                stats[2] = min(stats[2], confidence)
+                stats[3] += 1
+    
+    def average_confidence(self, gateway):
+        total, _, _, count = self._confidence[gateway]
+        return total / count
+    
+    def confidence_analysis(self):
+        return {
+            gateway: {
+                'average_confidence': total / count,
+                'max_confidence': maximum,
+                'min_confidence': minimum,
+                'total_detections': count
+            }
+            for gateway, (total, maximum, minimum, count) in self._confidence.items()
+        }
+
+
+class DomainAggregator:
+    """
+    Agregado por domínio (host) no modo crawling: união dos gateways, maior
+    confiança e URL da melhor evidência de cada gateway.
+    
+    Também decide a parada antecipada de cada host: quando um gateway atinge
+    stop_on_gateway de confiança ou após stale_pages páginas seguidas sem
+    evidência nova (gateway novo ou confiança maior que a já vista).
+    """
+    def __init__(self, stop_on_gateway=None, stale_pages=None):
+        self.stop_on_gateway = stop_on_gateway
+        self.stale_pages = stale_pages
+        self.domains = {}
+    
+    def add(self, url, result):
+        """
+        Registra o resultado de uma página; retorna o motivo da parada quando
+        o host acaba de atingir a política ('gateway_confirmed'/'no_new_evidence')
+        """
+        host = urlparse(url).netloc
+        domain = self.domains.get(host)
+        if domain is None:
+            domain = self.domains[host] = {'pages': 0, 'errors': 0, 'gateways': {}, 'pages_without_new_evidence': 0,
+                                           'stopped': None}
+        domain['pages'] += 1
+        if 'error' in result:
+            domain['errors'] += 1
+        
+        new_evidence = False
+        for gateway in result['gateways_found']:
+            confidence = result.get('confidence_scores', {}).get(gateway, 0)
+            stats = domain['gateways'].get(gateway)
+            if stats is None:
+                domain['gateways'][gateway] = {'max_confidence': confidence, 'best_evidence_url': url, 'pages': 1}
+                new_evidence = True
+                continue
+            stats['pages'] += 1
+            if confidence > stats['max_confidence']:
+                stats['max_confidence'] = confidence
+                stats['best_evidence_url'] = url
+                new_evidence = True
+        domain['pages_without_new_evidence'] = 0 if new_evidence else domain['pages_without_new_evidence'] + 1
+        
+        if domain['stopped'] is not None:
+            return None
+        if self.stop_on_gateway is not None and any(
+                stats['max_confidence'] >= self.stop_on_gateway for stats in domain['gateways'].values()):
+            domain['stopped'] = 'gateway_confirmed'
+        elif self.stale_pages is not None and domain['pages_without_new_evidence'] >= self.stale_pages:
+            domain['stopped'] = 'no_new_evidence'
+        return domain['stopped']
+    
+    def is_stopped(self, url):
+        domain = self.domains.get(urlparse(url).netloc)
+        return domain is not None and domain['stopped'] is not None
+    
+    def summary(self):
+        """
+        Resumo por domínio, emitido no relatório junto dos resultados por página
+        """
+        summary = []
+        for host, domain in sorted(self.domains.items()):
+            gateways = sorted(domain['gateways'].items(), key=lambda item: item[1]['max_confidence'], reverse=True)
+            summary.append({
+                'domain': host,
+                'pages_analyzed': domain['pages'],
+                'pages_with_errors': domain['errors'],
+                'gateways_found': [gateway for gateway, _ in gateways],
+                'max_confidence': {gateway: stats['max_confidence'] for gateway, stats in gateways},
+                'best_evidence_url': {gateway: stats['best_evidence_url'] for gateway, stats in gateways},
+                'pages_with_gateway': {gateway: stats['pages'] for gateway, stats in gateways},
+                'stopped_early': domain['stopped']
+            })
+        return summary
+
+
+class JsonlSink:
+    """
+    Grava cada resultado como uma linha JSON assim que ele fica pronto
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, 'w', encoding='utf-8', buffering=1)
+    
+    def write(self, result):
+        self._file.write(json.dumps(result, ensure_ascii=False) + '\n')
+    
+    def close(self):
+        self._file.close()
+        logger.info(f"Resultados gravados em JSONL: {self.filename}")
+
+
+class CsvSink:
+    """
+    Grava cada resultado em CSV (mesmas colunas de export_to_csv) assim que ele fica pronto
+    """
+    FIELDNAMES = ['url', 'gateways_found', 'confidence_total', 'status_code', 'page_title', 'error']
+    
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, 'w', newline='', encoding='utf-8', buffering=1)
+        self._writer = csv.DictWriter(self._file, fieldnames=self.FIELDNAMES)
+        self._writer.writeheader()
+    
+    @staticmethod
+    def row(result):
+        return {
+            'url': result['url'],
+            'gateways_found': ', '.join(result['gateways_found']),
+            'confidence_total': sum(result.get('confidence_scores', {}).values()),
+            'status_code': result.get('status_code', 'N/A'),
+            'page_title': result.get('page_title', 'N/A'),
+            'error': result.get('error', '')
+        }
+    
+    def write(self, result):
+        self._writer.writerow(self.row(result))
+    
+    def close(self):
+        self._file.close()
+        logger.info(f"Resultados exportados para CSV: {self.filename}")
+
+
+# Limites (em segundos) dos histogramas de tempo por etapa
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """
+    Histograma de buckets fixos (semântica 'le' do Prometheus)
+    """
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+    
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+    
+    def quantile(self, fraction):
+        """
+        Quantil aproximado: limite superior do bucket que o contém
+        """
+        if not self.count:
+            return None
+        target = fraction * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+class CrawlMetrics:
+    """
+    Métricas do crawler: histogramas de tempo por etapa (connect, download,
+    parse, match, deep), contadores (páginas, bytes, erros, retries, códigos
+    HTTP, acertos do cache de resultados) e profundidade das filas.
+    
+    Atualizadas pelas threads de fetch/análise (com lock) e exportadas por
+    MetricsExporter em formato Prometheus ou JSON. collectors são funções que
+    retornam {nome: valor} lidas a cada snapshot (ex.: estatísticas dos caches).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {'pages': 0, 'bytes': 0, 'errors': 0, 'retries': 0, 'memo_hits': 0, 'skipped': 0, 'truncated': 0}
+        self.status_codes = {}
+        self.stages = {}
+        self.queue_depth = {}
+        self.collectors = []
+    
+    def record_page(self, page, results, memo_hit=False):
+        with self._lock:
+            self.counters['pages'] += 1
+            self.counters['bytes'] += len(page.content)
+            self.status_codes[page.status_code] = self.status_codes.get(page.status_code, 0) + 1
+            if memo_hit:
+                self.counters['memo_hits'] += 1
+            if 'skipped_content_type' in results:
+                self.counters['skipped'] += 1
+            if page.truncated:
+                self.counters['truncated'] += 1
+            for stage, seconds in results.get('timings', {}).items():
+                histogram = self.stages.get(stage)
+                if histogram is None:
+                    histogram = self.stages[stage] = Histogram()
+                histogram.observe(seconds)
+    
+    def record_failure(self, status_code=None):
+        with self._lock:
+            self.counters['errors'] += 1
+            if status_code is not None:
+                self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+    
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+    
+    def set_queue_depth(self, **depths):
+        self.queue_depth.update(depths)
+    
+    def _collect(self):
+        collected = {}
+        for collector in self.collectors:
+            collected.update(collector())
+        return collected
+    
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.time() - self.started
+            return {
+                'uptime_seconds': round(elapsed, 1),
+                'pages_per_second': round(self.counters['pages'] / elapsed, 2) if elapsed else None,
+                'counters': dict(self.counters),
+                'status_codes': {str(code): count for code, count in sorted(self.status_codes.items())},
+                'queue_depth': dict(self.queue_depth),
+                'stages': {
+                    stage: {
+                        'count': histogram.count,
+                        'mean_ms': round(histogram.sum / histogram.count * 1000, 2),
+                        'p50_ms': round(histogram.quantile(0.50) * 1000, 2),
+                        'p95_ms': round(histogram.quantile(0.95) * 1000, 2),
+                        'p99_ms': round(histogram.quantile(0.99) * 1000, 2),
+                        'max_ms': round(histogram.max * 1000, 2)
+                    }
+                    for stage, histogram in self.stages.items() if histogram.count
+                },
+                'collected': self._collect()
+            }
+    
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            for name, value in self.counters.items():
+                lines.append(f"# TYPE gateway_crawler_{name}_total counter")
+                lines.append(f"gateway_crawler_{name}_total {value}")
+            lines.append("# TYPE gateway_crawler_responses_total counter")
+            for code, count in sorted(self.status_codes.items()):
+                lines.append(f'gateway_crawler_responses_total{{status="{code}"}} {count}')
+            lines.append("# TYPE gateway_crawler_queue_depth gauge")
+            for name, depth in self.queue_depth.items():
+                lines.append(f'gateway_crawler_queue_depth{{queue="{name}"}} {depth}')
+            lines.append("# TYPE gateway_crawler_stage_seconds histogram")
+            for stage, histogram in self.stages.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'gateway_crawler_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'gateway_crawler_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'gateway_crawler_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'gateway_crawler_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        for name, value in self._collect().items():
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE gateway_crawler_{name} gauge")
+                lines.append(f"gateway_crawler_{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsExporter:
+    """
+    Exporta CrawlMetrics durante o crawl: servidor HTTP com /metrics
+    (Prometheus) e /stats (JSON) quando port é dado, e/ou snapshot JSON
+    regravado em stats_file a cada interval segundos. O servidor escuta só em
+    localhost por padrão; host='0.0.0.0' o expõe na rede.
+    """
+    def __init__(self, metrics, port=None, stats_file=None, interval=30.0, host='127.0.0.1'):
+        self.metrics = metrics
+        self.stats_file = stats_file
+        self.interval = interval
+        self._server = None
+        self._stop = threading.Event()
+        self._threads = []
+        
+        if port is not None:
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+            exporter = self
+            
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.startswith('/metrics'):
+                        body = exporter.metrics.render_prometheus().encode('utf-8')
+                        content_type = 'text/plain; version=0.0.4'
+                    elif self.path.startswith('/stats'):
+                        body = json.dumps(exporter.metrics.snapshot(), indent=2).encode('utf-8')
+                        content_type = 'application/json'
+                    else:
+                        self.send_error(404)
+                        return
+                    self.send_response(200)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                
+                def log_message(self, format, *args):
+                    pass
+            
+            self._server = ThreadingHTTPServer((host, port), Handler)
+            self._server.daemon_threads = True
+            self._threads.append(threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True))
+            logger.info(f"Métricas em http://{host}:{self._server.server_address[1]}/metrics e /stats")
+        
+        if stats_file:
+            self._threads.append(threading.Thread(target=self._run_dump, name='metrics-dump', daemon=True))
+        for thread in self._threads:
+            thread.start()
+    
+    def _run_dump(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+    
+    def dump(self):
+        # Gravação atômica: quem lê o arquivo nunca vê um JSON pela metade
+        temporary = f"{self.stats_file}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(self.metrics.snapshot(), f, indent=2)
+        os.replace(temporary, self.stats_file)
+    
+    def close(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if self.stats_file:
+            self.dump()
+
+
+RETRY_STATUS_CODES = (429, 503)
+
+
+def parse_retry_after(value):
+    """
+    Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class HostScheduler:
+    """
+    Agendador de cortesia por host (chave: urlparse(url).netloc).
+    
+    Cada host tem um token bucket (rate requisições/s, rajada de burst), um
+    limite de conexões simultâneas e um bloqueio temporário após 429/503
+    (Retry-After ou backoff exponencial). As URLs ficam em filas por host e
+    next_ready() percorre os hosts prontos em round-robin, então o throughput
+    total cresce com o número de domínios distintos sem sobrecarregar nenhum.
+    Cada fila é um heap por prioridade (FIFO no empate): um link de checkout
+    descoberto tarde passa à frente das URLs já enfileiradas do mesmo host.
+    """
+    def __init__(self, rate=2.0, burst=1, max_per_host=2, base_backoff=5.0, max_backoff=300.0):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_per_host = max(1, max_per_host)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._hosts = {}
+        self._queues = {}
+        self._rotation = deque()
+        self._pending = 0
+        self._seq = 0
+        self._lock = threading.Lock()
+    
+    def _host_state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = {
+                'tokens': float(self.burst),
+                'updated': time.monotonic(),
+                'active': 0,
+                'blocked_until': 0.0,
+                'failures': 0
+            }
+            self._hosts[host] = state
+        return state
+    
+    def _refill(self, state, now):
+        if self.rate > 0:
+            state['tokens'] = min(self.burst, state['tokens'] + (now - state['updated']) * self.rate)
+        else:
+            state['tokens'] = float(self.burst)
+        state['updated'] = now
+    
+    def add(self, url, item, priority=0):
+        """
+        Enfileira item (ex.: (url, profundidade)) na fila do host da URL;
+        itens de priority maior saem antes
+        """
+        host = urlparse(url).netloc
+        with self._lock:
+            queue = self._queues.get(host)
+            if queue is None:
+                queue = self._queues[host] = []
+                self._rotation.append(host)
+            heapq.heappush(queue, (-priority, self._seq, item))
+            self._seq += 1
+            self._pending += 1
+    
+    def pending(self):
+        return self._pending
+    
+    def discard_host(self, url):
+        """
+        Descarta as URLs enfileiradas do host da URL (ex.: parada antecipada);
+        retorna quantas foram descartadas
+        """
+        host = urlparse(url).netloc
+        with self._lock:
+            queue = self._queues.pop(host, None)
+            if queue is None:
+                return 0
+            self._rotation.remove(host)
+            self._pending -= len(queue)
+            return len(queue)
+    
+    def clear(self):
+        """
+        Descarta as URLs enfileiradas; o estado de cortesia dos hosts é mantido
+        """
+        with self._lock:
+            self._queues.clear()
+            self._rotation.clear()
+            self._pending = 0
+    
+    def next_ready(self):
+        """
+        Retorna o próximo item de um host pronto (round-robin) ou None.
+        O chamador deve chamar release(url) quando a requisição terminar.
+        """
+        with self._lock:
+            now = time.monotonic()
+            for _ in range(len(self._rotation)):
+                host = self._rotation[0]
+                self._rotation.rotate(-1)
+                state = self._host_state(host)
+                if state['active'] >= self.max_per_host or now < state['blocked_until']:
+                    continue
+                self._refill(state, now)
+                if state['tokens'] < 1:
+                    continue
+                
+                state['tokens'] -= 1
+                state['active'] += 1
+                queue = self._queues[host]
+                item = heapq.heappop(queue)[2]
+                self._pending -= 1
+                if not queue:
+                    del self._queues[host]
+                    self._rotation.remove(host)
+                return item
+        return None
+    
+    def time_until_ready(self):
+        """
+        Segundos até algum host com fila ficar pronto; None se não há fila ou
+        se só falta liberar uma conexão (nesse caso basta esperar um Future)
+        """
+        with self._lock:
+            if not self._pending:
+                return None
+            now = time.monotonic()
+            delays = []
+            for host in self._rotation:
+                state = self._host_state(host)
+                if state['active'] >= self.max_per_host:
+                    continue
+                delay = max(0.0, state['blocked_until'] - now)
+                if self.rate > 0 and state['tokens'] < 1:
+                    refill = (1 - state['tokens'] - (now - state['updated']) * self.rate) / self.rate
+                    delay = max(delay, refill)
+                delays.append(delay)
+            return min(delays) if delays else None
+    
+    def release(self, url, unused=False):
+        """
+        Libera a conexão do host; unused=True quando o item retirado por
+        next_ready() não gerou requisição (o token volta para o host)
+        """
+        with self._lock:
+            state = self._host_state(urlparse(url).netloc)
+            state['active'] = max(0, state['active'] - 1)
+            if unused:
+                state['tokens'] = min(float(self.burst), state['tokens'] + 1)
+    
+    def record_status(self, url, status_code, retry_after=None):
+        """
+        Registra o status HTTP de uma resposta: 429/503 bloqueiam o host por
+        Retry-After segundos (ou backoff exponencial); sucesso zera o backoff
+        """
+        with self._lock:
+            state = self._host_state(urlparse(url).netloc)
+            if status_code in RETRY_STATUS_CODES:
+                state['failures'] += 1
+                delay = retry_after
+                if delay is None:
+                    delay = self.base_backoff * 2 ** (state['failures'] - 1)
+                delay = min(delay, self.max_backoff)
+                state['blocked_until'] = max(state['blocked_until'], time.monotonic() + delay)
+                logger.warning(f"Host {urlparse(url).netloc} respondeu {status_code}: pausando por {delay:.1f}s")
+            else:
+                state['failures'] = 0
+    
+    def defer(self, url, delay):
+        """
+        Pausa o host da URL por delay segundos (ex.: circuito aberto em HostHealth)
+        """
+        with self._lock:
+            state = self._host_state(urlparse(url).netloc)
+            state['blocked_until'] = max(state['blocked_until'], time.monotonic() + delay)
+
+
+class HostHealth:
+    """
+    Saúde por host (chave: netloc): timeout adaptativo e circuit breaker.
+    
+    failure_threshold falhas de rede consecutivas (timeout, conexão recusada,
+    DNS) abrem o circuito do host: as URLs dele são adiadas por cooldown
+    segundos sem tocar a rede, enquanto os outros hosts seguem. Passado o
+    cooldown, uma única requisição de teste é liberada; sucesso fecha o
+    circuito e falha o reabre com o cooldown dobrado; se o teste terminar com
+    um erro que não é de rede (abort_probe), o próximo fetch vira o novo teste.
+    Após max_trips aberturas seguidas o host é dado como indisponível e as URLs
+    restantes falham na hora. Respostas HTTP de erro contam como host vivo.
+    
+    O timeout de cada host acompanha a latência observada como o RTO do TCP
+    (média suavizada + 4x o desvio, após min_samples respostas), limitado a
+    [min_timeout, timeout pedido] e dobrado a cada timeout consecutivo.
+    """
+    # Espera das URLs de um host em teste até a requisição de teste terminar
+    PROBE_WAIT = 1.0
+    
+    def __init__(self, failure_threshold=3, cooldown=30.0, max_trips=2, min_timeout=5.0, min_samples=3):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.max_trips = max(1, max_trips)
+        self.min_timeout = min_timeout
+        self.min_samples = min_samples
+        self.trips = 0
+        self._hosts = {}
+        self._lock = threading.Lock()
+    
+    def _host_state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = {
+                'circuit': 'closed',
+                'failures': 0,
+                'timeouts': 0,
+                'trips': 0,
+                'open_until': 0.0,
+                'probe': None,
+                'samples': 0,
+                'srtt': 0.0,
+                'rttvar': 0.0
+            }
+            self._hosts[host] = state
+        return state
+    
+    def check(self, url):
+        """
+        Antes do fetch: None se a requisição pode sair, senão (motivo, segundos
+        até tentar de novo); segundos None = host indisponível, falhar na hora
+        """
+        with self._lock:
+            state = self._host_state(urlparse(url).netloc)
+            circuit = state['circuit']
+            if circuit == 'closed':
+                return None
+            if circuit == 'dead':
+                return "Host indisponível (circuit breaker aberto)", None
+            if circuit == 'half_open':
+                return "Circuit breaker em teste", self.PROBE_WAIT
+            remaining = state['open_until'] - time.monotonic()
+            if remaining > 0:
+                return "Circuit breaker aberto", remaining
+            # Cooldown encerrado: esta requisição é o teste
+            state['circuit'] = 'half_open'
+            state['probe'] = url
+            return None
+    
+    def timeout_for(self, url, timeout):
+        with self._lock:
+            state = self._host_state(urlparse(url).netloc)
+            if state['samples'] < self.min_samples:
+                return timeout
+            adaptive = max(self.min_timeout, state['srtt'] + 4 * state['rttvar']) * 2 ** state['timeouts']
+        return min(timeout, adaptive)
+    
+    def record_success(self, url, elapsed=None):
+        """
+        Host respondeu; elapsed (segundos do fetch completo) alimenta o timeout adaptativo
+        """
+        with self._lock:
+            state = self._host_state(urlparse(url).netloc)
+            state['circuit'] = 'closed'
+            state['probe'] = None
+            state['failures'] = 0
+            state['timeouts'] = 0
+            state['trips'] = 0
+            if elapsed is None:
+                return
+            if state['samples'] == 0:
+                state['srtt'] = elapsed
+                state['rttvar'] = elapsed / 2
+            else:
+                state['rttvar'] = 0.75 * state['rttvar'] + 0.25 * abs(state['srtt'] - elapsed)
+                state['srtt'] = 0.875 * state['srtt'] + 0.125 * elapsed
+            state['samples'] += 1
+    
+    def record_failure(self, url, timed_out=False):
+        """
+        Falha de rede (sem resposta HTTP); retorna o novo estado do circuito
+        ('open'/'dead') se ele abriu agora, senão None
+        """
+        with self._lock:
+            state = self._host_state(urlparse(url).netloc)
+            state['failures'] += 1
+            if timed_out:
+                state['timeouts'] += 1
+            if state['circuit'] == 'closed' and state['failures'] < self.failure_threshold:
+                return None
+            if state['circuit'] in ('open', 'dead'):
+                return None
+            
+            state['probe'] = None
+            state['trips'] += 1
+            self.trips += 1
+            if state['trips'] >= self.max_trips:
+                state['circuit'] = 'dead'
+            else:
+                state['circuit'] = 'open'
+                state['open_until'] = time.monotonic() + self.cooldown * 2 ** (state['trips'] - 1)
+            return state['circuit']
+    
+    def abort_probe(self, url):
+        """
+        A requisição de teste de url terminou sem resposta nem falha de rede
+        (ex.: exceção inesperada): o circuito volta a aberto com o cooldown
+        vencido, para que a próxima URL do host seja o novo teste
+        """
+        with self._lock:
+            state = self._host_state(urlparse(url).netloc)
+            if state['circuit'] == 'half_open' and state['probe'] == url:
+                state['circuit'] = 'open'
+                state['probe'] = None
+                state['open_until'] = time.monotonic()
+    
+    def cooldown_for(self, url):
+        with self._lock:
+            state = self._host_state(urlparse(url).netloc)
+            return max(0.0, state['open_until'] - time.monotonic())
+    
+    def summary(self):
+        """
+        Hosts com falhas ou circuito aberto: {host: estado, falhas, aberturas, timeout adaptativo}
+        """
+        with self._lock:
+            return {
+                host: {
+                    'circuit': state['circuit'],
+                    'consecutive_failures': state['failures'],
+                    'trips': state['trips'],
+                    'latency': round(state['srtt'], 3) if state['samples'] else None
+                }
+                for host, state in sorted(self._hosts.items())
+                if state['circuit'] != 'closed' or state['failures']
+            }
+    
+    def stats(self):
+        with self._lock:
+            circuits = [state['circuit'] for state in self._hosts.values()]
+        return {
+            'hosts_open': circuits.count('open') + circuits.count('half_open'),
+            'hosts_dead': circuits.count('dead'),
+            'trips': self.trips
         }
-        self.visited_urls = set()
-        self.urls_to_visit = deque()
+
+
+class GatewayCrawlerV2:
+    def __init__(self, backend='requests', concurrency=500, host_rate=2.0, host_connections=2, http_cache=None, memo_size=2048,
+                 checkpoint=None, parser='html.parser', stream_body=False, max_body_bytes=2 * 1024 * 1024,
+                 head_extra_bytes=None, processes=0, frontier_memory=100000, url_canonicalizer=None,
+                 priority_links=False, stop_on_gateway=None, stale_pages=None, signatures=None, signature_cache=None,
+                 scan_scripts=False, max_scripts_per_page=10, max_script_bytes=1024 * 1024, script_cache_size=10000,
+                 pool_per_host=None, pool_hosts=1000, idle_timeout=30.0, dns_ttl=0, dns_negative_ttl=60.0,
+                 failure_threshold=3, breaker_cooldown=30.0, breaker_trips=2, min_timeout=5.0):
+        _lazy_import('requests')
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        })
+        
+        # Resolução de nomes em cache, com cache negativo (opt-in: dns_ttl > 0; a CLI
+        # ativa por padrão). Substitui socket.getaddrinfo no processo até close()
+        self.dns_cache = None
+        if dns_ttl > 0:
+            self.dns_cache = DNSCache(ttl=dns_ttl, negative_ttl=dns_negative_ttl)
+            self.dns_cache.install()
+        
+        # Backend de fetch: requests (padrão, bloqueante) ou async (httpx/asyncio)
+        self.transport = None
+        if backend == 'async':
+            self.fetch_backend = AsyncFetchBackend(self.session.headers, concurrency=concurrency,
+                                                   keepalive_expiry=idle_timeout)
+        else:
+            # Pools compartilhados entre threads; folga sobre host_connections para
+            # scripts externos e redirecionamentos
+            self.transport = ManagedTransport(pool_per_host=pool_per_host or host_connections + 2,
+                                              max_hosts=pool_hosts, idle_timeout=idle_timeout)
+            self.transport.mount(self.session)
+            self.fetch_backend = RequestsFetchBackend(self.session)
+        
+        # Assinaturas do pack externo versionado (gateway_signatures.json por padrão)
+        if not isinstance(signatures, SignaturePack):
+            signatures = SignaturePack.load(signatures)
+        self.signature_pack = signatures
+        self.gateways = signatures.gateways
+        
+        # Canonicalização/filtros dos links, limite por host e detecção de armadilhas
+        self.url_canonicalizer = url_canonicalizer or URLCanonicalizer()
+        
+        # Visitadas como fingerprints de 64 bits; fronteira excedente vai para disco
+        self.frontier_memory = frontier_memory
+        self.priority_links = priority_links
+        self.visited_urls = URLFingerprintSet()
+        self.urls_to_visit = self._new_frontier()
+        
+        # Agregado por domínio do crawling e parada antecipada por host
+        self.domain_stats = DomainAggregator(stop_on_gateway=stop_on_gateway, stale_pages=stale_pages)
         self.results = []
         self.max_urls_to_crawl = 0
+        self.signature_matcher = signatures.matcher(signature_cache)
+        
+        # Backend de parsing HTML (html.parser é a referência; lxml/selectolax são mais rápidos)
+        self.parser = get_parser_backend(parser)
+        self.detector = PageDetector(self.signature_matcher, self.parser)
+        
+        # Cortesia por host no lugar da pausa global entre páginas
+        self.host_scheduler = HostScheduler(rate=host_rate, max_per_host=host_connections)
+        
+        # Timeout adaptativo e circuit breaker por host (failure_threshold=0 desativa)
+        self.host_health = None
+        if failure_threshold > 0:
+            self.host_health = HostHealth(failure_threshold=failure_threshold, cooldown=breaker_cooldown,
+                                          max_trips=breaker_trips, min_timeout=min_timeout)
+        self.max_retries = 3
+        # Adiamentos do circuit breaker por URL antes de desistir dela
+        self.max_deferrals = 60
+        self.staging_limit = 10000
+        
+        # Cache HTTP persistente opcional (HTTPCache) para re-scans
+        self.http_cache = http_cache
+        
+        # Resultados de páginas com corpo idêntico são reaproveitados (0 desativa)
+        self.result_memo = DetectionMemo(memo_size) if memo_size > 0 else None
+        
+        # Checkpoint opcional (CrawlCheckpoint) para retomar crawls longos
+        self.checkpoint = checkpoint
+        self._resumed = False
+        
+        # Leitura do corpo em streaming com limite de tamanho e parada antecipada (opt-in)
+        self.body_policy = None
+        if stream_body:
+            script_literals = [src for signatures in self.gateways.values() for src in signatures['scripts']]
+            self.body_policy = BodyStreamPolicy(script_literals, max_bytes=max_body_bytes,
+                                                head_extra_bytes=head_extra_bytes)
+        
+        # Estágio de detecção em processos separados (0 = nas próprias threads)
+        self.detection_pool = DetectionPool(self.signature_pack, parser, processes) if processes > 0 else None
+        
+        # Varredura dos scripts externos com cache compartilhado por todo o crawling (opt-in)
+        self.script_cache = ScriptAssetCache(script_cache_size) if scan_scripts else None
+        self.max_scripts_per_page = max_scripts_per_page
+        self.script_body_policy = BodyStreamPolicy((), max_bytes=max_script_bytes)
+        self._gateway_script_literals = [src.lower() for signatures in self.gateways.values()
+                                         for src in signatures['scripts'] if src]
+        
+        # Tempos por etapa, contadores e filas (ver MetricsExporter)
+        self.metrics = CrawlMetrics()
+        if self.result_memo is not None:
+            self.metrics.collectors.append(lambda: {
+                f"result_cache_{name}": value for name, value in self.result_memo.stats().items()
+            })
+        if self.http_cache is not None:
+            self.metrics.collectors.append(lambda: {
+                'http_cache_revalidated': self.http_cache.hits, 'http_cache_downloads': self.http_cache.misses
+            })
+        if self.script_cache is not None:
+            self.metrics.collectors.append(lambda: {
+                f"script_cache_{name}": value for name, value in self.script_cache.stats().items()
+            })
+        if self.dns_cache is not None:
+            self.metrics.collectors.append(lambda: {
+                f"dns_cache_{name}": value for name, value in self.dns_cache.stats().items()
+            })
+        if self.transport is not None:
+            self.metrics.collectors.append(lambda: {
+                f"connections_{name}": value for name, value in self.transport.stats().items()
+            })
+        if self.host_health is not None:
+            self.metrics.collectors.append(self.host_health.stats)
+        self._closed = False
+    
+    def close(self):
+        """
+        Libera os recursos do crawler: processos de detecção, conexões do
+        backend de fetch, arquivo temporário da fronteira e o cache DNS
+        instalado em socket.getaddrinfo
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self.detection_pool is not None:
+            self.detection_pool.shutdown()
+        self.fetch_backend.close()
+        self.urls_to_visit.close()
+        if self.dns_cache is not None:
+            self.dns_cache.uninstall()
 
-    def analyze_page(self, url, timeout=15, deep_analysis=False):
+    def analyze_page(self, url, timeout=15, deep_analysis=False, return_links=False):
         """
         Analisa uma página web para detectar gateways de pagamento
+        
+        Com return_links=True retorna (resultado, links), reaproveitando a mesma
+        resposta e o mesmo documento parseado para extrair os links do crawling.
         """
+        results, timeout = self._check_host_health(url, timeout)
+        if results is not None:
+            return (results, {}) if return_links else results
+        
         try:
             logger.info(f"Analisando: {url}")
-            response = self.session.get(url, timeout=timeout)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            page_content = response.text.lower()
-            
+            page = self._fetch_page(url, timeout)
+        except requests.exceptions.RequestException as e:
+            results = self._fetch_failed(url, e)
+            return (results, {}) if return_links else results
+        except BaseException:
+            self._fetch_aborted(url)
+            raise
+        
+        self._fetch_succeeded(url, page)
+        return self._analyze_fetched(url, page, deep_analysis, return_links)
+    
+    async def _analyze_page_async(self, url, timeout, deep_analysis, return_links, executor):
+        """
+        Versão de analyze_page para o backend async: o download roda no event
+        loop e o parsing/detecção (CPU) vai para o executor
+        """
+        results, timeout = self._check_host_health(url, timeout)
+        if results is not None:
+            return (results, {}) if return_links else results
+        
+        try:
+            logger.info(f"Analisando: {url}")
+            page = await self._fetch_page_async(url, timeout)
+        except requests.exceptions.RequestException as e:
+            results = self._fetch_failed(url, e)
+            return (results, {}) if return_links else results
+        except BaseException:
+            # Inclui o cancelamento da tarefa
+            self._fetch_aborted(url)
+            raise
+        
+        self._fetch_succeeded(url, page)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self._analyze_fetched, url, page, deep_analysis, return_links)
+    
+    def _fetch_page(self, url, timeout):
+        """
+        Fetch pelo backend, com revalidação condicional quando o cache HTTP está ativo
+        """
+        cached = self.http_cache.get(url) if self.http_cache else None
+        if cached is None:
+            page = self.fetch_backend.fetch(url, timeout, body_policy=self.body_policy)
+        else:
+            page = self.fetch_backend.fetch(url, timeout, cached[1], body_policy=self.body_policy)
+        return self._apply_http_cache(url, page, cached)
+    
+    async def _fetch_page_async(self, url, timeout):
+        """
+        Versão async de _fetch_page: as consultas ao cache HTTP (SQLite e o
+        lock dele) rodam numa thread para não travar o event loop
+        """
+        if self.http_cache is None:
+            page = await self.fetch_backend.fetch_async(url, timeout, body_policy=self.body_policy)
+            return self._apply_http_cache(url, page, None)
+        cached = await asyncio.to_thread(self.http_cache.get, url)
+        if cached is None:
+            page = await self.fetch_backend.fetch_async(url, timeout, body_policy=self.body_policy)
+        else:
+            page = await self.fetch_backend.fetch_async(url, timeout, cached[1], body_policy=self.body_policy)
+        return await asyncio.to_thread(self._apply_http_cache, url, page, cached)
+    
+    def _apply_http_cache(self, url, page, cached):
+        if page.status_code == 304 and cached is None:
+            # 304 sem requisição condicional (ou a entrada expirou): não há corpo para analisar
+            logger.warning(f"{url} respondeu 304 sem versão em cache")
+            raise requests.exceptions.HTTPError(f"304 Not Modified sem versão em cache: {url}", response=page)
+        if self.http_cache is None:
+            return page
+        if page.status_code == 304 and cached is not None:
+            # Página não mudou: reaproveitar o corpo armazenado
+            self.http_cache.revalidated(url)
+            logger.debug(f"Cache HTTP revalidado (304): {url}")
+            cached[0].timings = page.timings
+            return cached[0]
+        self.http_cache.store(url, page)
+        return page
+    
+    def _submit_page(self, executor, url, timeout=15, deep_analysis=False, return_links=False):
+        """
+        Submete a análise de uma URL ao backend configurado e retorna um Future
+        """
+        if self.fetch_backend.is_async:
+            return self.fetch_backend.submit(
+                self._analyze_page_async(url, timeout, deep_analysis, return_links, executor)
+            )
+        return executor.submit(self.analyze_page, url, timeout, deep_analysis, return_links)
+    
+    def _parallelism(self, max_workers):
+        """
+        Quantas URLs podem estar em andamento ao mesmo tempo
+        """
+        if self.fetch_backend.is_async:
+            return self.fetch_backend.concurrency
+        return max(1, max_workers)
+    
+    def _analyze_fetched(self, url, page, deep_analysis=False, return_links=False):
+        """
+        Parsing + detecção sobre uma página já baixada; corpos idênticos a uma
+        página já analisada reaproveitam o resultado de self.result_memo
+        """
+        # No crawling, respostas que não são HTML (PDF, imagem...) não são parseadas
+        if return_links and not self.url_canonicalizer.accepts_content_type(page.headers.get('Content-Type')):
+            logger.info(f"Ignorando conteúdo não HTML: {url} ({page.headers.get('Content-Type')})")
             results = {
                 'url': url,
-                'status_code': response.status_code,
+                'status_code': page.status_code,
                 'gateways_found': [],
                 'evidence': {},
                 'confidence_scores': {},
                 'analysis_time': datetime.now().isoformat(),
-                'page_title': soup.title.string if soup.title else "N/A",
-                'page_size': len(response.text)
-            }
-            
-            # Análise de cada gateway
-            for gateway_name, signatures in self.gateways.items():
-                evidence, confidence = self._check_gateway_signatures(soup, page_content, signatures, deep_analysis)
-                if evidence and confidence > 0:
-                    results['gateways_found'].append(gateway_name)
-                    results['evidence'][gateway_name] = evidence
-                    results['confidence_scores'][gateway_name] = confidence
-            
-            # Análise adicional se solicitada
-            if deep_analysis:
-                results['additional_analysis'] = self._deep_analysis(soup, page_content)
-            
-            return results
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Erro ao acessar {url}: {e}")
-            return {
-                'url': url,
-                'error': str(e),
-                'gateways_found': [],
-                'evidence': {},
-                'confidence_scores': {},
-                'analysis_time': datetime.now().isoformat()
+                'skipped_content_type': page.headers.get('Content-Type'),
+                'timings': dict(page.timings)
             }
-    
-    def _check_gateway_signatures(self, soup, page_content, signatures, deep_analysis=False):
-        """
-        Verifica as assinaturas de um gateway específico com pontuação de confiança
-        """
-        evidence = []
-        confidence_score = 0
-        
-        # Verificar palavras-chave no conteúdo (peso: 1 ponto cada)
-        for keyword in signatures['keywords']:
-            if keyword.lower() in page_content:
-                evidence.append(f"Palavra-chave encontrada: {keyword}")
-                confidence_score += 1
-        
-        # Verificar scripts (peso: 3 pontos cada)
-        for script_src in signatures['scripts']:
-            scripts = soup.find_all('script', src=True)
-            for script in scripts:
-                if script_src.lower() in script['src'].lower():
-                    evidence.append(f"Script encontrado: {script['src']}")
-                    confidence_score += 3
-        
-        # Verificar formulários (peso: 2 pontos cada)
-        for form_class in signatures['forms']:
-            forms = soup.find_all('form', class_=re.compile(form_class, re.I))
-            if forms:
-                evidence.append(f"Formulário encontrado: {form_class}")
-                confidence_score += 2
-        
-        # Verificar meta tags (peso: 2 pontos cada)
-        for meta_name in signatures['meta']:
-            meta_tags = soup.find_all('meta', attrs={'name': re.compile(meta_name, re.I)})
-            if meta_tags:
-                evidence.append(f"Meta tag encontrada: {meta_name}")
-                confidence_score += 2
-        
-        # Verificar classes CSS (peso: 1 ponto cada)
-        for css_class in signatures.get('css_classes', []):
-            elements = soup.find_all(class_=re.compile(css_class, re.I))
-            if elements:
-                evidence.append(f"Classe CSS encontrada: {css_class}")
-                confidence_score += 1
-        
-        # Verificar endpoints de API (peso: 2 pontos cada)
-        for endpoint in signatures.get('api_endpoints', []):
-            if endpoint.lower() in page_content:
-                evidence.append(f"Endpoint de API encontrado: {endpoint}")
-                confidence_score += 2
-        
-        return evidence if evidence else None, confidence_score
-    
-    def _deep_analysis(self, soup, page_content):
-        """
-        Análise adicional mais profunda
-        """
-        analysis = {}
+            self.metrics.record_page(page, results)
+            return results, {}
         
-        # Verificar iframes de pagamento
-        iframes = soup.find_all('iframe')
-        payment_iframes = []
-        for iframe in iframes:
-            src = iframe.get('src', '')
-            if any(keyword in src.lower() for keyword in ['payment', 'checkout', 'pay']):
-                payment_iframes.append(src)
+        memo_key = None
+        if self.result_memo is not None:
+            memo_key = DetectionMemo.make_key(page, deep_analysis)
+            cached = self.result_memo.get(memo_key)
+            if cached is not None:
+                results, anchors = cached
+                results['url'] = url
+                results['status_code'] = page.status_code
+                results['analysis_time'] = datetime.now().isoformat()
+                results['timings'] = dict(page.timings)
+                self.metrics.record_page(page, results, memo_hit=True)
+                if return_links:
+                    return results, self._extract_links(anchors, url)
+                return results
         
-        if payment_iframes:
-            analysis['payment_iframes'] = payment_iframes
+        if self.detection_pool is not None:
+            results, anchors, script_srcs = self.detection_pool.detect(url, page, deep_analysis)
+        else:
+            start = time.perf_counter()
+            features = self.parser.extract_features(page.text)
+            parse_time = time.perf_counter() - start
+            results = self.detector.analyze_document(url, page, features, deep_analysis)
+            results['timings'] = {'parse': parse_time, **results['timings']}
+            anchors = _page_anchors(features)
+            script_srcs = features['script_srcs']
+        scripts_complete = True
+        if self.script_cache is not None:
+            scripts_complete = self._scan_external_scripts(page, results, script_srcs)
+        # Tempos por etapa: connect/download (fetch), parse, match e deep
+        results['timings'] = {**page.timings, **results['timings']}
+        self.metrics.record_page(page, results)
+        if memo_key is not None and scripts_complete:
+            self.result_memo.put(memo_key, results, anchors)
         
-        # Verificar links externos suspeitos
-        external_links = []
-        links = soup.find_all('a', href=True)
-        for link in links:
-            href = link['href']
-            if any(gateway in href.lower() for gateway in ['stripe', 'paypal', 'mercadopago', 'adyen', 'braintree', 'shopify']):
-                external_links.append(href)
+        if return_links:
+            return results, self._extract_links(anchors, url)
+        return results
+    
+    def _check_host_health(self, url, timeout):
+        """
+        Circuit breaker antes do fetch: retorna (resultado sem fetch ou None, timeout adaptativo do host).
+        URLs de host com circuito aberto voltam para a fila do host ('deferred', ver _should_retry);
+        as de host indisponível falham na hora.
+        """
+        if self.host_health is None:
+            return None, timeout
+        verdict = self.host_health.check(url)
+        if verdict is None:
+            return None, self.host_health.timeout_for(url, timeout)
         
-        if external_links:
-            analysis['external_payment_links'] = external_links
+        reason, retry_in = verdict
+        results = self._error_result(url, reason)
+        if retry_in is None:
+            self.metrics.increment('circuit_fast_fails')
+        else:
+            results['deferred'] = retry_in
+            self.host_scheduler.defer(url, retry_in)
+        return results, timeout
+    
+    def _fetch_succeeded(self, url, page):
+        self.host_scheduler.record_status(url, page.status_code)
+        if self.host_health is not None:
+            self.host_health.record_success(url, sum(page.timings.values()))
+    
+    def _fetch_failed(self, url, error):
+        """
+        Monta o resultado de erro e informa o agendador de hosts (429/503) e,
+        nas falhas de rede, a saúde do host (circuit breaker)
+        """
+        logger.error(f"Erro ao acessar {url}: {error}")
+        results = self._error_result(url, error)
+        response = getattr(error, 'response', None)
+        self.metrics.record_failure(response.status_code if response is not None else None)
+        if response is not None:
+            results['status_code'] = response.status_code
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            self.host_scheduler.record_status(url, response.status_code, retry_after)
+            if self.host_health is not None:
+                self.host_health.record_success(url)
+        elif self.host_health is not None:
+            circuit = self.host_health.record_failure(url, isinstance(error, requests.exceptions.Timeout))
+            host = urlparse(url).netloc
+            if circuit == 'open':
+                cooldown = self.host_health.cooldown_for(url)
+                logger.warning(f"Host {host} com {self.host_health.failure_threshold} falhas seguidas: "
+                               f"circuit breaker aberto, URLs adiadas por {cooldown:.0f}s")
+                self.host_scheduler.defer(url, cooldown)
+            elif circuit == 'dead':
+                logger.warning(f"Host {host} continua falhando: circuit breaker abandona as URLs restantes")
+        return results
+    
+    def _fetch_aborted(self, url):
+        """
+        Fetch interrompido por uma exceção que não é de rede: se era a
+        requisição de teste do circuit breaker, o host não pode ficar em teste
+        para sempre (as outras URLs dele seriam adiadas indefinidamente)
+        """
+        if self.host_health is not None:
+            self.host_health.abort_probe(url)
+    
+    def _crawl_outcome(self, future, url):
+        """
+        (resultado, links) de uma página do crawling; uma exceção inesperada no
+        worker vira resultado de erro da URL em vez de encerrar o crawl
+        """
+        try:
+            return future.result()
+        except Exception as e:
+            logger.error(f"Erro inesperado ao analisar {url}: {e}")
+            return self._error_result(url, e), {}
+    
+    def _wait_completed(self, in_flight, can_dispatch, idle_timeout=None):
+        """
+        Espera algum Future de in_flight terminar. Com vaga para despachar,
+        acorda também quando um host com fila ficar pronto (ou após
+        idle_timeout sem fila); com todos os workers ocupados só um Future
+        libera trabalho, e o atraso 0 de um host pronto giraria em falso.
+        """
+        timeout = None
+        if can_dispatch:
+            timeout = self.host_scheduler.time_until_ready()
+            if timeout is None:
+                timeout = idle_timeout
+        done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+        return done
+    
+    def _should_retry(self, result, retries, url):
+        """
+        429/503 voltam para a fila do host (que fica pausado) até max_retries vezes;
+        URLs adiadas pelo circuit breaker voltam sem contar como tentativa, até
+        max_deferrals adiamentos (depois disso o erro do circuito é o resultado).
+        retries guarda [tentativas, adiamentos] por URL.
+        """
+        if 'deferred' in result:
+            attempts = retries.setdefault(url, [0, 0])
+            attempts[1] += 1
+            if attempts[1] <= self.max_deferrals:
+                return True
+            del result['deferred']
+            logger.warning(f"{url} adiada {self.max_deferrals} vezes pelo circuit breaker: desistindo")
+            return False
+        if result.get('status_code') not in RETRY_STATUS_CODES or 'error' not in result:
+            return False
+        attempts = retries.setdefault(url, [0, 0])
+        attempts[0] += 1
+        if attempts[0] > self.max_retries:
+            return False
+        self.metrics.increment('retries')
+        return True
+    
+    def _error_result(self, url, error):
+        return {
+            'url': url,
+            'error': str(error),
+            'gateways_found': [],
+            'evidence': {},
+            'confidence_scores': {},
+            'analysis_time': datetime.now().isoformat()
+        }
+    
+    def _scan_external_scripts(self, page, results, script_srcs):
+        """
+        Baixa os scripts externos da página e procura neles as palavras-chave e
+        endpoints dos gateways (SDKs embutidos em bundles próprios, ex. vendor.js).
         
-        # Verificar inputs de cartão de crédito
-        credit_card_inputs = []
-        inputs = soup.find_all('input')
-        for input_tag in inputs:
-            input_type = input_tag.get('type', '')
-            input_name = input_tag.get('name', '')
-            input_id = input_tag.get('id', '')
-            
-            if any(keyword in f"{input_type} {input_name} {input_id}".lower() 
-                   for keyword in ['card', 'credit', 'cvv', 'expiry', 'cc-number', 'cc-exp', 'cc-csc']):
-                credit_card_inputs.append({
-                    'type': input_type,
-                    'name': input_name,
-                    'id': input_id
-                })
+        Scripts cuja URL já casa com a assinatura de um gateway não são baixados,
+        e cada URL é baixada e varrida uma vez por crawling (self.script_cache).
+        Retorna False se algum download falhou (o resultado não vai para o
+        cache de resultados, para a página ser varrida de novo).
+        """
+        start = time.perf_counter()
+        script_urls = []
+        for src in script_srcs:
+            try:
+                script_url = urljoin(page.url, src.strip())
+            except ValueError:
+                continue
+            if urlparse(script_url).scheme not in ('http', 'https') or script_url in script_urls:
+                continue
+            lowered = script_url.lower()
+            if any(literal in lowered for literal in self._gateway_script_literals):
+                continue
+            script_urls.append(script_url)
+            if len(script_urls) >= self.max_scripts_per_page:
+                break
         
-        if credit_card_inputs:
-            analysis['credit_card_inputs'] = credit_card_inputs
+        found = set()
+        complete = True
+        for script_url in script_urls:
+            literals = self.script_cache.literals(script_url, self._fetch_script, self.signature_matcher.find_literals)
+            if literals is None:
+                complete = False
+            else:
+                found |= literals
         
-        return analysis
+        if found:
+            script_matches = self.signature_matcher.match_script_literals(found, results['evidence'])
+            for gateway_name, (evidence, confidence) in script_matches.items():
+                results['evidence'].setdefault(gateway_name, []).extend(evidence)
+                results['confidence_scores'][gateway_name] = results['confidence_scores'].get(gateway_name, 0) + confidence
+            # Mesma ordem da tabela de gateways usada por match()
+            results['gateways_found'] = [name for name in self.gateways if name in results['evidence']]
+        results['scripts_scanned'] = len(script_urls)
+        results['timings']['scripts'] = time.perf_counter() - start
+        return complete
     
-    def _extract_links(self, soup, base_url):
-        links = set()
-        for a_tag in soup.find_all('a', href=True):
-            href = a_tag['href']
-            full_url = urljoin(base_url, href)
-            parsed_url = urlparse(full_url)
-            
-            # Ignorar links que não são HTTP/HTTPS
-            if parsed_url.scheme not in ['http', 'https']:
+    def _fetch_script(self, script_url, timeout=15):
+        return self.fetch_backend.fetch(script_url, timeout, body_policy=self.script_body_policy)
+    
+    def _extract_links(self, anchors, base_url):
+        """
+        Links (href, texto) da página em forma canônica: {url: texto do link}
+        """
+        links = {}
+        for href, text in anchors:
+            try:
+                absolute_url = urljoin(base_url, href)
+            except ValueError:
+                # href malformado (ex. 'http://[bad/x'): ignora só este link
                 continue
+            # Forma canônica; None para links não HTTP, recursos não HTML e armadilhas
+            clean_url = self.url_canonicalizer.canonicalize(absolute_url)
+            if clean_url is None:
+                continue
+            if clean_url not in links:
+                links[clean_url] = text
+            elif text and text not in links[clean_url]:
+                links[clean_url] = f"{links[clean_url]} {text}"[:200]
+        return links
 
-            # Normalizar URL (remover fragmentos, etc.)
-            clean_url = parsed_url.scheme + "://" + parsed_url.netloc + parsed_url.path
-            if clean_url.endswith('/'):
-                clean_url = clean_url[:-1]
-            links.add(clean_url)
-        return list(links)
-
+    def resume_from_checkpoint(self):
+        """
+        Restaura fronteira, visitadas e resultados gravados em self.checkpoint
+        """
+        pending, completed = self.checkpoint.load()
+        self.visited_urls = completed
+        self.urls_to_visit = self._new_frontier(pending)
+        self._resumed = True
+        logger.info(f"Retomando do checkpoint: {len(completed)} URLs concluídas, {len(pending)} na fronteira")
+    
+    def _new_frontier(self, items=()):
+        if self.priority_links:
+            return PriorityFrontier(items, memory_limit=self.frontier_memory)
+        return SpillableFrontier(items, memory_limit=self.frontier_memory)
+    
+    def _enqueue(self, url, depth, score=0):
+        self.urls_to_visit.append((url, depth), score)
+        if self.checkpoint is not None:
+            self.checkpoint.record_enqueued(url, depth)
+    
     def crawl_and_detect(self, seed_urls, max_depth=1, max_urls=50, max_workers=5, deep_analysis=False):
         """
         Realiza o crawling e detecção de gateways.
         """
+        for page_result in self.iter_crawl_and_detect(seed_urls, max_depth, max_urls, max_workers, deep_analysis):
+            self.results.append(page_result)
+        return self.results
+    
+    def iter_crawl_and_detect(self, seed_urls, max_depth=1, max_urls=50, max_workers=5, deep_analysis=False):
+        """
+        Versão em streaming de crawl_and_detect: gera cada resultado assim que
+        fica pronto, sem acumulá-los em memória (ver JsonlSink/CsvSink).
+        
+        A fronteira (self.urls_to_visit) e o conjunto de visitados são manipulados
+        apenas pela thread coordenadora; os workers só fazem fetch + análise.
+        Assim a deduplicação e o limite de max_urls não precisam de locks.
+        As URLs saem da fronteira em ordem BFS (ou de pontuação, com --priority)
+        para as filas por host do self.host_scheduler, que mantêm a pontuação e
+        liberam o despacho respeitando a cortesia de cada host.
+        
+        O limite de max_urls conta as URLs despachadas. Links comuns deixam de
+        entrar quando os candidatos (fronteira + filas) já cobrem o orçamento
+        restante; com --priority, links de pontuação positiva entram mesmo
+        assim e passam à frente, e os candidatos de menor pontuação são os que
+        sobram quando o orçamento acaba.
+        """
         self.max_urls_to_crawl = max_urls
+        max_workers = max(1, max_workers)
+        parallelism = self._parallelism(max_workers)
+        scheduler = self.host_scheduler
+        # Na retomada, as URLs já concluídas contam no orçamento
+        dispatched = len(self.visited_urls)
         for url in seed_urls:
-            self.urls_to_visit.append((url, 0)) # (url, depth)
+            url = self.url_canonicalizer.canonicalize(url) or url
+            if url not in self.visited_urls:
+                self._enqueue(url, 0) # (url, depth)
         
-        while self.urls_to_visit and len(self.visited_urls) < self.max_urls_to_crawl:
-            current_url, current_depth = self.urls_to_visit.popleft()
-            
-            if current_url in self.visited_urls or current_depth > max_depth:
-                continue
-            
-            self.visited_urls.add(current_url)
-            
-            logger.info(f"Crawling: {current_url} (Profundidade: {current_depth}) - URLs visitadas: {len(self.visited_urls)}/{self.max_urls_to_crawl}")
-            
-            page_result = self.analyze_page(current_url, deep_analysis=deep_analysis)
-            self.results.append(page_result)
-            
-            if 'error' not in page_result:
-                # Extrair links para continuar o crawling
-                try:
-                    response = self.session.get(current_url, timeout=10)
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    new_links = self._extract_links(soup, current_url)
-                    for link in new_links:
-                        if link not in self.visited_urls and len(self.visited_urls) + len(self.urls_to_visit) < self.max_urls_to_crawl:
-                            self.urls_to_visit.append((link, current_depth + 1))
-                except requests.exceptions.RequestException as e:
-                    logger.warning(f"Não foi possível extrair links de {current_url}: {e}")
-            
-            # Pequena pausa para ser educado com os servidores
-            time.sleep(0.5) # Aumentado para 0.5s para ser mais gentil
+        if self._resumed:
+            self._resumed = False
+            for page_result in self.checkpoint.iter_results():
+                self._update_domain_stats(page_result['url'], page_result)
+                yield page_result
         
-        return self.results
+        in_flight = {}
+        retries = {}
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                while True:
+                    # Mover URLs novas da fronteira para as filas por host
+                    while self.urls_to_visit and scheduler.pending() < self.staging_limit:
+                        (current_url, current_depth), score = self.urls_to_visit.pop_scored()
+                        
+                        if current_url in self.visited_urls or current_depth > max_depth:
+                            continue
+                        if self.domain_stats.is_stopped(current_url):
+                            continue
+                        # A página só conta no limite por host quando é despachada
+                        if not self.url_canonicalizer.has_room(current_url):
+                            continue
+                        
+                        self.visited_urls.add(current_url)
+                        # A pontuação vai junto no item para uma nova tentativa manter a prioridade
+                        scheduler.add(current_url, (current_url, current_depth, score), score)
+                    
+                    # Manter os workers ocupados com URLs de hosts prontos
+                    while len(in_flight) < parallelism and dispatched < self.max_urls_to_crawl:
+                        item = scheduler.next_ready()
+                        if item is None:
+                            break
+                        current_url, current_depth, _ = item
+                        # Novas tentativas (em retries) já contam no limite por host
+                        if current_url not in retries and not self.url_canonicalizer.admit(current_url):
+                            # Host atingiu max_pages_per_host: item descartado sem requisição
+                            scheduler.release(current_url, unused=True)
+                            continue
+                        dispatched += 1
+                        
+                        logger.info(f"Crawling: {current_url} (Profundidade: {current_depth}) - URLs visitadas: {dispatched}/{self.max_urls_to_crawl}")
+                        
+                        future = self._submit_page(executor, current_url, deep_analysis=deep_analysis, return_links=True)
+                        in_flight[future] = item
+                    
+                    self.metrics.set_queue_depth(frontier=len(self.urls_to_visit), scheduled=scheduler.pending(), in_flight=len(in_flight))
+                    
+                    if not in_flight:
+                        if not scheduler.pending() or dispatched >= self.max_urls_to_crawl:
+                            break
+                        # Todos os hosts com fila estão aguardando tokens/backoff
+                        time.sleep(scheduler.time_until_ready() or 0.05)
+                        continue
+                    
+                    can_dispatch = len(in_flight) < parallelism and dispatched < self.max_urls_to_crawl
+                    for future in self._wait_completed(in_flight, can_dispatch):
+                        item = in_flight.pop(future)
+                        current_url, current_depth, current_score = item
+                        scheduler.release(current_url)
+                        page_result, new_links = self._crawl_outcome(future, current_url)
+                        
+                        if self._should_retry(page_result, retries, current_url):
+                            # A nova tentativa não conta de novo no orçamento
+                            dispatched -= 1
+                            scheduler.add(current_url, item, current_score)
+                            continue
+                        
+                        self._update_domain_stats(current_url, page_result)
+                        
+                        # Links além de max_depth seriam descartados; não gastar orçamento com eles
+                        if current_depth < max_depth:
+                            candidates = dispatched + scheduler.pending() + len(self.urls_to_visit)
+                            for link, text in new_links.items():
+                                if link in self.visited_urls:
+                                    continue
+                                score = score_link(link, text) if self.priority_links else 0
+                                if candidates < self.max_urls_to_crawl or score > 0:
+                                    self._enqueue(link, current_depth + 1, score)
+                                    candidates += 1
+                        
+                        # Resultado gravado depois dos links: ao retomar, a página não é
+                        # refeita e seus links já estão na fronteira
+                        if self.checkpoint is not None:
+                            self.checkpoint.record_result(page_result)
+                        yield page_result
+        finally:
+            # URLs que sobraram nas filas quando o orçamento acabou
+            scheduler.clear()
+            if self.checkpoint is not None:
+                self.checkpoint.flush()
+    
+    def iter_distributed_crawl(self, store, seed_urls, max_depth=1, max_urls=50, num_shards=16, poll_interval=0.5,
+                               lease_timeout=300):
+        """
+        Coordenador do modo distribuído: prepara o store compartilhado
+        (SQLiteFrontierStore/RedisFrontierStore), semeia a fronteira e gera os
+        resultados publicados pelos workers (run_distributed_worker) até a
+        fronteira esvaziar sem URLs em andamento; então sinaliza o fim aos workers.
+        URLs de um worker que morreu voltam à fila após lease_timeout segundos.
+        """
+        store.reset()
+        store.configure(num_shards, max_depth, max_urls, lease_timeout)
+        for url in seed_urls:
+            # Mesma forma canônica dos links descobertos pelos workers (deduplicação no store)
+            store.add(self.url_canonicalizer.canonicalize(url) or url, 0)
+        logger.info(f"Coordenador: {len(seed_urls)} URLs semente em {num_shards} shards, aguardando workers")
+        
+        try:
+            while True:
+                finished = store.is_finished()
+                # Resultados lidos depois da checagem: nenhum é perdido no término
+                yield from store.pop_results()
+                if finished:
+                    break
+                time.sleep(poll_interval)
+        finally:
+            store.stop()
+    
+    def run_distributed_worker(self, store, shards=None, max_workers=5, deep_analysis=False, poll_interval=0.5):
+        """
+        Worker do modo distribuído: retira URLs dos shards atribuídos (todos por
+        padrão), faz fetch + análise, adiciona os links descobertos ao store
+        (que deduplica entre todos os workers) e publica os resultados.
+        Retorna o número de páginas processadas quando o coordenador encerra o crawl.
+        """
+        while store.load_config() is None:
+            time.sleep(poll_interval)
+        shards = list(range(store.num_shards)) if shards is None else [shard % store.num_shards for shard in shards]
+        
+        max_workers = max(1, max_workers)
+        parallelism = self._parallelism(max_workers)
+        scheduler = self.host_scheduler
+        processed = 0
+        in_flight = {}
+        retries = {}
+        logger.info(f"Worker: shards {shards}")
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                # Puxar do store apenas o necessário para manter os workers ocupados
+                while scheduler.pending() < parallelism:
+                    item = store.claim(shards)
+                    if item is None:
+                        break
+                    scheduler.add(item[0], item)
+                
+                while len(in_flight) < parallelism:
+                    item = scheduler.next_ready()
+                    if item is None:
+                        break
+                    current_url, current_depth = item
+                    logger.info(f"Crawling: {current_url} (Profundidade: {current_depth})")
+                    future = self._submit_page(executor, current_url, deep_analysis=deep_analysis, return_links=True)
+                    in_flight[future] = item
+                
+                self.metrics.set_queue_depth(scheduled=scheduler.pending(), in_flight=len(in_flight))
+                
+                if not in_flight:
+                    if scheduler.pending():
+                        time.sleep(scheduler.time_until_ready() or 0.05)
+                        continue
+                    if store.stopped():
+                        break
+                    time.sleep(poll_interval)
+                    continue
+                
+                # Com vaga livre, voltar ao store a cada poll_interval (links de outros workers)
+                for future in self._wait_completed(in_flight, len(in_flight) < parallelism, poll_interval):
+                    current_url, current_depth = in_flight.pop(future)
+                    scheduler.release(current_url)
+                    page_result, new_links = self._crawl_outcome(future, current_url)
+                    
+                    if self._should_retry(page_result, retries, current_url):
+                        scheduler.add(current_url, (current_url, current_depth))
+                        continue
+                    
+                    if current_depth < store.max_depth:
+                        for link in new_links:
+                            store.add(link, current_depth + 1)
+                    if store.complete(current_url, page_result):
+                        processed += 1
+        
+        logger.info(f"Worker encerrado: {processed} páginas processadas")
+        return processed
+    
+    def _update_domain_stats(self, url, page_result):
+        stop_reason = self.domain_stats.add(url, page_result)
+        if stop_reason == 'gateway_confirmed':
+            logger.info(f"Gateway confirmado em {urlparse(url).netloc}: encerrando o crawling do host")
+        elif stop_reason == 'no_new_evidence':
+            logger.info(f"{self.domain_stats.stale_pages} páginas sem evidência nova em {urlparse(url).netloc}: encerrando o crawling do host")
+        if stop_reason is not None:
+            # URLs do host já passadas para o agendador não devem mais ser baixadas
+            self.host_scheduler.discard_host(url)
+    
+    def analyze_multiple_urls(self, urls, max_workers=5, deep_analysis=False, timeout=15, max_in_flight=None):
+        """
+        Analisa várias URLs em paralelo (sem crawling), gerando cada resultado
+        assim que fica pronto.
+        
+        urls pode ser qualquer iterável (inclusive um arquivo lido sob demanda):
+        no máximo max_in_flight URLs (padrão: 2x max_workers, ou 2x a
+        concorrência do backend async) são lidas e ainda não devolvidas. Elas
+        aguardam nas filas por host do self.host_scheduler, que despacha em
+        round-robin entre os hosts prontos.
+        Com o backend requests cada worker usa sua própria requests.Session;
+        com o backend async os workers só fazem parsing.
+        
+        Com self.checkpoint, os resultados retomados são gerados primeiro e as
+        URLs já concluídas não são baixadas de novo.
+        """
+        max_workers = max(1, max_workers)
+        parallelism = self._parallelism(max_workers)
+        max_in_flight = max(parallelism, max_in_flight or parallelism * 2)
+        scheduler = self.host_scheduler
+        pending_urls = iter(urls)
+        exhausted = False
+        staged = 0
+        in_flight = {}
+        retries = {}
+        
+        if self._resumed:
+            self._resumed = False
+            yield from self.checkpoint.iter_results()
+        
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            while True:
+                while not exhausted and staged < max_in_flight:
+                    url = next(pending_urls, None)
+                    if url is None:
+                        exhausted = True
+                        break
+                    if self.checkpoint is not None and url in self.visited_urls:
+                        continue
+                    scheduler.add(url, url)
+                    staged += 1
+                
+                while len(in_flight) < parallelism:
+                    url = scheduler.next_ready()
+                    if url is None:
+                        break
+                    future = self._submit_page(executor, url, timeout, deep_analysis)
+                    in_flight[future] = url
+                
+                self.metrics.set_queue_depth(scheduled=scheduler.pending(), in_flight=len(in_flight))
+                
+                if not in_flight:
+                    if not staged:
+                        break
+                    time.sleep(scheduler.time_until_ready() or 0.05)
+                    continue
+                
+                for future in self._wait_completed(in_flight, len(in_flight) < parallelism):
+                    url = in_flight.pop(future)
+                    scheduler.release(url)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"Erro inesperado ao analisar {url}: {e}")
+                        result = self._error_result(url, e)
+                    
+                    if self._should_retry(result, retries, url):
+                        scheduler.add(url, url)
+                        continue
+                    retries.pop(url, None)
+                    staged -= 1
+                    if self.checkpoint is not None:
+                        self.checkpoint.record_result(result)
+                    yield result
+        finally:
+            # Se o consumidor parar de iterar, não começar o que ainda está na fila
+            for future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=True, cancel_futures=True)
+            if self.checkpoint is not None:
+                self.checkpoint.flush()
+    
+    def analyze_incremental(self, rescan_store, urls, max_workers=5, deep_analysis=False, timeout=15):
+        """
+        Modo incremental (--rescan): analisa só as URLs cuja revisita venceu
+        em rescan_store (RescanStore) e registra cada resultado nele, que
+        acumula os deltas em relação à verificação anterior. Gera os
+        resultados das URLs verificadas, como analyze_multiple_urls.
+        """
+        due_urls = (url for url in urls if rescan_store.due(url))
+        for result in self.analyze_multiple_urls(due_urls, max_workers, deep_analysis, timeout):
+            rescan_store.record(result)
+            yield result
     
     def export_to_csv(self, results, filename):
         """
         Exporta os resultados para CSV
         """
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['url', 'gateways_found', 'confidence_total', 'status_code', 'page_title', 'error']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            writer.writeheader()
+        sink = CsvSink(filename)
+        try:
             for result in results:
-                writer.writerow({
-                    'url': result['url'],
-                    'gateways_found': ', '.join(result['gateways_found']),
-                    'confidence_total': sum(result.get('confidence_scores', {}).values()),
-                    'status_code': result.get('status_code', 'N/A'),
-                    'page_title': result.get('page_title', 'N/A'),
-                    'error': result.get('error', '')
-                })
-        
-        logger.info(f"Resultados exportados para CSV: {filename}")
+                sink.write(result)
+        finally:
+            sink.close()
     
-    def generate_detailed_report(self, results, output_file=None):
+    def generate_detailed_report(self, results, output_file=None, results_file=None):
         """
         Gera um relatório detalhado dos resultados
+        
+        results pode ser a lista de resultados ou um ReportAggregator já
+        alimentado em streaming; nesse caso os resultados individuais não são
+        repetidos no relatório e results_file aponta para o JSONL com eles.
         """
+        if isinstance(results, ReportAggregator):
+            aggregator = results
+        else:
+            aggregator = ReportAggregator.from_results(results)
+        
         report = {
             'metadata': {
-                'total_urls_analyzed': len(results),
-                'urls_with_gateways': len([r for r in results if r['gateways_found']]),
-                'urls_with_errors': len([r for r in results if 'error' in r]),
+                'total_urls_analyzed': aggregator.total_urls,
+                'urls_with_gateways': aggregator.urls_with_gateways,
+                'urls_with_errors': aggregator.urls_with_errors,
                 'analysis_timestamp': datetime.now().isoformat(),
-                'detector_version': '3.1' # Versão atualizada
+                'detector_version': '3.1', # Versão atualizada
+                'signature_pack': self.signature_pack.describe(),
+                'result_cache': self.result_memo.stats() if self.result_memo else None,
+                'dns_cache': self.dns_cache.stats() if self.dns_cache else None,
+                'connections': self.transport.stats() if self.transport else None,
+                'host_health': self.host_health.summary() if self.host_health else None,
+                'metrics': self.metrics.snapshot()
             },
-            'gateway_statistics': {},
-            'confidence_analysis': {},
-            'detailed_results': results
+            # Estatísticas por gateway
+            'gateway_statistics': dict(aggregator.gateway_counts),
+            # Análise de confiança
+            'confidence_analysis': aggregator.confidence_analysis(),
         }
-        
-        # Estatísticas por gateway
-        gateway_counts = {}
-        confidence_totals = {}
-        
-        for result in results:
-            for gateway in result['gateways_found']:
-                gateway_counts[gateway] = gateway_counts.get(gateway, 0) + 1
-                confidence = result.get('confidence_scores', {}).get(gateway, 0)
-                if gateway not in confidence_totals:
-                    confidence_totals[gateway] = []
-                confidence_totals[gateway].append(confidence)
-        
-        report['gateway_statistics'] = gateway_counts
-        
-        # Análise de confiança
-        for gateway, confidences in confidence_totals.items():
-            report['confidence_analysis'][gateway] = {
-                'average_confidence': sum(confidences) / len(confidences),
-                'max_confidence': max(confidences),
-                'min_confidence': min(confidences),
-                'total_detections': len(confidences)
-            }
+        # Resumo por domínio (modo crawling)
+        if self.domain_stats.domains:
+            report['domain_summary'] = self.domain_stats.summary()
+        # Reuso de conexões (keep-alive) por host
+        if self.transport is not None:
+            report['connection_reuse'] = self.transport.host_stats()
+        if aggregator is results:
+            report['detailed_results_file'] = results_file
+        else:
+            report['detailed_results'] = results
         
         if output_file:
             with open(output_file, 'w', encoding='utf-8') as f:
@@ -490,38 +4106,50 @@ class GatewayCrawlerV2:
     def print_detailed_summary(self, results):
         """
         Imprime um resumo detalhado dos resultados
+        
+        Com um ReportAggregator (modo streaming) só as estatísticas são impressas;
+        os detalhes por URL ficam nos arquivos JSONL/CSV.
         """
+        if isinstance(results, ReportAggregator):
+            aggregator = results
+        else:
+            aggregator = ReportAggregator.from_results(results)
+        
         print("\n" + "="*80)
         print("RELATÓRIO DETALHADO DE ANÁLISE DE GATEWAYS DE PAGAMENTO")
         print("="*80)
         
-        total_urls = len(results)
-        urls_with_gateways = len([r for r in results if r['gateways_found']])
-        urls_with_errors = len([r for r in results if 'error' in r])
+        total_urls = aggregator.total_urls
+        urls_with_gateways = aggregator.urls_with_gateways
+        urls_with_errors = aggregator.urls_with_errors
         
         print(f"📊 ESTATÍSTICAS GERAIS:")
         print(f"   Total de URLs analisadas: {total_urls}")
-        print(f"   URLs com gateways encontrados: {urls_with_gateways} ({urls_with_gateways/total_urls*100:.1f}%)")
-        print(f"   URLs com erros: {urls_with_errors} ({urls_with_errors/total_urls*100:.1f}%)")
+        if total_urls:
+            print(f"   URLs com gateways encontrados: {urls_with_gateways} ({urls_with_gateways/total_urls*100:.1f}%)")
+            print(f"   URLs com erros: {urls_with_errors} ({urls_with_errors/total_urls*100:.1f}%)")
         
         # Estatísticas por gateway
-        gateway_counts = {}
-        confidence_totals = {}
-        
-        for result in results:
-            for gateway in result['gateways_found']:
-                gateway_counts[gateway] = gateway_counts.get(gateway, 0) + 1
-                confidence = result.get('confidence_scores', {}).get(gateway, 0)
-                if gateway not in confidence_totals:
-                    confidence_totals[gateway] = []
-                confidence_totals[gateway].append(confidence)
+        gateway_counts = aggregator.gateway_counts
         
         if gateway_counts:
             print(f"\n🏆 GATEWAYS MAIS ENCONTRADOS:")
             for gateway, count in sorted(gateway_counts.items(), key=lambda x: x[1], reverse=True):
-                avg_confidence = sum(confidence_totals[gateway]) / len(confidence_totals[gateway])
+                avg_confidence = aggregator.average_confidence(gateway)
                 print(f"   {gateway}: {count} site(s) (confiança média: {avg_confidence:.1f})")
         
+        if self.domain_stats.domains:
+            print(f"\n🌐 RESUMO POR DOMÍNIO:")
+            for domain in self.domain_stats.summary():
+                stopped = f" - parada antecipada: {domain['stopped_early']}" if domain['stopped_early'] else ""
+                print(f"   {domain['domain']}: {domain['pages_analyzed']} página(s){stopped}")
+                for gateway in domain['gateways_found']:
+                    print(f"      🔍 {gateway} (confiança máx.: {domain['max_confidence'][gateway]}, "
+                          f"{domain['best_evidence_url'][gateway]})")
+        
+        if aggregator is results:
+            return
+        
         print(f"\n📋 DETALHES POR URL:")
         for result in results:
             if 'error' in result:
@@ -542,17 +4170,54 @@ class GatewayCrawlerV2:
                 print(f"   Nenhum gateway encontrado")
             print()
 
+    def print_delta_summary(self, delta_report):
+        """
+        Imprime o relatório de deltas do modo incremental (RescanStore.report)
+        """
+        counts = delta_report['metadata']
+        print("\n" + "="*80)
+        print("DELTAS DESDE A ÚLTIMA VERIFICAÇÃO")
+        print("="*80)
+        print(f"📊 {counts['listed']} URLs na lista, {counts['checked']} verificadas, "
+              f"{counts['not_due']} fora da janela de revisita")
+        print(f"   {counts['changed']} com mudança, {counts['unchanged']} sem mudança, "
+              f"{counts['new']} novas, {counts['errors']} com erro")
+        
+        if delta_report['changes']:
+            print(f"\n🔄 MUDANÇAS:")
+            for change in delta_report['changes']:
+                print(f"   {change['url']}")
+                for gateway in change['added']:
+                    print(f"      + {gateway}")
+                for gateway in change['removed']:
+                    print(f"      - {gateway}")
+                for gateway, (previous, current) in change['confidence'].items():
+                    print(f"      ~ {gateway}: confiança {previous} -> {current}")
+        
+        if delta_report['new_urls']:
+            print(f"\n🆕 URLS NOVAS:")
+            for new_url in delta_report['new_urls']:
+                gateways = ', '.join(new_url['gateways']) or 'nenhum gateway'
+                print(f"   {new_url['url']}: {gateways}")
+        print()
+
 def load_urls_from_file(filename):
     """
     Carrega URLs de um arquivo de texto
     """
+    return list(iter_urls_from_file(filename))
+
+def iter_urls_from_file(filename):
+    """
+    Lê as URLs de um arquivo de texto sob demanda, linha a linha
+    """
     try:
         with open(filename, 'r', encoding='utf-8') as f:
-            urls = [line.strip() for line in f if line.strip() and not line.startswith('#')]
-        return urls
+            for line in f:
+                if line.strip() and not line.startswith('#'):
+                    yield line.strip()
     except FileNotFoundError:
         logger.error(f"Arquivo não encontrado: {filename}")
-        return []
 
 def interactive_mode():
     """
@@ -610,7 +4275,7 @@ def interactive_mode():
                 print(f"Carregadas {len(urls)} URLs do arquivo.")
                 deep = input("Análise profunda? (s/n): ").lower().startswith('s')
                 workers = int(input("Número de workers paralelos (padrão 5): ") or "5")
-                results = crawler.analyze_multiple_urls(urls, max_workers=workers, deep_analysis=deep)
+                results = list(crawler.analyze_multiple_urls(urls, max_workers=workers, deep_analysis=deep))
                 crawler.print_detailed_summary(results)
                 
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -632,7 +4297,7 @@ def interactive_mode():
             ]
             
             print(f"Analisando {len(test_urls)} URLs de exemplo...")
-            results = crawler.analyze_multiple_urls(test_urls, deep_analysis=True)
+            results = list(crawler.analyze_multiple_urls(test_urls, deep_analysis=True))
             crawler.print_detailed_summary(results)
             
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -657,10 +4322,96 @@ def main():
     parser.add_argument('--max_depth', type=int, default=1, help='Profundidade máxima do crawling')
     parser.add_argument('--max_urls', type=int, default=50, help='Número máximo de URLs para analisar no crawling')
     parser.add_argument('--output', help='Arquivo de saída para o relatório JSON')
-    parser.add_argument('--csv', help='Arquivo de saída para o relatório CSV')
+    parser.add_argument('--csv', help='Arquivo de saída para o relatório CSV (gravado em streaming)')
+    parser.add_argument('--jsonl', help='Arquivo JSONL com um resultado por linha, gravado em streaming (não mantém os resultados em memória)')
     parser.add_argument('--deep', action='store_true', help='Ativar análise profunda')
     parser.add_argument('--workers', type=int, default=5, help='Número de workers paralelos')
     parser.add_argument('--interactive', action='store_true', help='Modo interativo')
+    parser.add_argument('--backend', choices=['requests', 'async'], default='requests',
+                        help='Backend de fetch: requests (padrão) ou async (httpx/asyncio, HTTP/2 quando disponível)')
+    parser.add_argument('--concurrency', type=int, default=500,
+                        help='Conexões simultâneas no backend async (os workers fazem o parsing)')
+    parser.add_argument('--host_rate', type=float, default=2.0, help='Requisições por segundo por host (0 = sem limite)')
+    parser.add_argument('--host_connections', type=int, default=2, help='Conexões simultâneas por host')
+    parser.add_argument('--parser', choices=sorted(PARSER_BACKENDS), default='html.parser',
+                        help='Backend de parsing HTML: html.parser (padrão), lxml ou selectolax')
+    parser.add_argument('--signatures', help='Pack de assinaturas JSON (padrão: gateway_signatures.json ao lado do módulo)')
+    parser.add_argument('--signature_cache', help='Diretório do índice compilado das assinaturas (padrão: ~/.cache/gateway_crawler)')
+    parser.add_argument('--processes', type=int, default=0,
+                        help='Processos para parsing/detecção (0 = nas threads de fetch)')
+    parser.add_argument('--distributed', choices=['coordinator', 'worker'],
+                        help='Modo distribuído: coordinator semeia (--seed_urls) e coleta; worker processa shards')
+    parser.add_argument('--store', default='crawl_frontier.db',
+                        help='Fronteira compartilhada do modo distribuído: redis://host:6379/0 ou arquivo SQLite local')
+    parser.add_argument('--num_shards', type=int, default=16, help='Shards da fronteira distribuída (por hash do host)')
+    parser.add_argument('--shards', help='Shards deste worker, separados por vírgula (padrão: todos)')
+    parser.add_argument('--lease_timeout', type=int, default=300,
+                        help='Coordenador: segundos até uma URL retirada por um worker que não a concluiu voltar à fila')
+    parser.add_argument('--max_per_host', type=int, help='Máximo de páginas por host no crawling')
+    parser.add_argument('--query_allow', help='Parâmetros de query mantidos nos links, separados por vírgula (padrão: todos)')
+    parser.add_argument('--query_deny', help='Parâmetros de query removidos dos links, além dos de rastreamento/sessão')
+    parser.add_argument('--max_path_repeats', type=int, default=2,
+                        help='Repetições de um mesmo segmento de caminho antes de tratar o link como armadilha')
+    parser.add_argument('--priority', action='store_true',
+                        help='Crawlear primeiro links de checkout/pagamento/carrinho/doação/planos')
+    parser.add_argument('--stop_on_gateway', type=int, nargs='?', const=3,
+                        help='Parar de crawlear um host quando um gateway atingir esta confiança (padrão: 3)')
+    parser.add_argument('--stale_pages', type=int,
+                        help='Parar de crawlear um host após N páginas seguidas sem evidência nova')
+    parser.add_argument('--domains', help='Arquivo JSON com o resumo por domínio do crawling')
+    parser.add_argument('--metrics_port', type=int, help='Porta HTTP com /metrics (Prometheus) e /stats (JSON)')
+    parser.add_argument('--metrics_host', default='127.0.0.1',
+                        help='Endereço do servidor de métricas (0.0.0.0 expõe na rede)')
+    parser.add_argument('--stats_file', help='Arquivo JSON com as métricas, regravado a cada --stats_interval segundos')
+    parser.add_argument('--stats_interval', type=float, default=30, help='Intervalo do --stats_file em segundos')
+    parser.add_argument('--frontier_memory', type=int, default=100000,
+                        help='URLs da fronteira mantidas em memória; o excedente vai para um arquivo temporário')
+    parser.add_argument('--checkpoint', help='Arquivo SQLite de checkpoint do estado do crawl/lote')
+    parser.add_argument('--resume', action='store_true',
+                        help='Retomar do checkpoint (padrão: crawl_checkpoint.db) sem refazer URLs concluídas')
+    parser.add_argument('--memo_size', type=int, default=2048,
+                        help='Entradas do cache de resultados por hash do conteúdo (0 desativa)')
+    parser.add_argument('--stream_body', action='store_true',
+                        help='Ler o corpo em streaming, limitado a --max_body_kb')
+    parser.add_argument('--max_body_kb', type=int, default=2048, help='Tamanho máximo do corpo lido em KB (com --stream_body)')
+    parser.add_argument('--head_extra_kb', type=int,
+                        help='Com --stream_body: parar o download quando houver script de gateway e '
+                             'a página passar de </head> + N KB')
+    parser.add_argument('--scan_scripts', action='store_true',
+                        help='Baixar e varrer os scripts externos das páginas (cada URL uma vez por crawling)')
+    parser.add_argument('--max_scripts', type=int, default=10, help='Máximo de scripts externos varridos por página')
+    parser.add_argument('--max_script_kb', type=int, default=1024, help='Tamanho máximo lido de cada script externo em KB')
+    parser.add_argument('--script_cache_size', type=int, default=10000,
+                        help='Entradas do cache de scripts externos (por URL e por hash do conteúdo)')
+    parser.add_argument('--pool_per_host', type=int,
+                        help='Conexões guardadas por host no pool (padrão: --host_connections + 2)')
+    parser.add_argument('--pool_hosts', type=int, default=1000,
+                        help='Hosts com pool de conexões aberto (LRU); limita o total de sockets ociosos')
+    parser.add_argument('--idle_timeout', type=float, default=30,
+                        help='Segundos sem uso até fechar as conexões ociosas de um host')
+    parser.add_argument('--dns_ttl', type=float, default=300, help='Validade das resoluções DNS em cache em segundos (0 desativa)')
+    parser.add_argument('--dns_negative_ttl', type=float, default=60,
+                        help='Validade em cache das falhas de resolução DNS em segundos')
+    parser.add_argument('--failure_threshold', type=int, default=3,
+                        help='Falhas de rede seguidas que abrem o circuit breaker de um host (0 desativa)')
+    parser.add_argument('--breaker_cooldown', type=float, default=30,
+                        help='Segundos com o circuito aberto antes da requisição de teste (dobra a cada abertura)')
+    parser.add_argument('--breaker_trips', type=int, default=2,
+                        help='Aberturas seguidas do circuito até abandonar as URLs restantes do host')
+    parser.add_argument('--min_timeout', type=float, default=5,
+                        help='Piso do timeout adaptativo por host em segundos')
+    parser.add_argument('--rescan', help='Modo incremental com --file: arquivo SQLite com o estado da última '
+                                         'verificação; só URLs com revisita vencida são analisadas')
+    parser.add_argument('--delta', help='Arquivo JSON com os deltas do modo incremental (gateways adicionados/removidos, '
+                                        'confiança alterada)')
+    parser.add_argument('--revisit_min_days', type=float, default=1, help='Intervalo mínimo de revisita em dias (--rescan)')
+    parser.add_argument('--revisit_max_days', type=float, default=30, help='Intervalo máximo de revisita em dias (--rescan)')
+    parser.add_argument('--confidence_delta', type=int, default=1,
+                        help='Variação mínima de confiança reportada como mudança (--rescan)')
+    parser.add_argument('--rescan_all', action='store_true', help='Com --rescan: verificar todas as URLs, ignorando a agenda')
+    parser.add_argument('--http_cache', help='Arquivo SQLite do cache HTTP persistente (revalidação com ETag/Last-Modified)')
+    parser.add_argument('--cache_ttl_days', type=float, default=30, help='Validade das entradas do cache HTTP em dias')
+    parser.add_argument('--cache_max_mb', type=float, default=512, help='Tamanho máximo do cache HTTP em MB (despejo LRU)')
     
     args = parser.parse_args()
     
@@ -668,29 +4419,176 @@ def main():
         interactive_mode()
         return
     
-    crawler = GatewayCrawlerV2()
+    if args.backend == 'async' and importlib.util.find_spec('httpx') is None:
+        parser.error("--backend async requer o pacote httpx (pip install 'httpx[http2]')")
+    if args.rescan and not args.file:
+        parser.error("--rescan requer --file")
     
-    if args.seed_urls:
-        seed_urls_list = [url.strip() for url in args.seed_urls.split(',') if url.strip()]
-        results = crawler.crawl_and_detect(seed_urls_list, args.max_depth, args.max_urls, args.workers, args.deep)
-    elif args.url:
-        results = [crawler.analyze_page(args.url, deep_analysis=args.deep)]
-    elif args.file:
-        urls = load_urls_from_file(args.file)
-        if not urls:
-            return
-        results = crawler.analyze_multiple_urls(urls, max_workers=args.workers, deep_analysis=args.deep)
-    else:
-        print("Especifique --url, --file, --seed_urls ou use --interactive")
-        return
+    http_cache = None
+    if args.http_cache:
+        http_cache = HTTPCache(args.http_cache, ttl=args.cache_ttl_days * 86400,
+                               max_bytes=int(args.cache_max_mb * 1024 * 1024))
+    
+    rescan_store = None
+    if args.rescan:
+        rescan_store = RescanStore(args.rescan, min_interval=args.revisit_min_days * 86400,
+                                   max_interval=args.revisit_max_days * 86400, confidence_delta=args.confidence_delta,
+                                   force=args.rescan_all)
     
-    crawler.print_detailed_summary(results)
+    checkpoint = None
+    if args.checkpoint or args.resume:
+        checkpoint = CrawlCheckpoint(args.checkpoint or 'crawl_checkpoint.db', resume=args.resume)
     
-    if args.output:
-        crawler.generate_detailed_report(results, args.output)
+    url_canonicalizer = URLCanonicalizer(
+        query_allow=[param.strip() for param in args.query_allow.split(',') if param.strip()] if args.query_allow else None,
+        query_deny=TRACKING_QUERY_PARAMS + tuple(param.strip() for param in (args.query_deny or '').split(',') if param.strip()),
+        max_pages_per_host=args.max_per_host, max_path_repeats=args.max_path_repeats)
     
-    if args.csv:
-        crawler.export_to_csv(results, args.csv)
+    try:
+        crawler = GatewayCrawlerV2(backend=args.backend, concurrency=args.concurrency,
+                                   host_rate=args.host_rate, host_connections=args.host_connections,
+                                   http_cache=http_cache, memo_size=args.memo_size,
+                                   checkpoint=checkpoint, parser=args.parser, stream_body=args.stream_body,
+                                   max_body_bytes=args.max_body_kb * 1024,
+                                   head_extra_bytes=args.head_extra_kb * 1024 if args.head_extra_kb is not None else None,
+                                   processes=args.processes, frontier_memory=args.frontier_memory,
+                                   url_canonicalizer=url_canonicalizer, priority_links=args.priority,
+                                   stop_on_gateway=args.stop_on_gateway, stale_pages=args.stale_pages,
+                                   signatures=args.signatures, signature_cache=args.signature_cache,
+                                   scan_scripts=args.scan_scripts, max_scripts_per_page=args.max_scripts,
+                                   max_script_bytes=args.max_script_kb * 1024,
+                                   script_cache_size=args.script_cache_size, pool_per_host=args.pool_per_host,
+                                   pool_hosts=args.pool_hosts, idle_timeout=args.idle_timeout,
+                                   dns_ttl=args.dns_ttl, dns_negative_ttl=args.dns_negative_ttl,
+                                   failure_threshold=args.failure_threshold, breaker_cooldown=args.breaker_cooldown,
+                                   breaker_trips=args.breaker_trips, min_timeout=args.min_timeout)
+    except (RuntimeError, ValueError, OSError) as e:
+        parser.error(str(e))
+    
+    # Recursos liberados em qualquer saída (inclusive erros e retornos antecipados)
+    exporter = None
+    store = None
+    try:
+        if args.resume:
+            crawler.resume_from_checkpoint()
+        
+        if args.metrics_port is not None or args.stats_file:
+            exporter = MetricsExporter(crawler.metrics, port=args.metrics_port, stats_file=args.stats_file,
+                                       interval=args.stats_interval, host=args.metrics_host)
+        
+        if args.distributed:
+            try:
+                store = open_frontier_store(args.store)
+            except RuntimeError as e:
+                parser.error(str(e))
+        
+        if args.distributed == 'worker':
+            shards = [int(shard) for shard in args.shards.split(',')] if args.shards else None
+            crawler.run_distributed_worker(store, shards, max_workers=args.workers, deep_analysis=args.deep)
+            return
+        
+        if args.distributed == 'coordinator':
+            if not args.seed_urls:
+                parser.error("--distributed coordinator requer --seed_urls")
+            seed_urls_list = [url.strip() for url in args.seed_urls.split(',') if url.strip()]
+            stream = crawler.iter_distributed_crawl(store, seed_urls_list, args.max_depth, args.max_urls, args.num_shards,
+                                                    lease_timeout=args.lease_timeout)
+        elif args.seed_urls:
+            seed_urls_list = [url.strip() for url in args.seed_urls.split(',') if url.strip()]
+            stream = crawler.iter_crawl_and_detect(seed_urls_list, args.max_depth, args.max_urls, args.workers, args.deep)
+        elif args.url:
+            stream = iter([crawler.analyze_page(args.url, deep_analysis=args.deep)])
+        elif args.file and rescan_store:
+            stream = crawler.analyze_incremental(rescan_store, iter_urls_from_file(args.file), max_workers=args.workers,
+                                                 deep_analysis=args.deep)
+        elif args.file:
+            stream = crawler.analyze_multiple_urls(iter_urls_from_file(args.file), max_workers=args.workers, deep_analysis=args.deep)
+        else:
+            print("Especifique --url, --file, --seed_urls ou use --interactive")
+            return
+        
+        # Cada resultado vai para os sinks assim que fica pronto; com --jsonl os
+        # resultados não são mantidos em memória e o relatório usa só os agregados
+        sinks = []
+        if args.jsonl:
+            sinks.append(JsonlSink(args.jsonl))
+        if args.csv:
+            sinks.append(CsvSink(args.csv))
+        aggregator = ReportAggregator()
+        results = None if args.jsonl else []
+        
+        try:
+            for result in stream:
+                aggregator.add(result)
+                for sink in sinks:
+                    sink.write(result)
+                if results is not None:
+                    results.append(result)
+        finally:
+            for sink in sinks:
+                sink.close()
+        
+        # Modo incremental: o resultado principal são os deltas
+        if rescan_store:
+            rescan_store.close()
+            delta_report = rescan_store.report()
+            crawler.print_delta_summary(delta_report)
+            if args.delta:
+                with open(args.delta, 'w', encoding='utf-8') as f:
+                    json.dump(delta_report, f, indent=2, ensure_ascii=False)
+                logger.info(f"Relatório de deltas salvo em: {args.delta}")
+        
+        if args.file and not aggregator.total_urls:
+            return
+        
+        # No modo incremental o resumo completo fica só no --output
+        if not rescan_store:
+            crawler.print_detailed_summary(results if results is not None else aggregator)
+        
+        if args.output:
+            if results is not None:
+                crawler.generate_detailed_report(results, args.output)
+            else:
+                crawler.generate_detailed_report(aggregator, args.output, results_file=args.jsonl)
+        
+        if args.domains:
+            with open(args.domains, 'w', encoding='utf-8') as f:
+                json.dump(crawler.domain_stats.summary(), f, indent=2, ensure_ascii=False)
+            logger.info(f"Resumo por domínio salvo em: {args.domains}")
+        
+        if crawler.result_memo:
+            memo_stats = crawler.result_memo.stats()
+            logger.info(f"Cache de resultados por conteúdo: {memo_stats['hits']} acertos, taxa {memo_stats['hit_rate']*100:.1f}%")
+        
+        if crawler.transport:
+            connection_stats = crawler.transport.stats()
+            logger.info(f"Conexões: {connection_stats['connections']} abertas para {connection_stats['requests']} requisições "
+                        f"em {connection_stats['hosts']} hosts, reuso {connection_stats['reuse_rate']*100:.1f}%")
+        
+        if crawler.host_health:
+            health_stats = crawler.host_health.stats()
+            if health_stats['trips']:
+                logger.info(f"Circuit breaker: {health_stats['trips']} aberturas, {health_stats['hosts_dead']} hosts abandonados")
+        
+        if crawler.script_cache:
+            script_stats = crawler.script_cache.stats()
+            logger.info(f"Scripts externos: {script_stats['downloads']} baixados, {script_stats['scans']} varridos, "
+                        f"{script_stats['hits']} acertos do cache")
+    finally:
+        crawler.close()
+        
+        if exporter:
+            exporter.close()
+        
+        if store:
+            store.close()
+        
+        if checkpoint:
+            checkpoint.close()
+        
+        if http_cache:
+            logger.info(f"Cache HTTP: {http_cache.hits} revalidações (304), {http_cache.misses} downloads completos")
+            http_cache.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,132 @@
+"""
+Fixtures dos testes: site HTTP local com páginas em memória e crawler sem
+pausas de cortesia.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gateway_crawler_v2_1 import GatewayCrawlerV2
+
+logging.disable(logging.WARNING)
+
+# Cabeçalho condicional da requisição -> validador da resposta
+VALIDATORS = {'If-None-Match': 'ETag', 'If-Modified-Since': 'Last-Modified'}
+
+
+class LocalSite:
+    """
+    Servidor HTTP/1.1 em 127.0.0.1 numa porta livre. pages mapeia caminho ->
+    corpo HTML (str), (status, cabeçalhos, corpo) ou uma lista dessas
+    respostas, servidas em ordem (a última se repete), e pode ser alterado
+    durante o teste. Páginas com ETag/Last-Modified respondem 304 às
+    requisições condicionais que casam com eles. requests registra os
+    caminhos pedidos, em ordem, e conditional os cabeçalhos condicionais
+    recebidos (If-None-Match, If-Modified-Since) de cada pedido; delay
+    atrasa cada resposta em segundos e drip pausa drip segundos entre cada
+    byte do corpo (servidor lento pingando dados).
+    """
+    def __init__(self):
+        self.pages = {}
+        self.requests = []
+        self.conditional = []
+        self.delay = 0
+        self.drip = 0
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                site.requests.append(self.path)
+                conditional = {name: self.headers[name] for name in ('If-None-Match', 'If-Modified-Since')
+                               if self.headers[name] is not None}
+                site.conditional.append(conditional)
+                if site.delay:
+                    time.sleep(site.delay)
+                page = site.pages.get(self.path)
+                if isinstance(page, list):
+                    page = page.pop(0) if len(page) > 1 else page[0]
+                if page is None:
+                    page = (404, {}, 'not found')
+                elif isinstance(page, str):
+                    page = (200, {}, page)
+                status, headers, body = page
+                if status == 200 and conditional and all(
+                        headers.get(VALIDATORS[name]) == value for name, value in conditional.items()):
+                    status, body = 304, ''
+                body = body.encode('utf-8')
+                self.send_response(status)
+                headers = {'Content-Type': 'text/html; charset=utf-8', **headers}
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if not site.drip:
+                    self.wfile.write(body)
+                    return
+                try:
+                    for index in range(len(body)):
+                        self.wfile.write(body[index:index + 1])
+                        self.wfile.flush()
+                        time.sleep(site.drip)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def url(self, path):
+        return self.base + path
+
+    def fetched(self, path):
+        return path in self.requests
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def page(title='', links=(), body=''):
+    """
+    HTML mínimo com título, links [(href, texto)] e corpo extra
+    """
+    anchors = ''.join(f'<a href="{href}">{text}</a>' for href, text in links)
+    return f"<html><head><title>{title}</title></head><body>{anchors}{body}</body></html>"
+
+
+@pytest.fixture
+def site():
+    local_site = LocalSite()
+    yield local_site
+    local_site.close()
+
+
+@pytest.fixture
+def make_crawler():
+    crawlers = []
+
+    def factory(**kwargs):
+        kwargs.setdefault('host_rate', 0)
+        # Sem gravar o índice compilado das assinaturas em ~/.cache
+        kwargs.setdefault('signature_cache', False)
+        crawler = GatewayCrawlerV2(**kwargs)
+        crawlers.append(crawler)
+        return crawler
+
+    yield factory
+    for crawler in crawlers:
+        crawler.close()
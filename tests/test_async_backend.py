@@ -0,0 +1,36 @@
+"""
+Backend async (httpx): o event loop não executa trabalho bloqueante
+"""
+import threading
+
+import pytest
+
+from gateway_crawler_v2_1 import HTTPCache
+from tests.conftest import page
+
+pytest.importorskip('httpx')
+
+
+def test_http_cache_runs_off_the_event_loop(site, make_crawler, tmp_path):
+    site.pages['/a'] = (200, {'ETag': '"v1"'}, page('A'))
+    cache = HTTPCache(str(tmp_path / 'cache.sqlite'))
+    threads = []
+    for name in ('get', 'store', 'revalidated'):
+        method = getattr(cache, name)
+
+        def recording(*args, method=method):
+            threads.append(threading.current_thread().name)
+            return method(*args)
+
+        setattr(cache, name, recording)
+    crawler = make_crawler(backend='async', concurrency=4, http_cache=cache)
+
+    try:
+        for _ in range(2):
+            result = list(crawler.analyze_multiple_urls([site.url('/a')], max_workers=1))[0]
+            assert 'error' not in result and result['page_title'] == 'A'
+    finally:
+        cache.close()
+
+    assert len(threads) == 4
+    assert 'async-fetch' not in threads
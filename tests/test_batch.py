@@ -0,0 +1,39 @@
+"""
+Análise em lote (analyze_multiple_urls) e prazo total por URL
+"""
+import time
+
+from tests.conftest import page
+
+
+def test_slow_drip_body_hits_the_total_deadline(site, make_crawler):
+    site.pages['/lenta'] = page('Lenta', body='x' * 200)
+    site.drip = 0.1
+    crawler = make_crawler()
+
+    start = time.monotonic()
+    result = crawler.analyze_page(site.url('/lenta'), timeout=1)
+    elapsed = time.monotonic() - start
+
+    assert 'Tempo total de 1s excedido' in result['error']
+    assert elapsed < 3
+
+
+def test_in_flight_urls_are_bounded(site, make_crawler):
+    for i in range(20):
+        site.pages[f'/p{i}'] = page(f'P{i}')
+    crawler = make_crawler()
+    read = []
+
+    def urls():
+        for i in range(20):
+            read.append(i)
+            yield site.url(f'/p{i}')
+
+    results = crawler.analyze_multiple_urls(urls(), max_workers=2)
+    first = next(results)
+
+    # Padrão: 2x max_workers URLs lidas e ainda não devolvidas
+    assert len(read) <= 2 * 2 + 1
+    assert 'error' not in first
+    assert len(list(results)) == 19
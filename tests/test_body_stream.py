@@ -0,0 +1,63 @@
+"""
+Leitura do corpo em streaming (--stream_body): limite de tamanho e parada
+antecipada com evidência forte
+"""
+from gateway_crawler_v2_1 import BodyStreamPolicy
+from tests.conftest import page
+
+STRIPE = '<script src="https://js.stripe.com/v3/"></script>'
+
+
+def feed_all(policy, chunks):
+    state = policy.start()
+    kept = []
+    for chunk in chunks:
+        kept.append(chunk)
+        if not state.feed(chunk):
+            break
+    return state, state.body(kept)
+
+
+def test_body_is_capped_at_max_bytes():
+    state, body = feed_all(BodyStreamPolicy([], max_bytes=100), [b'x' * 60] * 5)
+    assert state.stop_reason == 'max_bytes'
+    assert body == b'x' * 100
+
+
+def test_head_stop_needs_strong_evidence_split_across_chunks():
+    policy = BodyStreamPolicy(['js.stripe.com'], max_bytes=10000, head_extra_bytes=10)
+    document = b'<html><head><script src="https://js.STRIPE.com/v3/"></script></head><body>' + b'x' * 500
+    chunks = [document[i:i + 7] for i in range(0, len(document), 7)]
+
+    state, body = feed_all(policy, chunks)
+    assert state.strong_evidence and state.stop_reason == 'head'
+    assert len(body) < len(document)
+
+    plain = document.replace(b'STRIPE', b'exemplo')
+    state, body = feed_all(policy, [plain[i:i + 7] for i in range(0, len(plain), 7)])
+    assert state.stop_reason is None and body == plain
+
+
+def test_crawler_truncates_large_page(site, make_crawler):
+    site.pages['/grande'] = page('Grande', body='x' * 100000)
+    crawler = make_crawler(stream_body=True, max_body_bytes=4096)
+
+    fetched = crawler.fetch_backend.fetch(site.url('/grande'), 15, body_policy=crawler.body_policy)
+    result = crawler.analyze_page(site.url('/grande'))
+
+    assert len(fetched.content) == 4096 and fetched.truncated == 'max_bytes'
+    assert result['body_truncated'] == 'max_bytes'
+    assert crawler.metrics.counters['truncated'] == 1
+
+
+def test_crawler_stops_after_head_with_gateway_script(site, make_crawler):
+    site.pages['/loja'] = f"<html><head><title>Loja</title>{STRIPE}</head><body>{'x' * 200000}</body></html>"
+    site.pages['/sem_sdk'] = page('Sem SDK', body='x' * 50000)
+    crawler = make_crawler(stream_body=True, head_extra_bytes=1024)
+
+    result = crawler.analyze_page(site.url('/loja'))
+    plain = crawler.analyze_page(site.url('/sem_sdk'))
+
+    assert result['body_truncated'] == 'head'
+    assert result['gateways_found'] == ['Stripe']
+    assert 'body_truncated' not in plain
@@ -0,0 +1,63 @@
+"""
+Checkpoint do crawling (CrawlCheckpoint) e retomada com --resume
+"""
+from collections import Counter
+
+from gateway_crawler_v2_1 import CrawlCheckpoint
+from tests.conftest import page
+
+
+def test_resume_continues_without_refetching(tmp_path, site, make_crawler):
+    site.pages['/start'] = page('Raiz', [(f'/p{i}', f'p{i}') for i in range(1, 7)])
+    for i in range(1, 7):
+        site.pages[f'/p{i}'] = page(f'P{i}')
+    all_urls = {site.url('/start')} | {site.url(f'/p{i}') for i in range(1, 7)}
+    path = str(tmp_path / 'checkpoint.db')
+
+    # Primeira execução interrompida depois de 3 páginas
+    checkpoint = CrawlCheckpoint(path)
+    stream = make_crawler(checkpoint=checkpoint).iter_crawl_and_detect([site.url('/start')], max_depth=1, max_urls=20,
+                                                                        max_workers=1)
+    first = [next(stream) for _ in range(3)]
+    stream.close()
+    checkpoint.close()
+
+    checkpoint = CrawlCheckpoint(path, resume=True)
+    crawler = make_crawler(checkpoint=checkpoint)
+    try:
+        crawler.resume_from_checkpoint()
+        resumed = crawler.crawl_and_detect([site.url('/start')], max_depth=1, max_urls=20, max_workers=1)
+    finally:
+        checkpoint.close()
+
+    # Os resultados gravados são reemitidos primeiro, depois o restante da fronteira
+    assert [result['url'] for result in resumed[:3]] == [result['url'] for result in first]
+    assert {result['url'] for result in resumed} == all_urls
+    assert len(resumed) == len(all_urls)
+    assert max(Counter(site.requests).values()) == 1
+
+
+def test_resume_counts_completed_pages_in_max_urls(tmp_path, site, make_crawler):
+    site.pages['/start'] = page('Raiz', [(f'/p{i}', f'p{i}') for i in range(1, 7)])
+    for i in range(1, 7):
+        site.pages[f'/p{i}'] = page(f'P{i}')
+    path = str(tmp_path / 'checkpoint.db')
+
+    checkpoint = CrawlCheckpoint(path)
+    stream = make_crawler(checkpoint=checkpoint).iter_crawl_and_detect([site.url('/start')], max_depth=1, max_urls=5,
+                                                                        max_workers=1)
+    for _ in range(3):
+        next(stream)
+    stream.close()
+    checkpoint.close()
+
+    checkpoint = CrawlCheckpoint(path, resume=True)
+    crawler = make_crawler(checkpoint=checkpoint)
+    try:
+        crawler.resume_from_checkpoint()
+        resumed = crawler.crawl_and_detect([site.url('/start')], max_depth=1, max_urls=5, max_workers=1)
+    finally:
+        checkpoint.close()
+
+    assert len(resumed) == 5
+    assert len(site.requests) == 5
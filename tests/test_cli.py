@@ -0,0 +1,40 @@
+"""
+Linha de comando (main): recursos liberados em todas as saídas
+"""
+import sys
+
+import gateway_crawler_v2_1
+from gateway_crawler_v2_1 import GatewayCrawlerV2, HTTPCache
+
+
+def run_main(monkeypatch, cache_home, *args):
+    # Índice compilado das assinaturas fora de ~/.cache
+    monkeypatch.setenv('XDG_CACHE_HOME', str(cache_home))
+    closed = []
+    for cls in (GatewayCrawlerV2, HTTPCache):
+        close = cls.close
+
+        def recording(self, close=close, name=cls.__name__):
+            closed.append(name)
+            close(self)
+
+        monkeypatch.setattr(cls, 'close', recording)
+    monkeypatch.setattr(sys, 'argv', ['gateway_crawler_v2_1.py', *args])
+    gateway_crawler_v2_1.main()
+    return closed
+
+
+def test_empty_url_file_still_closes_everything(monkeypatch, tmp_path):
+    url_file = tmp_path / 'urls.txt'
+    url_file.write_text('\n', encoding='utf-8')
+
+    closed = run_main(monkeypatch, tmp_path, '--file', str(url_file), '--http_cache', str(tmp_path / 'cache.sqlite'))
+
+    assert sorted(closed) == ['GatewayCrawlerV2', 'HTTPCache']
+
+
+def test_missing_input_still_closes_the_crawler(monkeypatch, tmp_path, capsys):
+    closed = run_main(monkeypatch, tmp_path, '--max_depth', '1')
+
+    assert closed == ['GatewayCrawlerV2']
+    assert 'Especifique --url' in capsys.readouterr().out
@@ -0,0 +1,69 @@
+"""
+Crawling (iter_crawl_and_detect): robustez do laço coordenador
+"""
+from gateway_crawler_v2_1 import URLCanonicalizer
+from tests.conftest import page
+
+
+def test_worker_exception_becomes_error_result(site, make_crawler):
+    site.pages['/start'] = page('Raiz', [('/a', 'a'), ('/b', 'b')])
+    site.pages['/a'] = page('A')
+    site.pages['/b'] = page('B')
+    crawler = make_crawler()
+    analyze_fetched = crawler._analyze_fetched
+
+    def failing(url, *args, **kwargs):
+        if url.endswith('/a'):
+            raise RuntimeError('falha simulada')
+        return analyze_fetched(url, *args, **kwargs)
+
+    crawler._analyze_fetched = failing
+    results = crawler.crawl_and_detect([site.url('/start')], max_depth=1, max_urls=10, max_workers=2)
+
+    by_url = {result['url']: result for result in results}
+    assert set(by_url) == {site.url('/start'), site.url('/a'), site.url('/b')}
+    assert 'falha simulada' in by_url[site.url('/a')]['error']
+    assert 'error' not in by_url[site.url('/b')]
+
+
+def test_stopped_host_queue_is_not_fetched(site, make_crawler):
+    site.pages['/start'] = page('Raiz', [(f'/page{i}', f'página {i}') for i in range(1, 31)])
+    site.pages['/page1'] = page('Pagamento', body='<script src="https://js.stripe.com/v3/"></script>')
+    for i in range(2, 31):
+        site.pages[f'/page{i}'] = page(f'Página {i}')
+    crawler = make_crawler(stop_on_gateway=3)
+
+    results = crawler.crawl_and_detect([site.url('/start')], max_depth=1, max_urls=50, max_workers=1)
+
+    assert site.requests == ['/start', '/page1']
+    assert len(results) == 2
+    assert crawler.domain_stats.summary()[0]['stopped_early'] == 'gateway_confirmed'
+    assert crawler.host_scheduler.pending() == 0
+
+
+def test_max_per_host_counts_dispatched_pages_once(site, make_crawler):
+    site.pages['/start'] = page('Raiz', [('/a', 'a'), ('/b', 'b'), ('/c', 'c')])
+    site.pages['/a'] = [(429, {'Retry-After': '0'}, 'ocupado'), page('A')]
+    site.pages['/b'] = page('B')
+    site.pages['/c'] = page('C')
+    crawler = make_crawler(url_canonicalizer=URLCanonicalizer(max_pages_per_host=3))
+
+    results = crawler.crawl_and_detect([site.url('/start')], max_depth=1, max_urls=10, max_workers=1)
+
+    # A nova tentativa de /a não gasta uma vaga do host
+    assert site.requests == ['/start', '/a', '/b', '/a']
+    assert sorted(result['url'] for result in results) == [site.url('/a'), site.url('/b'), site.url('/start')]
+    assert crawler.url_canonicalizer.pages_per_host == {site.base[len('http://'):]: 3}
+    assert crawler.host_scheduler.pending() == 0
+
+
+def test_pages_left_when_budget_ends_do_not_use_host_slots(site, make_crawler):
+    for name in 'abcd':
+        site.pages[f'/{name}'] = page(name.upper())
+    crawler = make_crawler(url_canonicalizer=URLCanonicalizer(max_pages_per_host=3))
+
+    seeds = [site.url(f'/{name}') for name in 'abcd']
+    results = crawler.crawl_and_detect(seeds, max_depth=0, max_urls=2, max_workers=1)
+
+    assert len(results) == 2
+    assert crawler.url_canonicalizer.pages_per_host == {site.base[len('http://'):]: 2}
@@ -0,0 +1,31 @@
+"""
+Detecção em processos (--processes): mesma saída da detecção em processo
+"""
+from tests.conftest import page
+
+GATEWAY_BODY = ('<form class="stripe-payment-form"></form>'
+                '<script src="https://js.stripe.com/v3/"></script>')
+# Árvore profunda: um NavigableString no resultado estoura a recursão do pickle
+DEEP_BODY = '<div>' * 2000 + 'conteúdo' + '</div>' * 2000
+
+
+def comparable(results):
+    by_url = {}
+    for result in results:
+        result = dict(result)
+        result.pop('analysis_time', None)
+        result.pop('timings', None)
+        by_url[result['url']] = result
+    return by_url
+
+
+def test_pool_matches_in_process_detection(site, make_crawler):
+    site.pages['/start'] = page('Loja', [('/checkout', 'Finalizar compra'), ('/sobre', 'Sobre')])
+    site.pages['/checkout'] = page('Checkout', body=GATEWAY_BODY + DEEP_BODY)
+    site.pages['/sobre'] = page('Sobre nós')
+
+    in_process = make_crawler().crawl_and_detect([site.url('/start')], max_depth=1, max_urls=10)
+    pooled = make_crawler(processes=2).crawl_and_detect([site.url('/start')], max_depth=1, max_urls=10)
+
+    assert comparable(pooled) == comparable(in_process)
+    assert comparable(pooled)[site.url('/checkout')]['page_title'] == 'Checkout'
@@ -0,0 +1,74 @@
+"""
+Visitadas compactas (URLFingerprintSet) e fronteira com transbordo em disco
+(SpillableFrontier)
+"""
+from gateway_crawler_v2_1 import PriorityFrontier, SpillableFrontier, URLFingerprintSet
+from tests.conftest import page
+
+
+def test_fingerprint_set_grows_and_deduplicates():
+    urls = [f'https://loja.test/produto/{i}' for i in range(5000)]
+    visited = URLFingerprintSet(urls[:10], capacity=8)
+    for url in urls:
+        visited.add(url)
+    visited.add(urls[0])
+
+    assert len(visited) == 5000
+    assert all(url in visited for url in urls)
+    assert 'https://loja.test/produto/5000' not in visited
+    assert len(visited._table) >= 2 * len(visited)
+    assert URLFingerprintSet.fingerprint('') != 0
+
+
+def test_spilled_frontier_keeps_fifo_order_and_memory_limit():
+    frontier = SpillableFrontier(memory_limit=3)
+    items = [(f'https://loja.test/{i}\tç', i % 4) for i in range(2500)]
+    for item in items[:1500]:
+        frontier.append(item)
+    assert len(frontier._head) == 3 and len(frontier) == 1500
+
+    popped = [frontier.popleft() for _ in range(700)]
+    for item in items[1500:]:
+        frontier.append(item)
+        assert len(frontier._head) <= 3
+    while frontier:
+        popped.append(frontier.popleft())
+        assert len(frontier._head) <= 3
+
+    assert popped == items
+    frontier.close()
+
+
+def test_drained_spill_file_is_reused():
+    frontier = SpillableFrontier(memory_limit=2)
+    for round_number in range(3):
+        items = [(f'https://loja.test/{round_number}/{i}', 1) for i in range(10)]
+        for item in items:
+            frontier.append(item)
+        assert [frontier.popleft() for _ in range(10)] == items
+        assert not frontier
+    frontier.close()
+
+
+def test_priority_frontier_spills_its_fifo_part():
+    frontier = PriorityFrontier(memory_limit=2)
+    for i in range(5):
+        frontier.append((f'https://loja.test/{i}', 1))
+    frontier.append(('https://loja.test/checkout', 1), 5)
+
+    assert frontier.pop_scored() == (('https://loja.test/checkout', 1), 5)
+    assert [frontier.popleft() for _ in range(5)] == [(f'https://loja.test/{i}', 1) for i in range(5)]
+    frontier.close()
+
+
+def test_crawl_with_tiny_frontier_memory_visits_every_page(site, make_crawler):
+    site.pages['/start'] = page('Raiz', [(f'/p{i}', f'p{i}') for i in range(20)])
+    for i in range(20):
+        site.pages[f'/p{i}'] = page(f'P{i}', [('/start', 'raiz')])
+    crawler = make_crawler(frontier_memory=2)
+
+    results = crawler.crawl_and_detect([site.url('/start')], max_depth=2, max_urls=50, max_workers=2)
+
+    assert sorted(result['url'] for result in results) == sorted([site.url('/start')] + [site.url(f'/p{i}') for i in range(20)])
+    assert len(site.requests) == 21
+    assert len(crawler.visited_urls) == 21
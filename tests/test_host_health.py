@@ -0,0 +1,171 @@
+"""
+Circuit breaker e timeout adaptativo por host (HostHealth)
+"""
+import socket
+import threading
+import time
+
+import requests
+
+from gateway_crawler_v2_1 import HostHealth
+from tests.conftest import page
+
+
+def closed_port_base():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def count_fetches(crawler, fail=lambda url: False):
+    """
+    Conta as requisições que chegam ao backend de fetch; fail(url) simula uma falha de rede
+    """
+    fetched = []
+    fetch = crawler.fetch_backend.fetch
+
+    def counting(url, *args, **kwargs):
+        fetched.append(url)
+        if fail(url):
+            raise requests.exceptions.ConnectionError(f"conexão recusada: {url}")
+        return fetch(url, *args, **kwargs)
+
+    crawler.fetch_backend.fetch = counting
+    return fetched
+
+
+def test_circuit_opens_half_opens_and_dies():
+    health = HostHealth(failure_threshold=2, cooldown=0.05, max_trips=2)
+    url = 'https://fora.test/a'
+    assert health.record_failure(url) is None
+    assert health.record_failure(url) == 'open'
+    reason, retry_in = health.check(url)
+    assert reason == 'Circuit breaker aberto' and 0 < retry_in <= 0.05
+
+    time.sleep(0.06)
+    assert health.check(url) is None
+    assert health.check(url) == ('Circuit breaker em teste', HostHealth.PROBE_WAIT)
+    assert health.record_failure(url) == 'dead'
+    assert health.check(url) == ('Host indisponível (circuit breaker aberto)', None)
+    assert health.summary()['fora.test']['trips'] == 2
+
+
+def test_success_closes_the_circuit():
+    health = HostHealth(failure_threshold=1, cooldown=0)
+    url = 'https://fora.test/a'
+    assert health.record_failure(url) == 'open'
+    assert health.check(url) is None
+    health.record_success(url, 0.1)
+    assert health.check(url) is None
+    assert health.summary() == {}
+
+
+def test_adaptive_timeout_follows_latency():
+    health = HostHealth(min_timeout=0.5, min_samples=3)
+    url = 'https://lenta.test/a'
+    assert health.timeout_for(url, 15) == 15
+    for _ in range(3):
+        health.record_success(url, 0.2)
+    assert 0.5 <= health.timeout_for(url, 15) < 15
+    health.record_failure(url, timed_out=True)
+    assert health.timeout_for(url, 15) >= 1.0
+
+
+def test_refused_host_fails_fast_without_touching_the_network(site, make_crawler):
+    refused_host = closed_port_base()
+    refused = [f'{refused_host}/x{i}' for i in range(6)]
+    site.pages['/start'] = page('Raiz', [(url, 'fora') for url in refused] + [('/a', 'a')])
+    site.pages['/a'] = page('A')
+    crawler = make_crawler(failure_threshold=2, breaker_trips=1)
+    fetched = count_fetches(crawler)
+
+    results = crawler.crawl_and_detect([site.url('/start')], max_depth=1, max_urls=20, max_workers=1)
+
+    by_url = {result['url']: result for result in results}
+    assert len([url for url in fetched if url.startswith(refused_host)]) == 2
+    assert all('error' in by_url[url] for url in refused)
+    assert sum('indisponível' in by_url[url]['error'] for url in refused) == 4
+    assert 'error' not in by_url[site.url('/a')]
+
+
+def test_open_circuit_defers_host_until_probe_succeeds(site, make_crawler):
+    site.pages['/start'] = page('Raiz', [('/a', 'a'), ('/b', 'b')])
+    site.pages['/a'] = page('A')
+    site.pages['/b'] = page('B')
+    crawler = make_crawler(failure_threshold=1, breaker_cooldown=0.2, breaker_trips=3)
+    count_fetches(crawler, fail=lambda url: url.endswith('/a'))
+
+    start = time.monotonic()
+    results = crawler.crawl_and_detect([site.url('/start')], max_depth=1, max_urls=10, max_workers=1)
+
+    by_url = {result['url']: result for result in results}
+    assert 'conexão recusada' in by_url[site.url('/a')]['error']
+    assert 'error' not in by_url[site.url('/b')]
+    assert time.monotonic() - start >= 0.2
+    assert crawler.host_health.summary() == {}
+    assert len(results) == 3
+
+
+def test_aborted_probe_makes_next_request_the_probe():
+    health = HostHealth(failure_threshold=1, cooldown=0)
+    url = 'https://fora.test/a'
+    assert health.record_failure(url) == 'open'
+    assert health.check(url) is None
+    assert health.check('https://fora.test/b') == ('Circuit breaker em teste', HostHealth.PROBE_WAIT)
+
+    # Só a requisição de teste pode encerrar o teste
+    health.abort_probe('https://fora.test/b')
+    assert health.summary()['fora.test']['circuit'] == 'half_open'
+    health.abort_probe(url)
+    assert health.check('https://fora.test/b') is None
+    assert health.summary()['fora.test']['circuit'] == 'half_open'
+
+
+def test_probe_raising_unexpected_error_does_not_stall_the_batch(site, make_crawler):
+    for name in 'abcd':
+        site.pages[f'/{name}'] = page(name.upper())
+    crawler = make_crawler(failure_threshold=1, breaker_cooldown=0.1, breaker_trips=3)
+    fetched = []
+    fetch = crawler.fetch_backend.fetch
+
+    def flaky(url, *args, **kwargs):
+        fetched.append(url)
+        if len(fetched) == 1:
+            raise requests.exceptions.ConnectionError('conexão recusada')
+        if len(fetched) == 2:
+            raise RuntimeError('falha inesperada no teste')
+        return fetch(url, *args, **kwargs)
+
+    crawler.fetch_backend.fetch = flaky
+    results = []
+    worker = threading.Thread(
+        target=lambda: results.extend(crawler.analyze_multiple_urls([site.url(f'/{name}') for name in 'abcd'], max_workers=1)),
+        daemon=True
+    )
+    worker.start()
+    worker.join(10)
+
+    assert not worker.is_alive()
+    by_url = {result['url']: result for result in results}
+    assert len(by_url) == 4
+    assert 'conexão recusada' in by_url[site.url('/a')]['error']
+    assert 'falha inesperada' in by_url[site.url('/b')]['error']
+    assert 'error' not in by_url[site.url('/c')] and 'error' not in by_url[site.url('/d')]
+    assert crawler.host_health.summary() == {}
+
+
+def test_deferred_url_gives_up_after_deferral_budget(make_crawler):
+    crawler = make_crawler()
+    crawler.max_deferrals = 2
+    retries = {}
+    url = 'https://fora.test/a'
+
+    def deferred():
+        return {**crawler._error_result(url, 'Circuit breaker em teste'), 'deferred': HostHealth.PROBE_WAIT}
+
+    assert crawler._should_retry(deferred(), retries, url)
+    assert crawler._should_retry(deferred(), retries, url)
+    result = deferred()
+    assert not crawler._should_retry(result, retries, url)
+    assert 'deferred' not in result and result['error'] == 'Circuit breaker em teste'
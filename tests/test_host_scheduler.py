@@ -0,0 +1,48 @@
+"""
+Despacho com o HostScheduler: a espera do coordenador não gira em falso
+"""
+import gateway_crawler_v2_1
+from tests.conftest import page
+
+
+def test_busy_workers_block_on_futures(site, make_crawler, monkeypatch):
+    for i in range(4):
+        site.pages[f'/p{i}'] = page(f'P{i}')
+    site.delay = 0.3
+    calls = []
+    real_wait = gateway_crawler_v2_1.wait
+
+    def counting_wait(*args, **kwargs):
+        calls.append(kwargs.get('timeout'))
+        return real_wait(*args, **kwargs)
+
+    monkeypatch.setattr(gateway_crawler_v2_1, 'wait', counting_wait)
+    crawler = make_crawler()
+
+    # Um worker e o host ainda com conexão livre: time_until_ready() é 0
+    results = list(crawler.analyze_multiple_urls([site.url(f'/p{i}') for i in range(4)], max_workers=1))
+
+    assert len(results) == 4
+    assert len(calls) <= 8
+    assert calls and all(timeout is None for timeout in calls)
+
+
+def test_busy_crawl_blocks_on_futures(site, make_crawler, monkeypatch):
+    site.pages['/start'] = page('Raiz', [(f'/p{i}', f'p{i}') for i in range(3)])
+    for i in range(3):
+        site.pages[f'/p{i}'] = page(f'P{i}')
+    site.delay = 0.3
+    calls = []
+    real_wait = gateway_crawler_v2_1.wait
+
+    def counting_wait(*args, **kwargs):
+        calls.append(kwargs.get('timeout'))
+        return real_wait(*args, **kwargs)
+
+    monkeypatch.setattr(gateway_crawler_v2_1, 'wait', counting_wait)
+    crawler = make_crawler()
+
+    results = crawler.crawl_and_detect([site.url('/start')], max_depth=1, max_urls=10, max_workers=1)
+
+    assert len(results) == 4
+    assert len(calls) <= 8
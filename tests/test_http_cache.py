@@ -0,0 +1,86 @@
+"""
+Cache HTTP persistente (HTTPCache): revalidação condicional, 304 e expiração
+"""
+import time
+
+import pytest
+
+from gateway_crawler_v2_1 import HTTPCache
+from tests.conftest import page
+
+LAST_MODIFIED = 'Wed, 01 Jan 2025 00:00:00 GMT'
+
+
+@pytest.fixture
+def http_cache(tmp_path):
+    cache = HTTPCache(str(tmp_path / 'cache.sqlite'))
+    yield cache
+    cache.close()
+
+
+@pytest.mark.parametrize('validator, conditional', [
+    ({'ETag': '"v1"'}, {'If-None-Match': '"v1"'}),
+    ({'Last-Modified': LAST_MODIFIED}, {'If-Modified-Since': LAST_MODIFIED}),
+])
+def test_rescan_revalidates_and_reuses_cached_body(site, make_crawler, http_cache, validator, conditional):
+    site.pages['/checkout'] = (200, validator, page('Pagamento', body='<script src="https://js.stripe.com/v3/"></script>'))
+    crawler = make_crawler(http_cache=http_cache)
+
+    first = crawler.analyze_page(site.url('/checkout'))
+    second = crawler.analyze_page(site.url('/checkout'))
+
+    assert site.conditional == [{}, conditional]
+    assert http_cache.hits == 1
+    assert second['status_code'] == 200
+    assert second['page_title'] == first['page_title'] == 'Pagamento'
+    assert second['gateways_found'] == first['gateways_found'] == ['Stripe']
+
+
+def test_changed_page_replaces_cached_entry(site, make_crawler, http_cache):
+    site.pages['/a'] = (200, {'ETag': '"v1"'}, page('Antiga'))
+    crawler = make_crawler(http_cache=http_cache)
+    crawler.analyze_page(site.url('/a'))
+
+    site.pages['/a'] = (200, {'ETag': '"v2"'}, page('Nova'))
+    assert crawler.analyze_page(site.url('/a'))['page_title'] == 'Nova'
+    assert crawler.analyze_page(site.url('/a'))['page_title'] == 'Nova'
+
+    assert site.conditional == [{}, {'If-None-Match': '"v1"'}, {'If-None-Match': '"v2"'}]
+    assert http_cache.hits == 1
+
+
+def test_expired_entry_is_fetched_unconditionally(site, make_crawler, tmp_path):
+    site.pages['/a'] = (200, {'ETag': '"v1"'}, page('A'))
+    cache = HTTPCache(str(tmp_path / 'cache.sqlite'), ttl=0.05)
+    crawler = make_crawler(http_cache=cache)
+    try:
+        crawler.analyze_page(site.url('/a'))
+        time.sleep(0.1)
+        result = crawler.analyze_page(site.url('/a'))
+    finally:
+        cache.close()
+
+    assert site.conditional == [{}, {}]
+    assert result['page_title'] == 'A' and cache.hits == 0
+
+
+def test_response_without_validators_is_not_cached(site, make_crawler, http_cache):
+    site.pages['/a'] = page('A')
+    crawler = make_crawler(http_cache=http_cache)
+    crawler.analyze_page(site.url('/a'))
+    crawler.analyze_page(site.url('/a'))
+
+    assert site.conditional == [{}, {}]
+    assert http_cache.get(site.url('/a')) is None
+
+
+@pytest.mark.parametrize('use_cache', [True, False])
+def test_unsolicited_304_is_an_error(site, make_crawler, http_cache, use_cache):
+    site.pages['/a'] = (304, {}, '')
+    crawler = make_crawler(http_cache=http_cache if use_cache else None)
+
+    result = crawler.analyze_page(site.url('/a'))
+
+    assert result['status_code'] == 304
+    assert '304 Not Modified sem versão em cache' in result['error']
+    assert crawler.host_health.summary() == {}
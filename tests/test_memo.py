@@ -0,0 +1,84 @@
+"""
+Cache de resultados por hash do conteúdo (DetectionMemo)
+"""
+from gateway_crawler_v2_1 import DetectionMemo, FetchedPage
+from tests.conftest import page
+
+STRIPE = '<script src="https://js.stripe.com/v3/"></script>'
+
+
+def count_parses(crawler):
+    parsed = []
+    extract_features = crawler.parser.extract_features
+
+    def counting(html):
+        parsed.append(html)
+        return extract_features(html)
+
+    crawler.parser.extract_features = counting
+    return parsed
+
+
+def test_identical_bodies_are_analyzed_once(site, make_crawler):
+    body = page('Espelho', [('produto', 'produto')], body=STRIPE)
+    site.pages['/a/'] = body
+    site.pages['/b/'] = body
+    crawler = make_crawler()
+    parsed = count_parses(crawler)
+
+    first, first_links = crawler.analyze_page(site.url('/a/'), return_links=True)
+    second, second_links = crawler.analyze_page(site.url('/b/'), return_links=True)
+
+    assert len(parsed) == 1
+    assert crawler.result_memo.stats()['hits'] == 1
+    assert first['gateways_found'] == second['gateways_found'] == ['Stripe']
+    assert (first['url'], second['url']) == (site.url('/a/'), site.url('/b/'))
+    # Links relativos resolvidos contra a URL de cada página
+    assert list(first_links) == [site.url('/a/produto')]
+    assert list(second_links) == [site.url('/b/produto')]
+
+
+def test_changed_body_or_deep_flag_misses(site, make_crawler):
+    site.pages['/a'] = page('A', body=STRIPE)
+    crawler = make_crawler()
+    parsed = count_parses(crawler)
+
+    crawler.analyze_page(site.url('/a'))
+    site.pages['/a'] = page('A')
+    changed = crawler.analyze_page(site.url('/a'))
+    crawler.analyze_page(site.url('/a'), deep_analysis=True)
+    crawler.analyze_page(site.url('/a'))
+
+    assert changed['gateways_found'] == []
+    assert len(parsed) == 3
+    assert crawler.result_memo.stats()['hits'] == 1
+
+
+def test_memo_returns_copies_and_evicts_lru():
+    memo = DetectionMemo(max_entries=1)
+    first = DetectionMemo.make_key(FetchedPage('https://a.test/', 200, {}, b'a', 'utf-8'), False)
+    second = DetectionMemo.make_key(FetchedPage('https://a.test/', 200, {}, b'b', 'utf-8'), False)
+    result = {'gateways_found': ['Stripe']}
+    memo.put(first, result, [('/x', 'x')])
+    result['gateways_found'].append('PayPal')
+
+    cached, anchors = memo.get(first)
+    cached['gateways_found'].clear()
+    assert memo.get(first)[0] == {'gateways_found': ['Stripe']}
+    assert anchors == (('/x', 'x'),)
+
+    memo.put(second, {}, [])
+    assert memo.get(first) is None
+    assert memo.stats()['entries'] == 1
+
+
+def test_memo_size_zero_disables_the_memo(site, make_crawler):
+    site.pages['/a'] = page('A')
+    crawler = make_crawler(memo_size=0)
+    parsed = count_parses(crawler)
+
+    crawler.analyze_page(site.url('/a'))
+    crawler.analyze_page(site.url('/a'))
+
+    assert crawler.result_memo is None
+    assert len(parsed) == 2
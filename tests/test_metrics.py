@@ -0,0 +1,27 @@
+"""
+Exportação das métricas do crawl (MetricsExporter)
+"""
+import json
+from urllib.request import urlopen
+
+from gateway_crawler_v2_1 import CrawlMetrics, MetricsExporter
+
+
+def test_exporter_listens_on_localhost_by_default():
+    exporter = MetricsExporter(CrawlMetrics(), port=0)
+    try:
+        host, port = exporter._server.server_address
+        assert host == '127.0.0.1'
+        with urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            assert b'pages' in response.read()
+        with urlopen(f"http://127.0.0.1:{port}/stats", timeout=5) as response:
+            assert 'counters' in json.loads(response.read())
+    finally:
+        exporter.close()
+
+
+def test_stats_file_snapshot(tmp_path):
+    stats_file = tmp_path / 'stats.json'
+    exporter = MetricsExporter(CrawlMetrics(), stats_file=str(stats_file))
+    exporter.close()
+    assert json.loads(stats_file.read_text(encoding='utf-8'))['counters']['pages'] == 0
@@ -0,0 +1,36 @@
+"""
+Paridade dos backends de parsing com o html.parser nas páginas de
+benchmarks/fixtures.
+"""
+import os
+
+import pytest
+
+from gateway_crawler_v2_1 import PARSER_BACKENDS, get_parser_backend
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures')
+FIXTURES = sorted(name for name in os.listdir(FIXTURES_DIR) if name.endswith('.html'))
+
+
+def features(backend_name, filename):
+    try:
+        backend = get_parser_backend(backend_name)
+    except RuntimeError as e:
+        pytest.skip(str(e))
+    with open(os.path.join(FIXTURES_DIR, filename), encoding='utf-8') as f:
+        return backend.extract_features(f.read())
+
+
+@pytest.mark.parametrize('filename', FIXTURES)
+@pytest.mark.parametrize('backend_name', [name for name in PARSER_BACKENDS if name != 'html.parser'])
+def test_backend_matches_html_parser(backend_name, filename):
+    assert features(backend_name, filename) == features('html.parser', filename)
+
+
+@pytest.mark.parametrize('backend_name', list(PARSER_BACKENDS))
+def test_unclosed_iframe_keeps_rest_of_document(backend_name):
+    page = features(backend_name, 'unclosed_iframe.html')
+    assert 'https://js.stripe.com/v3/' in page['script_srcs']
+    assert 'stripe-payment-form' in page['form_classes']
+    assert 'paypal-client-id' in page['meta_names']
+    assert '/checkout' in page['anchor_hrefs']
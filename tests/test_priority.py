@@ -0,0 +1,91 @@
+"""
+Prioridade do crawling (--priority): PriorityFrontier, filas por host do
+HostScheduler e orçamento de max_urls
+"""
+from gateway_crawler_v2_1 import HostScheduler, PriorityFrontier, score_link
+from tests.conftest import page
+
+
+def test_score_link_prefers_checkout_over_blog():
+    assert score_link('https://loja.test/checkout', 'Finalizar compra') > 0
+    assert score_link('https://loja.test/blog/novidades', 'Blog') < 0
+    assert score_link('https://loja.test/sobre', 'Sobre') == 0
+
+
+def test_priority_frontier_order():
+    frontier = PriorityFrontier()
+    frontier.append(('https://a.test/1', 1), 0)
+    frontier.append(('https://a.test/blog', 1), -2)
+    frontier.append(('https://a.test/cart', 2), 4)
+    frontier.append(('https://a.test/checkout', 2), 5)
+    frontier.append(('https://a.test/pay', 1), 4)
+    order = [frontier.pop_scored() for _ in range(len(frontier))]
+    assert order == [(('https://a.test/checkout', 2), 5), (('https://a.test/pay', 1), 4), (('https://a.test/cart', 2), 4),
+                     (('https://a.test/1', 1), 0), (('https://a.test/blog', 1), 0)]
+
+
+def test_host_scheduler_keeps_priority_within_host_and_rotates_hosts():
+    scheduler = HostScheduler(rate=0, max_per_host=10)
+    for path in ('1', '2'):
+        scheduler.add(f'https://a.test/{path}', f'a{path}')
+    scheduler.add('https://b.test/1', 'b1')
+    scheduler.add('https://a.test/checkout', 'a-checkout', priority=5)
+    assert [scheduler.next_ready() for _ in range(4)] == ['a-checkout', 'b1', 'a1', 'a2']
+    assert scheduler.next_ready() is None
+
+
+def test_host_scheduler_clear():
+    scheduler = HostScheduler(rate=0)
+    scheduler.add('https://a.test/1', 'a1')
+    scheduler.clear()
+    assert scheduler.pending() == 0
+    assert scheduler.next_ready() is None
+
+
+def test_checkout_found_late_is_fetched_next(site, make_crawler):
+    site.pages['/start'] = page('Loja', [(f'/p{i}', f'p{i}') for i in range(1, 6)])
+    site.pages['/p1'] = page('P1', [('/checkout', 'Finalizar compra')])
+    for i in range(2, 6):
+        site.pages[f'/p{i}'] = page(f'P{i}')
+    site.pages['/checkout'] = page('Checkout')
+
+    make_crawler(priority_links=True).crawl_and_detect([site.url('/start')], max_depth=2, max_urls=50, max_workers=1)
+
+    assert site.requests[:3] == ['/start', '/p1', '/checkout']
+
+
+def test_late_checkout_link_fits_in_budget(site, make_crawler):
+    site.pages['/start'] = page('Loja', [(f'/p{i}', f'p{i}') for i in range(1, 31)])
+    site.pages['/p1'] = page('P1', [('/checkout', 'Finalizar compra')])
+    for i in range(2, 31):
+        site.pages[f'/p{i}'] = page(f'P{i}')
+    site.pages['/checkout'] = page('Checkout')
+
+    results = make_crawler(priority_links=True).crawl_and_detect([site.url('/start')], max_depth=2, max_urls=10,
+                                                                max_workers=1)
+
+    assert len(results) == 10
+    assert site.url('/checkout') in {result['url'] for result in results}
+    assert len(site.requests) == 10
+
+
+def test_max_urls_counts_fetched_pages_without_priority(site, make_crawler):
+    site.pages['/start'] = page('Loja', [(f'/p{i}', f'p{i}') for i in range(1, 31)])
+    for i in range(1, 31):
+        site.pages[f'/p{i}'] = page(f'P{i}', [(f'/p{i}/filho', 'filho')])
+
+    results = make_crawler().crawl_and_detect([site.url('/start')], max_depth=2, max_urls=10, max_workers=3)
+
+    assert len(results) == 10
+    assert sorted(site.requests) == sorted(['/start'] + [f'/p{i}' for i in range(1, 10)])
+
+
+def test_retried_checkout_keeps_its_priority(site, make_crawler):
+    site.pages['/start'] = page('Loja', [(f'/p{i}', f'p{i}') for i in range(1, 6)] + [('/checkout', 'Finalizar compra')])
+    for i in range(1, 6):
+        site.pages[f'/p{i}'] = page(f'P{i}')
+    site.pages['/checkout'] = [(503, {'Retry-After': '0'}, 'indisponível'), page('Checkout')]
+
+    make_crawler(priority_links=True).crawl_and_detect([site.url('/start')], max_depth=1, max_urls=50, max_workers=1)
+
+    assert site.requests[:3] == ['/start', '/checkout', '/checkout']
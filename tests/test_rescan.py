@@ -0,0 +1,77 @@
+"""
+Modo incremental (--rescan): agenda de revisitas e relatório de deltas (RescanStore)
+"""
+from gateway_crawler_v2_1 import RescanStore
+from tests.conftest import page
+
+STRIPE = '<script src="https://js.stripe.com/v3/"></script>'
+PAYPAL = '<script src="https://www.paypal.com/sdk/js?client-id=abc"></script>'
+
+
+def rescan(crawler, path, urls, **kwargs):
+    store = RescanStore(path, **kwargs)
+    try:
+        results = list(crawler.analyze_incremental(store, urls, max_workers=2))
+    finally:
+        store.close()
+    return results, store.report(), store
+
+
+def test_first_run_reports_new_urls_and_second_run_skips_them(tmp_path, site, make_crawler):
+    site.pages['/loja'] = page('Loja', body=STRIPE)
+    site.pages['/sobre'] = page('Sobre')
+    urls = [site.url('/loja'), site.url('/sobre')]
+    path = str(tmp_path / 'rescan.db')
+
+    results, report, _ = rescan(make_crawler(), path, urls)
+    assert len(results) == 2
+    assert report['metadata']['new'] == 2
+    assert {delta['url']: delta['gateways'] for delta in report['new_urls']}[site.url('/loja')][0] == 'Stripe'
+
+    results, report, _ = rescan(make_crawler(), path, urls)
+    assert results == []
+    assert report['metadata']['not_due'] == 2
+    assert report['metadata']['checked'] == 0
+
+
+def test_changes_are_reported_and_revisit_interval_adapts(tmp_path, site, make_crawler):
+    site.pages['/loja'] = page('Loja', body=STRIPE)
+    site.pages['/doacao'] = page('Doação', body=STRIPE)
+    urls = [site.url('/loja'), site.url('/doacao')]
+    path = str(tmp_path / 'rescan.db')
+    rescan(make_crawler(), path, urls, min_interval=1, max_interval=100)
+
+    site.pages['/doacao'] = page('Doação', body=PAYPAL)
+    _, report, _ = rescan(make_crawler(), path, urls, min_interval=1, max_interval=100, force=True)
+
+    assert report['metadata']['changed'] == 1
+    assert report['metadata']['unchanged'] == 1
+    [change] = report['changes']
+    assert change['url'] == site.url('/doacao')
+    assert 'PayPal' in change['added']
+    assert 'Stripe' in change['removed']
+
+    reopened = RescanStore(path, min_interval=1, max_interval=100)
+    try:
+        # Sem mudança o intervalo cresce (growth=2); com mudança volta ao mínimo
+        assert reopened._row(site.url('/loja'))[3] == 2
+        assert reopened._row(site.url('/doacao'))[3] == 1
+    finally:
+        reopened.close()
+
+
+def test_fetch_error_keeps_previous_state(tmp_path, site, make_crawler):
+    site.pages['/loja'] = page('Loja', body=STRIPE)
+    urls = [site.url('/loja')]
+    path = str(tmp_path / 'rescan.db')
+    rescan(make_crawler(), path, urls, min_interval=0)
+
+    site.pages['/loja'] = (500, {}, 'erro interno')
+    _, report, _ = rescan(make_crawler(), path, urls, min_interval=0)
+    assert report['metadata']['errors'] == 1
+    assert report['changes'] == []
+
+    site.pages['/loja'] = page('Loja', body=STRIPE)
+    _, report, _ = rescan(make_crawler(), path, urls, min_interval=0)
+    assert report['metadata']['unchanged'] == 1
+    assert report['new_urls'] == []
@@ -0,0 +1,32 @@
+"""
+Varredura dos scripts externos (--scan_scripts)
+"""
+from tests.conftest import page
+
+
+def test_bundle_with_gateway_sdk_is_detected_despite_malformed_src(site, make_crawler):
+    site.pages['/loja'] = page('Loja', body='<script src="http://[bad/x"></script><script src="/vendor.js"></script>')
+    site.pages['/vendor.js'] = (200, {'Content-Type': 'application/javascript'},
+                                'var s=document.createElement("script");s.src="https://js.stripe.com/v3/";')
+    result = make_crawler(scan_scripts=True).analyze_page(site.url('/loja'))
+
+    assert 'error' not in result
+    assert result['scripts_scanned'] == 1
+    assert 'Stripe' in result['gateways_found']
+
+
+def test_failed_script_download_is_retried_by_the_next_page(site, make_crawler):
+    site.pages['/a'] = page('A', body='<script src="/vendor.js"></script>')
+    site.pages['/b'] = page('B', body='<script src="/vendor.js"></script>')
+    site.pages['/vendor.js'] = [(500, {}, 'erro'), (200, {'Content-Type': 'application/javascript'},
+                                                     'Stripe("pk_live_x"); // js.stripe.com')]
+    crawler = make_crawler(scan_scripts=True)
+
+    first = crawler.analyze_page(site.url('/a'))
+    second = crawler.analyze_page(site.url('/b'))
+    third = crawler.analyze_page(site.url('/a'))
+
+    assert first['gateways_found'] == []
+    assert 'Stripe' in second['gateways_found'] and 'Stripe' in third['gateways_found']
+    assert site.requests.count('/vendor.js') == 2
+    assert crawler.script_cache.stats()['failures'] == 1
@@ -0,0 +1,75 @@
+"""
+Pack de assinaturas (SignaturePack): índice compilado em cache no disco
+"""
+import json
+import logging
+
+import pytest
+
+from gateway_crawler_v2_1 import DEFAULT_SIGNATURE_PACK, SignatureMatcher, SignaturePack
+
+
+@pytest.fixture
+def pack_file(tmp_path):
+    with open(DEFAULT_SIGNATURE_PACK, encoding='utf-8') as f:
+        data = json.load(f)
+    path = tmp_path / 'signatures.json'
+    path.write_text(json.dumps(data), encoding='utf-8')
+    return path
+
+
+def cached_indexes(cache_dir):
+    return sorted(path.name for path in cache_dir.glob('signatures-*.pickle'))
+
+
+def test_compiled_index_round_trips_through_the_cache(pack_file, tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    compiled = SignaturePack.load(str(pack_file)).matcher(str(cache_dir))
+    assert len(cached_indexes(cache_dir)) == 1
+
+    # Com o índice em cache, nada é recompilado
+    def no_compile(self, gateways):
+        raise AssertionError('índice recompilado')
+
+    monkeypatch.setattr(SignatureMatcher, '__init__', no_compile)
+    loaded = SignaturePack.load(str(pack_file)).matcher(str(cache_dir))
+    assert loaded.gateways == compiled.gateways
+    assert loaded.find_literals('<script>Stripe(pk)</script>') == compiled.find_literals('<script>Stripe(pk)</script>')
+
+
+def test_editing_the_pack_invalidates_the_index(pack_file, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    first = SignaturePack.load(str(pack_file)).matcher(str(cache_dir))
+    assert 'NovoGateway' not in first.gateways
+
+    data = json.loads(pack_file.read_text(encoding='utf-8'))
+    data['gateways']['NovoGateway'] = {'keywords': ['novogateway'], 'scripts': [], 'forms': [], 'meta': []}
+    pack_file.write_text(json.dumps(data), encoding='utf-8')
+    second = SignaturePack.load(str(pack_file)).matcher(str(cache_dir))
+
+    assert 'NovoGateway' in second.gateways
+    assert len(cached_indexes(cache_dir)) == 2
+
+
+def test_unreadable_index_is_recompiled(pack_file, tmp_path, caplog):
+    cache_dir = tmp_path / 'cache'
+    SignaturePack.load(str(pack_file)).matcher(str(cache_dir))
+    [name] = cached_indexes(cache_dir)
+    (cache_dir / name).write_bytes(b'corrompido')
+
+    logging.disable(logging.NOTSET)
+    try:
+        with caplog.at_level(logging.WARNING):
+            matcher = SignaturePack.load(str(pack_file)).matcher(str(cache_dir))
+    finally:
+        logging.disable(logging.WARNING)
+
+    assert 'recompilando' in caplog.text
+    assert matcher.gateways
+    assert SignaturePack.load(str(pack_file)).matcher(str(cache_dir)).gateways == matcher.gateways
+
+
+def test_cache_disabled_writes_nothing(pack_file, tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'xdg'))
+    assert SignaturePack.load(str(pack_file)).matcher(False).gateways
+    assert not (tmp_path / 'xdg').exists()
@@ -0,0 +1,110 @@
+"""
+Camada de conexões: cache DNS do processo (DNSCache), ManagedTransport e
+recursos liberados por GatewayCrawlerV2.close()
+"""
+import queue
+import socket
+
+from gateway_crawler_v2_1 import DNSCache, GatewayCrawlerV2, ManagedTransport
+
+
+def test_dns_cache_is_opt_in_and_uninstalled_on_close():
+    original = socket.getaddrinfo
+    crawler = GatewayCrawlerV2(signature_cache=False)
+    assert crawler.dns_cache is None
+    assert socket.getaddrinfo == original
+    crawler.close()
+
+    crawler = GatewayCrawlerV2(dns_ttl=60, signature_cache=False)
+    try:
+        assert socket.getaddrinfo == crawler.dns_cache.getaddrinfo
+    finally:
+        crawler.close()
+        crawler.close()
+    assert socket.getaddrinfo == original
+
+
+def test_dns_cache_hits_and_negative_entries():
+    calls = []
+
+    def resolve(host, port, *args):
+        calls.append(host)
+        if host == 'inexistente.test':
+            raise socket.gaierror(socket.EAI_NONAME, 'nome desconhecido')
+        return [('endereço', host)]
+
+    cache = DNSCache(ttl=60, negative_ttl=60)
+    cache._resolve = resolve
+    assert cache.getaddrinfo('loja.test', 443) == cache.getaddrinfo('loja.test', 443)
+    for _ in range(2):
+        try:
+            cache.getaddrinfo('inexistente.test', 443)
+        except socket.gaierror:
+            pass
+    assert calls == ['loja.test', 'inexistente.test']
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['negative_hits'] == 1
+
+
+def test_dns_cache_does_not_cache_transient_failures():
+    calls = []
+
+    def resolve(host, port, *args):
+        calls.append(host)
+        if len(calls) == 1:
+            raise socket.gaierror(socket.EAI_AGAIN, 'falha temporária na resolução')
+        return [('endereço', host)]
+
+    cache = DNSCache(ttl=60, negative_ttl=60)
+    cache._resolve = resolve
+    try:
+        cache.getaddrinfo('loja.test', 443)
+    except socket.gaierror:
+        pass
+    assert cache.getaddrinfo('loja.test', 443) == [('endereço', 'loja.test')]
+    assert calls == ['loja.test', 'loja.test']
+    assert cache.stats()['negative_hits'] == 0
+
+
+def test_detection_workers_use_a_page_detector(site, make_crawler):
+    from gateway_crawler_v2_1 import PageDetector, _detect_batch, _init_detection_worker
+    import gateway_crawler_v2_1
+
+    crawler = make_crawler()
+    _init_detection_worker(crawler.signature_pack, 'html.parser')
+    try:
+        assert isinstance(gateway_crawler_v2_1._detection_worker, PageDetector)
+        [(output, error)] = _detect_batch([('https://loja.test/', 200, b'<script src="https://js.stripe.com/v3/"></script>',
+                                            'utf-8', None, False)])
+    finally:
+        gateway_crawler_v2_1._detection_worker = None
+    assert error is None
+    assert 'Stripe' in output[0]['gateways_found']
+
+
+class _Connection:
+    def __init__(self, on_close=None):
+        self.closed = False
+        self.on_close = on_close
+
+    def close(self):
+        self.closed = True
+        if self.on_close:
+            self.on_close()
+
+
+class _Pool:
+    def __init__(self, maxsize):
+        self.pool = queue.LifoQueue(maxsize)
+
+
+def test_close_idle_connections_tolerates_connection_returned_concurrently():
+    transport = ManagedTransport(pool_per_host=1)
+    pool = _Pool(maxsize=1)
+    # Enquanto a conexão ociosa é fechada, outra thread devolve uma conexão ao pool
+    pool.pool.put(_Connection(on_close=lambda: pool.pool.put(_Connection(), block=False)))
+
+    transport._close_idle_connections(pool)
+
+    assert transport.idle_closed == 1
+    assert pool.pool.full()